@@ -2,34 +2,39 @@ import sqlite3
 import os
 import json
 import time
+import argparse
+import hashlib
 import requests
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import config
+from core import db, json_extract, search
+from core.http import TokenBucket, make_session
 
 # ================= 🔴 网络配置 =================
-PROXY_URL = 'http://127.0.0.1:7897'
+PROXY_URL = os.getenv("GEMINI_PROXY", 'http://127.0.0.1:7897')
 PROXIES = {
     "http": PROXY_URL,
     "https": PROXY_URL
-}
+} if PROXY_URL else None
 API_KEY = config.GOOGLE_API_KEY
+# 压测时可以指到 tools/fake_qwen.py（它也会说 Gemini 的格式）
+GEMINI_URL = os.getenv(
+    "GEMINI_API_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent",
+)
 # ===============================================
 
 DB_PATH = config.DB_COOK
 COOK_ROOT = config.COOK_ROOT
 
+# 这里不用 Session 自带的重试：429 要交给令牌桶处理，才能全局降速
+SESSION = make_session(pool_size=32, max_retries=0)
+
 def init_db():
-    # 不删除旧库，支持断点续传
+    # 不删除旧库，支持断点续传；表结构由 core.db 的迁移统一维护
     conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS recipes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT, category TEXT, path TEXT, raw_ingredients TEXT,
-        structured_ingredients TEXT, tags TEXT, difficulty INTEGER, calories_est INTEGER
-    )''')
-    c.execute('CREATE TABLE IF NOT EXISTS search_history (id INTEGER PRIMARY KEY, keyword TEXT, search_time DATETIME)')
-    c.execute('CREATE TABLE IF NOT EXISTS favorites (id INTEGER PRIMARY KEY, recipe_name TEXT)')
-    conn.commit()
+    db.migrate(conn, db.COOK_MIGRATIONS)
     return conn
 
 # --- 备胎：正则提取 (当AI失败时使用) ---
@@ -46,129 +51,353 @@ def extract_by_regex(content):
             text = line[1:].strip()
             item = re.split(r'[:：,，\d]', text)[0].strip().replace('*', '')
             if item and len(item) < 10: ingredients.append(item)
-    
+
     return {
         "main_ingredients": list(set(ingredients)),
         "tags": ["家常菜"], "difficulty": 3, "calories": 0
     }
 
+def _load_json(text):
+    # 代码块 / 前后废话 / 结尾逗号之类的容错见 core.json_extract
+    return json_extract.extract_json(text)
+
 # --- 核心：AI 响应解析 (修复 List 报错) ---
 def parse_ai_response(text):
-    try:
-        # 1. 尝试清洗 Markdown 标记
-        clean_text = text.replace('```json', '').replace('```', '').strip()
-        data = json.loads(clean_text)
-    except:
-        return None
+    data = _load_json(text)
 
-    # 2. 关键修复：如果 AI 返回了列表，取第一个元素
+    # 关键修复：如果 AI 返回了列表，取第一个元素
     if isinstance(data, list):
         if len(data) > 0 and isinstance(data[0], dict):
             data = data[0]
         else:
-            return None 
+            return None
 
     if not isinstance(data, dict): return None
     return data
 
-def analyze_recipe_rest(content, dish_name):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    
+def parse_ai_batch(text):
+    """打包模式：AI 返回数组，按 name 对回每道菜。"""
+    data = _load_json(text)
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        return {}
+    return {d.get("name"): d for d in data if isinstance(d, dict) and d.get("name")}
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After") or 0) or None
+    except ValueError:
+        return None
+
+def call_gemini(prompt, limiter):
+    """发一次请求（最多试 3 次），返回模型文本；429 交给令牌桶全局降速。"""
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {"response_mime_type": "application/json"}
+    }
+
+    headers = {'Content-Type': 'application/json', 'X-goog-api-key': API_KEY}
+
+    for attempt in range(3): # 遇到错误重试3次
+        limiter.acquire()
+        try:
+            response = SESSION.post(GEMINI_URL, json=payload, headers=headers, proxies=PROXIES, timeout=30)
+        except requests.RequestException:
+            time.sleep(2 ** attempt)
+            continue
+
+        if response.status_code == 200:
+            limiter.succeeded()
+            try:
+                return response.json()['candidates'][0]['content']['parts'][0]['text']
+            except (ValueError, KeyError, IndexError):
+                return None
+        if response.status_code == 429:
+            # 遇到限流：所有 worker 一起降速，并等到 Retry-After 结束
+            limiter.throttled(_retry_after(response) or 2 ** (attempt + 2))
+            continue
+        if response.status_code >= 500:
+            time.sleep(2 ** attempt)
+            continue
+        return None
+    return None
+
+def analyze_recipe_rest(content, dish_name, limiter):
     prompt = f"""
     分析菜谱《{dish_name}》。内容：{content[:1500]}...
     请提取以下信息并以纯 JSON 对象格式返回：
     {{
-        "main_ingredients": ["食材1", "食材2"], 
+        "main_ingredients": ["食材1", "食材2"],
         "tags": ["标签1", "标签2"],
         "difficulty": 3,
         "calories": 500
     }}
     注意：main_ingredients 只列出核心食材。
     """
-    
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"response_mime_type": "application/json"}
-    }
-    
-    headers = {'Content-Type': 'application/json', 'X-goog-api-key': API_KEY}
-    
-    for attempt in range(3): # 遇到错误重试3次
-        try:
-            response = requests.post(url, json=payload, headers=headers, proxies=PROXIES, timeout=30)
-            
-            if response.status_code == 200:
-                raw_text = response.json()['candidates'][0]['content']['parts'][0]['text']
-                return parse_ai_response(raw_text)
-            elif response.status_code == 429:
-                print(f"[429] 休息30秒...", end="", flush=True)
-                time.sleep(30) # 遇到限流，狠狠休息1分钟
-                continue
-            else:
-                # print(f"[HTTP {response.status_code}]", end="")
-                pass
-        except:
-            time.sleep(5)
-            continue
-    return None
+    text = call_gemini(prompt, limiter)
+    return parse_ai_response(text) if text else None
 
-def main():
-    print(f"🔌 代理: {PROXY_URL}")
-    print(f"🐢 启动【安全慢速】模式：请求间隔 10 秒")
-    
-    conn = init_db()
-    c = conn.cursor()
-    
+def analyze_recipes_packed(batch, limiter):
+    """一次请求分析好几道菜，返回 {菜名: data}；漏掉的菜由调用方兜底。"""
+    parts = [
+        f"【{name}】\n{content[:800]}..."
+        for name, content in batch
+    ]
+    prompt = f"""
+    下面有 {len(batch)} 道菜谱，每道以【菜名】开头。
+    {chr(10).join(parts)}
+
+    请对每道菜提取信息，返回一个纯 JSON 数组，每个元素格式：
+    {{
+        "name": "菜名（和【】里的完全一致）",
+        "main_ingredients": ["食材1", "食材2"],
+        "tags": ["标签1", "标签2"],
+        "difficulty": 3,
+        "calories": 500
+    }}
+    注意：main_ingredients 只列出核心食材。
+    """
+    text = call_gemini(prompt, limiter)
+    return parse_ai_batch(text) if text else {}
+
+# AI 现编的菜谱归 generate_and_save 管，不属于 HowToCook 语料
+SKIP_DIRS = {"AI_Generated"}
+
+def _norm_path(rel_path):
+    # 老数据是在 Windows 上生成的，path 里是反斜杠
+    return (rel_path or "").replace("\\", "/")
+
+def file_hash(full_path):
+    h = hashlib.sha1()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def scan_files():
     files = []
     for root, dirs, filenames in os.walk(COOK_ROOT):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
         for f in filenames:
             if f.endswith('.md') and not f.startswith('README'):
                 files.append((f.replace('.md',''), os.path.basename(root), os.path.join(root, f), os.path.join(os.path.basename(root), f)))
+    return files
+
+def assign_names(files, rows):
+    """
+    recipes.name 是唯一的：不同分类下各有一份同名菜谱（两个 “红烧鱼.md”）时，
+    直接按文件名入库会每次同步都互相覆盖。同名的一组里：库里已经用着原名的那份（按路径认）
+    继续叫原名，没有的话路径排第一的叫原名，其余的叫 “菜名（分类）”，下次同步还是同一个名字。
+    返回和 files 一一对应的新列表（菜名换成入库用的名字）。
+    """
+    groups = {}
+    for f in files:
+        groups.setdefault(f[0], []).append(f)
+    path_of = {r[1]: _norm_path(r[2]) for r in rows}
+
+    renamed = {}
+    for name, group in groups.items():
+        if len(group) < 2:
+            continue
+        keep = next((f for f in group if _norm_path(f[3]) == path_of.get(name)), None)
+        keep = keep or min(group, key=lambda f: _norm_path(f[3]))
+        for f in group:
+            if f is not keep:
+                renamed[id(f)] = f"{name}（{f[1]}）"
+    return [(renamed.get(id(f), f[0]),) + tuple(f[1:]) for f in files]
+
+def plan_sync(c, files):
+    """
+    增量同步计划：对比库里记录的 (path, mtime, content_hash) 和磁盘上的文件。
+    先按路径找记录，路径对不上时按内容 hash 找（换了分类 / 改了文件名），最后才按菜名。
+    返回 (todo, touched, moved, vanished)：
+    - todo:     新文件 / 内容变了的文件，需要重新解析 + AI 清洗，元素是 (name, cat, full, rel, hash, mtime)
+    - touched:  只是 mtime 变了（或老数据第一次补 hash），只更新 hash/mtime，元素是 (id, hash, mtime)
+    - moved:    内容没变但路径 / 分类 / 菜名变了，不调 AI，只改这几列，元素是 (id, name, cat, rel, hash, mtime)
+    - vanished: 文件已经删掉的记录 id
+    """
+    rows = c.execute(
+        "SELECT id, name, path, content_hash, mtime, structured_ingredients FROM recipes"
+    ).fetchall()
+    files = assign_names(files, rows)
+    by_path = {_norm_path(r[2]): r for r in rows}
+    by_name = {r[1]: r for r in rows}
+    by_hash = {}
+    for r in rows:
+        if r[3] and r[5] is not None:
+            by_hash.setdefault(r[3], []).append(r)
+
+    todo, touched, moved, seen = [], [], [], set()
+    pending = []
+    for name, cat, full_path, rel_path in files:
+        key = _norm_path(rel_path)
+        row = by_path.get(key)
+        mtime = os.stat(full_path).st_mtime
+        if row is not None:
+            seen.add(row[0])
+            # 路径没变、mtime 也没变：连文件都不用读
+            if row[1] == name and row[3] and row[4] == mtime and row[5] is not None:
+                continue
+        pending.append((row, name, cat, full_path, rel_path, key, mtime))
+
+    # 路径对上的先认领完，剩下的再按 hash / 菜名去找，免得抢了别人的记录
+    for row, name, cat, full_path, rel_path, key, mtime in pending:
+        content_hash = file_hash(full_path)
+        if row is None:
+            same = [r for r in by_hash.get(content_hash, ()) if r[0] not in seen]
+            # 同一份内容有好几条记录时优先同名的
+            row = next((r for r in same if r[1] == name), same[0] if same else None)
+            if row is None:
+                candidate = by_name.get(name)
+                row = candidate if candidate is not None and candidate[0] not in seen else None
+            if row is not None:
+                seen.add(row[0])
+
+        enriched = row is not None and row[5] is not None
+        if enriched and row[3] == content_hash:
+            if _norm_path(row[2]) != key or row[1] != name:
+                moved.append((row[0], name, cat, rel_path, content_hash, mtime))
+            else:
+                touched.append((row[0], content_hash, mtime))
+            continue
+        if enriched and row[3] is None and _norm_path(row[2]) == key and row[1] == name:
+            # 老数据还没有 hash：不重新调 AI，只记下 hash/mtime
+            touched.append((row[0], content_hash, mtime))
+            continue
+        if row is not None and row[1] != name:
+            # 内容也变了：先把记录改成新名字，下面按名字 upsert 的时候更新的是这一条
+            moved.append((row[0], name, cat, rel_path, row[3], row[4]))
+        todo.append((name, cat, full_path, rel_path, content_hash, mtime))
+
+    # 只清理同步过的记录（有 content_hash），AI 生成的菜不归这里管
+    vanished = [
+        r[0] for r in rows
+        if r[0] not in seen and r[3] is not None and not _norm_path(r[2]).startswith("AI_Generated/")
+    ]
+    return todo, touched, moved, vanished
+
+def enrich_batch(batch, limiter, pack):
+    """worker 线程里跑：读文件 + 调 AI，返回 [(文件信息, content, data, 是否 AI 成功), ...]"""
+    loaded = []
+    for info in batch:
+        with open(info[2], 'r', encoding='utf-8') as f:
+            loaded.append((info, f.read()))
+
+    if pack > 1:
+        results = analyze_recipes_packed([(info[0], content) for info, content in loaded], limiter)
+    else:
+        info, content = loaded[0]
+        results = {info[0]: analyze_recipe_rest(content, info[0], limiter)}
+
+    out = []
+    for info, content in loaded:
+        data = results.get(info[0])
+        ok = bool(data and data.get('main_ingredients'))
+        # 失败则正则兜底
+        out.append((info, content, data if ok else extract_by_regex(content), ok))
+    return out
+
+def save_recipe(c, info, content, data):
+    name, cat, full_path, rel_path, content_hash, mtime = info
+    c.execute('''INSERT INTO recipes
+        (name, category, path, raw_ingredients, structured_ingredients, tags, difficulty, calories_est,
+         content_hash, mtime, source, generated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'howtocook', NULL)
+        ON CONFLICT(name) DO UPDATE SET
+            category=excluded.category, path=excluded.path,
+            raw_ingredients=excluded.raw_ingredients,
+            structured_ingredients=excluded.structured_ingredients,
+            tags=excluded.tags, difficulty=excluded.difficulty,
+            calories_est=excluded.calories_est,
+            content_hash=excluded.content_hash, mtime=excluded.mtime,
+            source=excluded.source, generated_at=excluded.generated_at''',
+        (name, cat, rel_path, "",
+         json.dumps(data.get('main_ingredients', []), ensure_ascii=False),
+         json.dumps(data.get('tags', []), ensure_ascii=False),
+         data.get('difficulty', 3), data.get('calories', 0),
+         content_hash, mtime))
+    recipe_id = c.execute("SELECT id FROM recipes WHERE name=?", (name,)).fetchone()[0]
+    search.index_body(c, recipe_id, content)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用 AI 批量清洗 HowToCook 菜谱入库")
+    parser.add_argument("--workers", type=int, default=4, help="并发 worker 数")
+    parser.add_argument("--rate", type=float, default=1.0, help="目标请求速率（次/秒），429 时自动降速")
+    parser.add_argument("--burst", type=int, default=2, help="令牌桶容量")
+    parser.add_argument("--commit-every", type=int, default=20, help="每写多少道菜提交一次")
+    parser.add_argument("--pack", type=int, default=1, help="一次请求打包几道菜（>1 时走数组模式）")
+    parser.add_argument("--dry-run", action="store_true", help="只打印增量同步计划，不调 AI 也不写库")
+    args = parser.parse_args(argv)
+
+    print(f"🔌 代理: {PROXY_URL or '无'}")
+    print(f"🚀 并发模式：{args.workers} 个 worker，目标 {args.rate} 次/秒，每次 {args.pack} 道菜")
+
+    conn = init_db()
+    c = conn.cursor()
 
+    files = scan_files()
     print(f"📊 总计: {len(files)} 道菜谱")
-    
+    if not files:
+        # 目录没挂上 / 路径配错时千万别把整个库当成“文件已删除”清空
+        print(f"⚠️ {COOK_ROOT} 下没找到菜谱，什么都不做")
+        conn.close()
+        return {"done": 0, "ai_ok": 0, "seconds": 0.0, "throttled": 0}
+
+    # 增量同步：按 mtime / 内容 hash 判断，只处理新增、修改、删除的文件
+    todo, touched, moved, vanished = plan_sync(c, files)
+    print(f"🆕 新增/修改: {len(todo)} 道，🔁 未变更补记: {len(touched)} 道，"
+          f"🚚 换了位置: {len(moved)} 道，🗑️ 已删除: {len(vanished)} 道")
+    if args.dry_run:
+        for info in todo:
+            print(f"  + {info[3]}")
+        for _, name, _, rel_path, _, _ in moved:
+            print(f"  > {rel_path} ({name})")
+        conn.close()
+        return {"done": 0, "ai_ok": 0, "seconds": 0.0, "throttled": 0}
+
+    c.executemany("UPDATE recipes SET content_hash=?, mtime=? WHERE id=?",
+                  [(h, m, rid) for rid, h, m in touched])
+    c.executemany("DELETE FROM recipes WHERE id=?", [(rid,) for rid in vanished])
+    c.executemany("UPDATE recipes SET name=?, category=?, path=?, content_hash=?, mtime=? WHERE id=?",
+                  [(name, cat, rel, h, m, rid) for rid, name, cat, rel, h, m in moved])
+    conn.commit()
+
+    limiter = TokenBucket(rate=args.rate, burst=args.burst)
+    pack = max(1, args.pack)
+    batches = [todo[i:i + pack] for i in range(0, len(todo), pack)]
+
     success_cnt = 0
-    
-    for i, (name, cat, full_path, rel_path) in enumerate(files):
-        print(f"\r[{i+1}/{len(files)}] 处理: {name:<10} ", end="", flush=True)
-        
-        # 断点续传检查
-        check = c.execute("SELECT id FROM recipes WHERE name=? AND structured_ingredients IS NOT NULL", (name,)).fetchone()
-        if check:
-            print("⏭️", end="") # 已存在，跳过
-            continue
+    done_cnt = 0
+    pending_commit = 0
+    started = time.time()
 
-        with open(full_path, 'r', encoding='utf-8') as f: content = f.read()
-        
-        # 1. AI 尝试
-        data = analyze_recipe_rest(content, name)
-        
-        # 2. 失败则正则兜底
-        if not data or not data.get('main_ingredients'):
-            data = extract_by_regex(content)
-            print("⚠️(正则)", end="")
-        else:
-            print("✅(AI)", end="")
-            success_cnt += 1
-            
-        # 入库
-        c.execute("DELETE FROM recipes WHERE name=?", (name,)) # 删旧
-        try:
-            c.execute('''INSERT INTO recipes VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                (name, cat, rel_path, "", 
-                 json.dumps(data.get('main_ingredients', []), ensure_ascii=False),
-                 json.dumps(data.get('tags', []), ensure_ascii=False),
-                 data.get('difficulty', 3), data.get('calories', 0)))
-        except:
-            pass
-            
-        # ✅ 安全间隔：10秒
-        # 这是为了确保您的账号绝对安全，您可以去忙别的，让它慢慢跑
-        time.sleep(2) 
-        conn.commit()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(enrich_batch, b, limiter, pack) for b in batches]
+        # 只有主线程写库：worker 只负责调 AI，写入按批提交
+        for fut in as_completed(futures):
+            try:
+                results = fut.result()
+            except Exception as e:
+                print(f"\n❌ 批次失败: {e!r}")
+                continue
+            for info, content, data, ok in results:
+                save_recipe(c, info, content, data)
+                done_cnt += 1
+                pending_commit += 1
+                success_cnt += ok
+                print(f"\r[{done_cnt}/{len(todo)}] {info[0]:<10} {'✅(AI)' if ok else '⚠️(正则)'} ", end="", flush=True)
+            if pending_commit >= args.commit_every:
+                conn.commit()
+                pending_commit = 0
 
+    conn.commit()
     conn.close()
+    elapsed = time.time() - started
     print(f"\n\n🎉 全部完成！本次 AI 清洗成功: {success_cnt} 条。")
+    if done_cnt:
+        print(f"⏱️ 用时 {elapsed:.1f}s，{done_cnt / elapsed:.2f} 道/秒，429 共 {limiter.throttle_count} 次")
+    return {"done": done_cnt, "ai_ok": success_cnt, "seconds": elapsed, "throttled": limiter.throttle_count}
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
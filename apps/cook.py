@@ -1,26 +1,238 @@
 from flask import Blueprint, jsonify, request, send_from_directory
-from core import ai, db
+from core import ai, db, schema, search as fts
+from core.catalog import catalog
+from core.jobs import JobRegistry, SingleFlight
+from core.pantry_index import pantry_index
+from core.render import html_cache, warm_in_background
+from core.sse import sse_event, sse_response, sse_text
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import asyncio
 import config
+import datetime
+import hashlib
 import os
 import json
+import tempfile
 import markdown
 
 cook_bp = Blueprint('cook', __name__)
 
 
+# -------------------- AI 输出的结构（core.schema 按这些校验 + 转换） --------------------
+
+@dataclass
+class RecipeMeta:
+    main_ingredients: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+    difficulty: int = field(default=3, metadata=schema.rule(min=1, max=5))
+    calories: int = field(default=0, metadata=schema.rule(min=0))
+
+
+@dataclass
+class GeneratedRecipe:
+    """生成的一道菜：正文必填，meta 缺了给默认值；批量生成时多一个 name。"""
+    markdown_content: str = field(metadata=schema.rule(min_len=1))
+    meta: RecipeMeta = field(default_factory=RecipeMeta)
+    name: str = ""
+
+
+@dataclass
+class Recommendation:
+    name: str = field(metadata=schema.rule(min_len=1))
+    missing: List[str] = field(default_factory=list)
+    score: Optional[int] = field(default=None, metadata=schema.rule(min=0, max=100))
+
+
+@dataclass
+class ChefReply:
+    reply: str = "试着换个说法再问我一次吧～"
+    recipes: List[Recommendation] = field(default_factory=list)
+
+
+# 同一道新菜同时只生成一份；异步模式下丢到后台线程池
+_generation_flight = SingleFlight()
+_generation_jobs = JobRegistry(max_workers=4)
+# 原文件丢失的菜由 AI 补写：同一道菜同时只补一次；批量修复单独一个线程慢慢跑
+_repair_flight = SingleFlight()
+_repair_jobs = JobRegistry(max_workers=1, keep_seconds=3600)
+# 异步生成里落盘 + 入库用的专用线程：不和事件循环的默认线程池混用，
+# 那边被别的任务占满时，占着 _generation_flight 的领头方照样能把结果写进去、把 key 放掉
+_store_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cook-store")
+
+
+def init_cook_db(warm_html=None):
+    """
+    启动阶段（run.create_app 里调用一次，导入本模块不再碰数据库）：
+    表结构（含全文检索表 + 同步触发器）由 core.db 的版本化迁移负责，已是最新版本时直接跳过。
+    菜谱目录 / 合成台索引第一次用到时才加载。
+    warm_html: 是否后台预热详情页 HTML，默认看 config.COOK_HTML_WARM
+    """
+    db.migrate_cook()
+    with db.get_cook_conn() as conn:
+        fts.ensure_index(conn)
+    if config.COOK_HTML_WARM if warm_html is None else warm_html:
+        warm_in_background()
+
+
 def _ensure_dir(path: str):
     if not os.path.exists(path):
         os.makedirs(path, exist_ok=True)
 
 
+def _write_atomic(full_path: str, text: str):
+    """先写同目录下的临时文件再 os.replace，别的请求要么读到旧文件，要么读到完整的新文件。"""
+    save_dir = os.path.dirname(full_path)
+    _ensure_dir(save_dir)
+    fd, tmp_path = tempfile.mkstemp(dir=save_dir, prefix=".tmp-", suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
 def generate_and_save(name: str):
     """
     针对“新菜名”调用 AI 生成一份菜谱，并立即：
     - 写入 data/HowToCook/dishes/AI_Generated/{name}.md
     - 写入 cook_data.db 的 recipes 表
     返回一个 dict，可直接给前端用。
+    同名的并发调用会合并成一次 AI 请求，大家拿同一份结果。
     """
-    prompt = f"""
+    return _generation_flight.do(name, _generate_and_save, name)
+
+
+def generate_in_background(name: str) -> str:
+    """异步版 generate_and_save：立即返回 job_id，用 /api/cook/job 轮询。"""
+    return _generation_jobs.submit(name, generate_and_save, name)
+
+
+def generate_many(names):
+    """
+    生成多道新菜（聊天推荐里库里没有的那些）：每 COOK_GEN_BATCH 道打包成一次请求，
+    各组并发，同时最多 COOK_GEN_CONCURRENCY 个 AI 请求。
+    返回和 names 一一对应的列表，元素同 generate_and_save 的返回值（失败为 None）。
+    """
+    if not names:
+        return []
+    try:
+        return ai.run_async(_agenerate_many(list(names)))
+    except TimeoutError:
+        print(f"[cook] generate {names!r} timed out")
+        return [None] * len(names)
+
+
+async def _agenerate_many(names):
+    names = list(dict.fromkeys(names))
+    # 要打包的菜整批先占住 _generation_flight：批量请求在路上时，别的请求（/api/cook/search 的
+    # 同步生成、另一个 chef_chat）要生成其中某道菜会等这一份，不会再各调一次 AI
+    owned = _generation_flight.claim(names)
+    waiting = [n for n in names if n not in owned]
+    fresh = [n for n in names if n in owned]
+    size = max(1, config.COOK_GEN_BATCH)
+    # 别的请求正在生成的菜单独等那一份，其余的按组打包
+    groups = [[n] for n in waiting] + [fresh[i:i + size] for i in range(0, len(fresh), size)]
+
+    try:
+        results = await ai.gather_limited(
+            [_agenerate_group(g, owned) for g in groups], config.COOK_GEN_CONCURRENCY
+        )
+    finally:
+        # 兜底：正常情况下每组跑完已经放掉了，这里只处理没来得及跑的
+        for n, call in owned.items():
+            _generation_flight.release(n, call)
+
+    by_name = {}
+    for group, res in zip(groups, results):
+        if isinstance(res, BaseException):
+            print(f"[cook] generate {group!r} failed:", repr(res))
+            res = [None] * len(group)
+        by_name.update(zip(group, res))
+    return [by_name.get(n) for n in names]
+
+
+async def _agenerate_group(names, owned):
+    """
+    生成一组菜。没占到的（别人正在生成）等那一份；占住的跑完（不管成败）就放掉，
+    等着的调用方拿到各自的结果。
+    """
+    if names[0] not in owned:
+        return [await _agenerate_and_save(names[0])]
+    results, error = [None] * len(names), None
+    try:
+        if len(names) == 1:
+            results = [await _agenerate_one(names[0])]
+        else:
+            results = await _agenerate_batch(names, owned)
+        return results
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        for n, res in zip(names, results):
+            _generation_flight.release(n, owned[n], res, error)
+
+
+async def _agenerate_batch(names, owned):
+    """一次请求生成一组菜，校验通过的一个事务入库；缺的 / 不合格的再单独生成。"""
+    data = await ai.agenerate_json(_batch_prompt(names), max_tokens=min(8000, 1500 * len(names)))
+    recs = _parse_batch(names, data)
+
+    good = [rec for rec in recs if rec is not None]
+    stored = await _in_store_thread(_store_generated, good) if good else []
+    by_name = {row["name"]: row for row in stored}
+    # 入库了的马上放掉，不用等下面单独重试的那几道
+    for n, row in by_name.items():
+        _generation_flight.release(n, owned[n], row)
+
+    retry = [n for n, rec in zip(names, recs) if rec is None]
+    if retry:
+        print(f"[cook] batch generation: {len(retry)}/{len(names)} invalid, retrying one by one")
+        singles = await ai.gather_limited(
+            [_agenerate_one(n) for n in retry], config.COOK_GEN_CONCURRENCY
+        )
+        for n, res in zip(retry, singles):
+            by_name[n] = None if isinstance(res, BaseException) else res
+    return [by_name.get(n) for n in names]
+
+
+async def _agenerate_and_save(name: str):
+    """generate_and_save 的协程版：和同步调用方共用 _generation_flight，同一道菜只调一次 AI。"""
+    return await _generation_flight.ado(name, _agenerate_one, name)
+
+
+async def _agenerate_one(name: str):
+    recipe = await ai.agenerate_json(_recipe_prompt(name), schema=GeneratedRecipe)
+    if recipe is None:
+        return None
+    # 写文件 + 写库放到线程里，别卡住事件循环上的其他请求
+    return await _in_store_thread(_save_generated, name, recipe)
+
+
+async def _in_store_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_store_pool, fn, *args)
+
+
+def _generate_and_save(name: str):
+    recipe = ai.generate_json(_recipe_prompt(name), schema=GeneratedRecipe)
+    if recipe is None:
+        return None
+    return _save_generated(name, recipe)
+
+
+def _recipe_prompt(name: str) -> str:
+    return f"""
     你是一个中文菜谱助手，请为《{name}》生成一个详细菜谱。
 
     请严格返回一个 JSON 对象，结构如下（不要写多余文字）：
@@ -40,86 +252,217 @@ def generate_and_save(name: str):
     - difficulty 为 1~5 的整数
     - calories 为每份估算热量，整数，单位 kcal
     """
-    data = ai.generate_json(prompt)
-    if not data:
-        return None
 
-    markdown_content = (data.get("markdown_content") or "").strip()
-    meta = data.get("meta") or {}
-    main_ings = meta.get("main_ingredients") or []
-    tags = meta.get("tags") or []
-    try:
-        difficulty = int(meta.get("difficulty") or 3)
-    except Exception:
-        difficulty = 3
-    try:
-        calories = int(meta.get("calories") or 0)
-    except Exception:
-        calories = 0
 
-    if not markdown_content:
-        markdown_content = f"# {name}\n\n暂时没有详细菜谱，稍后再来看看吧。"
+def _batch_prompt(names) -> str:
+    titles = "".join(f"《{n}》" for n in names)
+    return f"""
+    你是一个中文菜谱助手，请一次性为下面 {len(names)} 道菜各生成一个详细菜谱：{titles}
+
+    请严格返回一个 JSON 数组，每道菜一个元素，顺序和上面一致（不要写多余文字）：
+    [
+      {{
+        "name": "菜名，必须和上面给的完全一致",
+        "markdown_content": "# 菜名\\n...(完整 Markdown 菜谱)...",
+        "meta": {{
+          "main_ingredients": ["食材1", "食材2"],
+          "tags": ["家常菜", "低脂"],
+          "difficulty": 3,
+          "calories": 500
+        }}
+      }}
+    ]
+    其中：
+    - markdown_content 必须是完整可用的 Markdown 菜谱
+    - main_ingredients 只放 3~8 个核心食材（短语）
+    - tags 放 1~5 个标签，如“家常菜/川菜/低脂/快手菜”
+    - difficulty 为 1~5 的整数
+    - calories 为每份估算热量，整数，单位 kcal
+    """
 
-    save_dir = os.path.join(config.COOK_ROOT, "AI_Generated")
-    _ensure_dir(save_dir)
-    rel_path = os.path.join("AI_Generated", f"{name}.md")
-    full_path = os.path.join(config.COOK_ROOT, rel_path)
 
-    with open(full_path, "w", encoding="utf-8") as f:
-        f.write(markdown_content)
+def _record(name: str, recipe: GeneratedRecipe) -> dict:
+    """校验好的 GeneratedRecipe → _store_generated 用的记录。"""
+    return {
+        "name": name,
+        "markdown": recipe.markdown_content,
+        "main_ings": recipe.meta.main_ingredients,
+        "tags": recipe.meta.tags,
+        "difficulty": recipe.meta.difficulty,
+        "calories": recipe.meta.calories,
+    }
+
+
+def _parse_batch(names, data):
+    """
+    把批量生成的 JSON 数组拆回每道菜，逐个按 GeneratedRecipe 校验。
+    返回和 names 一一对应的列表，没给 / 不符合 schema 的位置是 None（之后单独重新生成）。
+    """
+    items = data.get("recipes") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return [None] * len(names)
+
+    by_name = {}
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get("name"), str):
+            by_name.setdefault(item["name"].strip(), item)
+
+    out = []
+    for i, name in enumerate(names):
+        item = by_name.get(name)
+        # 模型偶尔不回 name：数量对得上时按位置认
+        if item is None and len(items) == len(names) and isinstance(items[i], dict) \
+                and not items[i].get("name"):
+            item = items[i]
+        try:
+            out.append(_record(name, schema.coerce(GeneratedRecipe, item)))
+        except schema.SchemaError:
+            out.append(None)
+    return out
+
+
+def _save_generated(name: str, recipe: GeneratedRecipe):
+    """把校验好的菜谱落盘 + 入库 + 更新索引，返回给前端用的 dict。"""
+    return _store_generated([_record(name, recipe)])[0]
+
+
+def _store_generated(recs):
+    """
+    一批整理好的菜谱：先逐个原子写文件，再在一个事务里全部入库 + 更新全文索引。
+    返回和 recs 一一对应的、“看起来像 dict(row)”的结构给前端。
+    """
+    now = _now()
+    for rec in recs:
+        rec["path"] = os.path.join("AI_Generated", f"{rec['name']}.md")
+        _write_atomic(os.path.join(config.COOK_ROOT, rec["path"]), rec["markdown"])
 
     with db.get_cook_conn() as conn:
         c = conn.cursor()
-        # 清理旧记录，避免重复
-        c.execute("DELETE FROM recipes WHERE name=?", (name,))
-        c.execute(
-            """
-            INSERT INTO recipes
-            (name, category, path, raw_ingredients, structured_ingredients, tags, difficulty, calories_est)
-            VALUES (?,?,?,?,?,?,?,?)
-            """,
-            (
-                name,
-                "AI生成",
-                rel_path,
-                "",
-                json.dumps(main_ings, ensure_ascii=False),
-                json.dumps(tags, ensure_ascii=False),
-                difficulty,
-                calories,
-            ),
+        for rec in recs:
+            # recipes.name 有唯一索引：同名直接原地更新，不再先删后插
+            c.execute(
+                """
+                INSERT INTO recipes
+                (name, category, path, raw_ingredients, structured_ingredients, tags, difficulty, calories_est,
+                 source, generated_at)
+                VALUES (?,?,?,?,?,?,?,?,'ai',?)
+                ON CONFLICT(name) DO UPDATE SET
+                    category=excluded.category,
+                    path=excluded.path,
+                    raw_ingredients=excluded.raw_ingredients,
+                    structured_ingredients=excluded.structured_ingredients,
+                    tags=excluded.tags,
+                    difficulty=excluded.difficulty,
+                    calories_est=excluded.calories_est,
+                    source=excluded.source,
+                    generated_at=excluded.generated_at
+                """,
+                (
+                    rec["name"],
+                    "AI生成",
+                    rec["path"],
+                    "",
+                    json.dumps(rec["main_ings"], ensure_ascii=False),
+                    json.dumps(rec["tags"], ensure_ascii=False),
+                    rec["difficulty"],
+                    rec["calories"],
+                    now,
+                ),
+            )
+            rec["id"] = c.execute("SELECT id FROM recipes WHERE name=?", (rec["name"],)).fetchone()["id"]
+            fts.index_body(conn, rec["id"], rec["markdown"])
+        conn.commit()
+
+    # 菜谱目录 / 合成台索引靠 recipes_version（触发器维护）发现这次写入，下次读的时候自动重新加载
+    return [
+        {
+            "name": rec["name"],
+            "category": "AI生成",
+            "path": rec["path"],
+            "raw_ingredients": "",
+            "structured_ingredients": json.dumps(rec["main_ings"], ensure_ascii=False),
+            "tags": json.dumps(rec["tags"], ensure_ascii=False),
+            "difficulty": rec["difficulty"],
+            "calories_est": rec["calories"],
+        }
+        for rec in recs
+    ]
+
+
+def repair_recipe(name: str):
+    """
+    原菜谱文件丢失时让 AI 补写一份正文并落盘（AI_Generated/{name}.md），
+    同时把 recipes.path 指过去、记下来源，之后的请求直接读本地文件。
+    返回新的相对路径；AI 不可用时返回 None，不写任何东西。
+    同一道菜的并发请求只会调一次 AI。
+    """
+    return _repair_flight.do(name, _repair_recipe, name)
+
+
+def _repair_recipe(name: str):
+    recipe = catalog.get(name)
+    if recipe is None:
+        return None
+    # 可能刚被别的请求 / 修复任务补好了
+    if os.path.exists(fts.recipe_file(recipe.path)):
+        return recipe.path
+
+    md = ai.chat_with_text(
+        f"菜谱文件丢失了，请为《{name}》写一份详细菜谱，使用 Markdown 标题和步骤列表。"
+    )
+    if not md or md == ai.CHAT_FALLBACK:
+        return None
+
+    rel_path = os.path.join("AI_Generated", f"{name}.md")
+    _write_atomic(os.path.join(config.COOK_ROOT, rel_path), md)
+    with db.get_cook_conn() as conn:
+        conn.execute(
+            "UPDATE recipes SET path=?, source='ai_repair', generated_at=? WHERE id=?",
+            (rel_path, _now(), recipe.id),
         )
+        fts.index_body(conn, recipe.id, md)
         conn.commit()
+    html_cache.invalidate(recipe.id)
+    return rel_path
 
-    # 返回一个“看起来像 dict(row)”的结构给前端
-    return {
-        "name": name,
-        "category": "AI生成",
-        "path": rel_path,
-        "raw_ingredients": "",
-        "structured_ingredients": json.dumps(main_ings, ensure_ascii=False),
-        "tags": json.dumps(tags, ensure_ascii=False),
-        "difficulty": difficulty,
-        "calories_est": calories,
-    }
+
+def repair_missing(limit=None):
+    """
+    批量修复：找出 path 指向的文件已经不存在的菜，逐个让 AI 补写。
+    在后台线程里跑（见 /api/cook/repair），返回统计信息。
+    """
+    rows = catalog.all()
+    missing = [r.name for r in rows if not os.path.exists(fts.recipe_file(r.path))]
+    if limit is not None:
+        missing = missing[:limit]
+
+    stats = {"checked": len(rows), "missing": len(missing), "repaired": 0, "failed": 0}
+    for name in missing:
+        if repair_recipe(name):
+            stats["repaired"] += 1
+        else:
+            stats["failed"] += 1
+    return stats
 
 
 @cook_bp.route("/api/cook/search")
 def search():
-    """图鉴搜索：支持关键词模糊匹配；没搜到时自动生成新菜并入库。"""
+    """图鉴搜索：全文检索菜名/标签/食材/正文，按 BM25 排序；没搜到时自动生成新菜并入库。"""
     q = (request.args.get("q") or "").strip()
     if not q:
         return jsonify([])
 
     with db.get_cook_conn() as conn:
-        rows = conn.execute(
-            "SELECT * FROM recipes WHERE name LIKE ? OR tags LIKE ? LIMIT 20",
-            (f"%{q}%", f"%{q}%"),
-        ).fetchall()
-        res = [dict(r) for r in rows]
+        ids = fts.search_ids(conn, q, limit=20)
+    res = [r.as_dict() for r in catalog.by_ids(ids)]
 
     # 如果库里没有，就让 AI 现编一份，偷偷写入数据库 & 菜谱文件
     if not res and 1 < len(q) < 20:
+        # async=1：不阻塞请求，先返回 job_id 让前端轮询
+        if request.args.get("async") == "1":
+            job_id = generate_in_background(q)
+            return jsonify({"status": "generating", "job_id": job_id, "results": []})
+
         gen = generate_and_save(q)
         if gen:
             res.append(gen)
@@ -127,6 +470,24 @@ def search():
     return jsonify(res)
 
 
+@cook_bp.route("/api/cook/job/<job_id>")
+def job_status(job_id):
+    """轮询后台生成任务：pending / done / failed。"""
+    job = _generation_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "404"}), 404
+
+    results = [job["result"]] if job["result"] else []
+    return jsonify(
+        {
+            "status": job["status"],
+            "job_id": job_id,
+            "results": results,
+            "error": job["error"],
+        }
+    )
+
+
 @cook_bp.route("/api/cook/pantry")
 def pantry():
     """合成台：根据“我有什么食材”在本地 recipes 表里算匹配度。"""
@@ -135,34 +496,8 @@ def pantry():
     if not ings:
         return jsonify([])
 
-    with db.get_cook_conn() as conn:
-        recipes = conn.execute("SELECT * FROM recipes").fetchall()
-
-    res = []
-    for r in recipes:
-        try:
-            needed = json.loads(r["structured_ingredients"] or "[]")
-        except Exception:
-            continue
-        if not needed:
-            continue
-
-        hits = sum(1 for n in needed if any(i in n or n in i for i in ings))
-        missing = [n for n in needed if not any(i in n or n in i for i in ings)]
-
-        if hits > 0 and len(missing) <= 3:
-            res.append(
-                {
-                    "name": r["name"],
-                    "category": r["category"],
-                    "score": int(hits / len(needed) * 100),
-                    "missing": missing,
-                    "tags": json.loads(r["tags"] or "[]"),
-                }
-            )
-
-    res.sort(key=lambda x: x["score"], reverse=True)
-    return jsonify(res[:20])
+    # 倒排索引只给出候选菜谱，不再全表 json.loads
+    return jsonify(pantry_index.score(ings))
 
 
 @cook_bp.route("/api/cook/detail")
@@ -172,36 +507,62 @@ def detail():
     if not name:
         return jsonify({"error": "name required"}), 400
 
-    with db.get_cook_conn() as conn:
-        row = conn.execute("SELECT * FROM recipes WHERE name=?", (name,)).fetchone()
-
-    if not row:
+    recipe = catalog.get(name)
+    if recipe is None:
         return jsonify({"error": "404"}), 404
 
-    rel_path = row["path"]
-    full_path = os.path.join(config.COOK_ROOT, rel_path)
-
-    if os.path.exists(full_path):
-        with open(full_path, "r", encoding="utf-8") as f:
-            content = f.read()
+    rendered = html_cache.get(recipe.id, recipe.path)
+    if rendered is None:
+        # 本地文件缺失：找 AI 补写一份并落盘，之后就走本地文件 + 缓存
+        rel_path = repair_recipe(recipe.name)
+        if rel_path:
+            rendered = html_cache.get(recipe.id, rel_path)
+    if rendered is None:
+        html = markdown.markdown(f"# {recipe.name}\n\n暂时找不到原始菜谱。")
     else:
-        # 本地文件缺失：找 AI 补一份
-        md = ai.chat_with_text(
-            f"菜谱文件丢失了，请为《{row['name']}》写一份详细菜谱，使用 Markdown 标题和步骤列表。"
-        )
-        content = md or f"# {row['name']}\n\n暂时找不到原始菜谱。"
+        html = rendered.html
 
-    html = markdown.markdown(content)
-
-    return jsonify(
+    resp = jsonify(
         {
-            "name": row["name"],
-            "category": row["category"],
+            "name": recipe.name,
+            "category": recipe.category,
             "html": html,
-            "calories": row["calories_est"],
-            "tags": json.loads(row["tags"] or "[]"),
+            "calories": recipe.calories,
+            "tags": list(recipe.tags),
         }
     )
+    if rendered is not None:
+        # ETag 同时覆盖源文件版本和这一行的元数据，改了标签/热量也会失效
+        meta = f"{rendered.etag}|{recipe.category}|{recipe.calories}|{recipe.tags_json}"
+        resp.set_etag(hashlib.sha1(meta.encode("utf-8")).hexdigest()[:16])
+        resp.last_modified = datetime.datetime.fromtimestamp(
+            rendered.mtime, tz=datetime.timezone.utc
+        )
+        resp.cache_control.no_cache = True  # 可以缓存，但每次都要带条件请求回来确认
+        return resp.make_conditional(request)
+    return resp
+
+
+@cook_bp.route("/api/cook/repair", methods=["POST"])
+def repair():
+    """后台批量补写丢失的菜谱文件，立即返回 job_id；重复提交会拿到同一个任务。"""
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = int(data["limit"]) if data.get("limit") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
+    job_id = _repair_jobs.submit("repair_missing", repair_missing, limit)
+    return jsonify({"status": "pending", "job_id": job_id}), 202
+
+
+@cook_bp.route("/api/cook/repair/<job_id>")
+def repair_status(job_id):
+    job = _repair_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "404"}), 404
+    return jsonify(
+        {"status": job["status"], "job_id": job_id, "stats": job["result"], "error": job["error"]}
+    )
 
 
 @cook_bp.route("/api/cook/ask_chef", methods=["POST"])
@@ -213,6 +574,15 @@ def ask():
     return jsonify({"answer": answer})
 
 
+@cook_bp.route("/api/cook/ask_chef/stream", methods=["POST"])
+def ask_stream():
+    """ask_chef 的 SSE 版本：边生成边推给前端。"""
+    data = request.get_json(force=True)
+    recipe = data.get("recipe", "")
+    question = data.get("question", "")
+    return sse_response(sse_text(ai.stream_chat(f"菜谱《{recipe}》，用户提问：{question}")))
+
+
 @cook_bp.route("/api/cook/token", methods=["POST"])
 def token():
     data = request.get_json(force=True)
@@ -252,8 +622,8 @@ def chef_chat():
     如果暂时想不到菜，就把 recipes 设为 []，reply 里诚实说明。
     """
 
-    ai_result = ai.generate_json(prompt)
-    if not ai_result:
+    ai_result = ai.generate_json(prompt, schema=ChefReply)
+    if ai_result is None:
         return jsonify(
             {
                 "reply": "我这会儿有点卡壳，你可以先用右边搜索框手动搜菜名。",
@@ -261,53 +631,129 @@ def chef_chat():
             }
         )
 
-    recipes = ai_result.get("recipes") or []
-    if isinstance(recipes, dict):
-        recipes = [recipes]
+    normalized = _normalize_recommendations(ai_result.recipes)
+    return jsonify({"reply": ai_result.reply, "recipes": normalized})
+
+
+def _parse_recommendations(data):
+    """流式聊天里分隔标记后面那段 JSON → [Recommendation]，不合格的元素丢掉。"""
+    if isinstance(data, dict) and "recipes" in data:
+        data = data["recipes"]
+    if not data:
+        return []
+    try:
+        return schema.coerce(List[Recommendation], data)
+    except schema.SchemaError:
+        return []
+
+
+def _normalize_recommendations(recipes):
+    """把 AI 推荐的菜（[Recommendation]）对到本地 recipes 表；不在库里的顺手生成一份。"""
+    wanted = [(r.name, r) for r in recipes]
+
+    rows = {name: catalog.find(name) for name, _ in wanted}
+
+    # 不在库里的菜：打包 / 并发生成写入数据库（耗时约等于一次 AI 调用，而不是 N 次）
+    missing = [name for name, row in rows.items() if row is None]
+    if missing:
+        for name, gen in zip(missing, generate_many(missing)):
+            if gen:
+                rows[name] = catalog.get(name)
 
     normalized = []
-    with db.get_cook_conn() as conn:
-        c = conn.cursor()
-        for r in recipes:
-            name = (r.get("name") or "").strip()
-            if not name:
-                continue
-
-            row = c.execute(
-                "SELECT * FROM recipes WHERE name LIKE ? LIMIT 1", (f"%{name}%",)
-            ).fetchone()
-
-            # 不在库里的菜：后台偷偷生成一份写入数据库
-            if not row:
-                gen = generate_and_save(name)
-                if gen:
-                    row = c.execute(
-                        "SELECT * FROM recipes WHERE name=?", (name,)
-                    ).fetchone()
-
-            if row:
-                normalized.append(
-                    {
-                        "name": row["name"],
-                        "score": int(r.get("score", 80)),
-                        "missing": r.get("missing") or [],
-                        "exists": True,
-                        "category": row["category"],
-                    }
-                )
+    for name, r in wanted:
+        row = rows[name]
+        if row:
+            normalized.append(
+                {
+                    "name": row.name,
+                    "score": 80 if r.score is None else r.score,
+                    "missing": r.missing,
+                    "exists": True,
+                    "category": row.category,
+                }
+            )
+        else:
+            normalized.append(
+                {
+                    "name": name,
+                    "score": 60 if r.score is None else r.score,
+                    "missing": r.missing,
+                    "exists": False,
+                }
+            )
+    return normalized
+
+
+# 流式聊天里，回复正文和推荐列表之间的分隔标记
+_RECIPES_MARK = "<<<RECIPES>>>"
+
+
+@cook_bp.route("/api/cook/chef_chat/stream", methods=["POST"])
+def chef_chat_stream():
+    """
+    chef_chat 的 SSE 版本：
+    - 先把口语化回复一段段推给前端（delta 事件）
+    - 模型写完后解析分隔标记后面的 JSON，推一个 recipes 事件
+    """
+    data = request.get_json(force=True)
+    message = (data.get("message") or "").strip()
+    if not message:
+        return sse_response(
+            iter(
+                [
+                    sse_event({"delta": "先告诉我你家里有什么食材吧～"}),
+                    sse_event({"recipes": []}, event="recipes"),
+                ]
+            )
+        )
+
+    prompt = f"""
+    你是一个根据用户现有食材推荐菜谱的中文 厨师助手。
+    用户说：\"{message}\"。
+
+    请先判断用户大概有哪些食材、是否有饮食限制（例如：想减脂、不要辣、不要油炸等）。
+
+    输出分两部分：
+    1. 先用口语化中文，2~3 句，对用户说今天可以怎么吃（纯文本，不要 JSON）。
+    2. 然后单独一行写 {_RECIPES_MARK}，下一行输出 JSON 数组（不要写多余文字），格式：
+    [
+      {{
+        "name": "对应的菜名",
+        "missing": ["缺少的关键食材1", "缺少的关键食材2"],
+        "score": 0 到 100 的整数，表示推荐程度
+      }}
+    ]
+    如果暂时想不到菜，就输出 []，回复里诚实说明。
+    """
+
+    def events():
+        buf = ""
+        emitted = 0
+        mark_at = -1
+        for delta in ai.stream_chat(prompt):
+            buf += delta
+            if mark_at < 0:
+                mark_at = buf.find(_RECIPES_MARK)
+            # 标记可能被拆在两段里，末尾留一截先不发
+            if mark_at >= 0:
+                safe_end = mark_at
             else:
-                normalized.append(
-                    {
-                        "name": name,
-                        "score": int(r.get("score", 60)),
-                        "missing": r.get("missing") or [],
-                        "exists": False,
-                    }
-                )
+                safe_end = len(buf) - len(_RECIPES_MARK) + 1
+            if safe_end > emitted:
+                yield sse_event({"delta": buf[emitted:safe_end]})
+                emitted = safe_end
 
-    return jsonify(
-        {"reply": ai_result.get("reply", "试着换个说法再问我一次吧～"), "recipes": normalized}
-    )
+        if mark_at < 0:
+            if len(buf) > emitted:
+                yield sse_event({"delta": buf[emitted:]})
+            recipes = []
+        else:
+            recipes = _parse_recommendations(ai._try_parse_json(buf[mark_at + len(_RECIPES_MARK):]))
+
+        yield sse_event({"recipes": _normalize_recommendations(recipes)}, event="recipes")
+
+    return sse_response(events())
 
 
 @cook_bp.route("/data/HowToCook/dishes/<path:filename>")
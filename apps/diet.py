@@ -1,64 +1,21 @@
-from flask import Blueprint, jsonify, request
-from core import ai, db
+from flask import Blueprint, Response, jsonify, request
+from core import ai, db, log_io, rollup, schema
+from core.food_index import FoodIndex
+from core.sse import sse_response, sse_text
+from dataclasses import dataclass, field
 import config
+import csv
 import datetime
 import json
-import os
 
 diet_bp = Blueprint("diet", __name__)
 
 # -------------------- 数据初始化 --------------------
 
 def init_diet_db():
-    conn = db.get_diet_conn()
-    c = conn.cursor()
-
-    # 用户表
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            height REAL,
-            gender TEXT,
-            age INTEGER,
-            target_weight REAL,
-            current_weight REAL
-        )
-        """
-    )
-
-    # 日志表：存食物记录与体重记录
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            date TEXT,
-            type TEXT,          -- 'food' / 'weight'
-            category TEXT,
-            value REAL,         -- 食物: kcal; 体重: kg
-            note TEXT
-        )
-        """
-    )
-
-    # 健康报告表
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS health_reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            date TEXT,
-            report_type TEXT,
-            analysis TEXT,
-            summary TEXT
-        )
-        """
-    )
-
-    conn.commit()
-    conn.close()
+    """启动阶段（run.create_app 里调用一次）：迁移检查 + 保证有默认用户。"""
+    # 建表 / 索引 / WAL 都交给 core.db 的版本化迁移，已是最新版本时直接跳过
+    db.migrate_diet()
 
     # 至少一个默认用户
     with db.get_diet_conn() as conn2:
@@ -72,16 +29,8 @@ def init_diet_db():
             conn2.commit()
 
 
-# JSON 食物库
-FOOD_DB = []
-if os.path.exists(config.FOOD_JSON):
-    try:
-        with open(config.FOOD_JSON, "r", encoding="utf-8") as f:
-            FOOD_DB = json.load(f)
-    except Exception:
-        FOOD_DB = []
-
-init_diet_db()
+# 食物库：第一次搜索时才 mmap 打开 data/food_store.bin（没有或 JSON 更新过就先从 JSON 构建）
+FOOD_INDEX = FoodIndex(json_path=config.FOOD_JSON, bin_path=config.FOOD_STORE)
 
 # -------------------- 小工具 --------------------
 
@@ -89,12 +38,72 @@ def _today():
     return datetime.date.today().isoformat()
 
 
+# 给前端 / 提示词的用户资料字段（不含 rev 这类内部列）
+_PROFILE_COLS = ("id", "name", "height", "gender", "age", "target_weight", "current_weight")
+
+
 def _get_user_profile(user_id: int):
     with db.get_diet_conn() as conn:
-        row = conn.execute("SELECT * FROM users WHERE id=?", (user_id,)).fetchone()
+        row = conn.execute(
+            f"SELECT {', '.join(_PROFILE_COLS)} FROM users WHERE id=?", (user_id,)
+        ).fetchone()
         return dict(row) if row else None
 
 
+def _touch_user(conn, uid):
+    """用户的数据（资料 / 记录）变了：rev + 1，仪表盘的 ETag 跟着变。在调用方的事务里执行。"""
+    conn.execute("UPDATE users SET rev = rev + 1 WHERE id=?", (uid,))
+
+
+# 聚合粒度 -> 分组表达式（周按周一归档，月按 YYYY-MM）
+_BUCKET_SQL = {
+    "day": "date",
+    "week": "date(date, '-6 days', 'weekday 1')",
+    "month": "substr(date, 1, 7)",
+}
+# 每种粒度一次最多查多少天（响应里每个桶一个点，区间不设上限的话 start=0001-01-01 能凑出几十万个）
+_MAX_SPAN_DAYS = {"day": 366, "week": 5 * 366, "month": 5 * 366}
+
+
+def _bucket_keys(start: datetime.date, end: datetime.date, granularity: str):
+    """start~end 之间所有的桶，保证没记录的日子也有一个 0。"""
+    keys = []
+    if granularity == "day":
+        d = start
+        while d <= end:
+            keys.append(d.isoformat())
+            d += datetime.timedelta(days=1)
+    elif granularity == "week":
+        d = start - datetime.timedelta(days=start.weekday())
+        while d <= end:
+            keys.append(d.isoformat())
+            d += datetime.timedelta(days=7)
+    else:
+        y, m = start.year, start.month
+        while (y, m) <= (end.year, end.month):
+            keys.append(f"{y:04d}-{m:02d}")
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return keys
+
+
+def _food_totals(conn, uid: int, start: datetime.date, end: datetime.date, granularity="day"):
+    """
+    区间内每个桶的总热量，返回 [(桶, 总热量), ...]。
+    读的是每日汇总表 daily_totals：主键上的范围查找，一天一行，不用再扫 logs。
+    """
+    rows = conn.execute(
+        f"""
+        SELECT {_BUCKET_SQL[granularity]} AS bucket, SUM(food_kcal) AS total
+          FROM daily_totals
+         WHERE user_id=? AND date BETWEEN ? AND ?
+         GROUP BY bucket
+        """,
+        (uid, start.isoformat(), end.isoformat()),
+    ).fetchall()
+    totals = {r["bucket"]: r["total"] or 0 for r in rows}
+    return [(k, totals.get(k, 0)) for k in _bucket_keys(start, end, granularity)]
+
+
 def _calc_bmr(profile: dict):
     if not profile:
         return 1800
@@ -136,6 +145,7 @@ def delete_user():
     uid = data.get("id")
     with db.get_diet_conn() as conn:
         conn.execute("DELETE FROM logs WHERE user_id=?", (uid,))
+        conn.execute("DELETE FROM daily_totals WHERE user_id=?", (uid,))
         conn.execute("DELETE FROM users WHERE id=?", (uid,))
         conn.commit()
     return jsonify({"status": "success"})
@@ -153,7 +163,8 @@ def save_profile():
                    gender=?,
                    age=?,
                    target_weight=?,
-                   current_weight=?
+                   current_weight=?,
+                   rev=rev + 1
              WHERE id=?
             """,
             (
@@ -172,21 +183,18 @@ def save_profile():
 
 @diet_bp.route("/api/search_food")
 def search_food():
+    """食物联想：完全相同 > 前缀 > 包含 > 模糊，取前 20 个。"""
     q = (request.args.get("q") or "").strip()
     if not q:
         return jsonify([])
-    res = []
-    for item in FOOD_DB:
-        name = item.get("name", "")
-        if q in name:
-            res.append({
-                "name": name,
-                "cal": item.get("cal") or item.get("kcal") or 0,
-                "emoji": item.get("emoji") or "🍽",
-            })
-        if len(res) >= 20:
-            break
-    return jsonify(res)
+    return jsonify(FOOD_INDEX.search(q, k=20))
+
+
+@dataclass
+class FoodEstimate:
+    """ai_estimate_food 要模型返回的结构（校验 / 转换见 core.schema）。"""
+    est_cal: int = field(metadata=schema.rule(min=0, max=20000))
+    name: str = field(default="", metadata=schema.rule(max_len=40))
 
 
 @diet_bp.route("/api/ai_estimate_food", methods=["POST"])
@@ -207,15 +215,11 @@ def ai_estimate_food():
 }}
 热量单位是 kcal，只要整数，不要加单位。
 """
-    answer = ai.chat_with_text(prompt)
-    try:
-        js = json.loads(answer)
-    except Exception:
-        import re
-        m = re.search(r"(\\d+)", answer or "")
-        est = int(m.group(1)) if m else 500
-        js = {"name": text[:20], "est_cal": est}
-    return jsonify(js)
+    est = ai.generate_json(prompt, max_tokens=300, schema=FoodEstimate)
+    if est is None:
+        # 和原来的接口保持一致：估不出来也回 200，按 500 kcal 兜底
+        return jsonify({"name": text[:20], "est_cal": 500})
+    return jsonify({"name": est.name or text[:20], "est_cal": est.est_cal})
 
 
 @diet_bp.route("/api/diet/analyze_food_photo", methods=["POST"])
@@ -232,72 +236,129 @@ def analyze_food_photo():
 
 # -------------------- 仪表盘 & 记录 --------------------
 
+# 今日记录一页多少条（?limit= 可调，封顶 _HISTORY_PAGE_MAX）
+_HISTORY_PAGE = 50
+_HISTORY_PAGE_MAX = 200
+
+# 资料 + 当天总热量 + 一页记录，一条语句一次查完
+_DASHBOARD_SQL = """
+SELECT (SELECT rev FROM users WHERE id = :uid) AS rev,
+       (SELECT json_object('id', id, 'name', name, 'height', height, 'gender', gender,
+                           'age', age, 'target_weight', target_weight,
+                           'current_weight', current_weight)
+          FROM users WHERE id = :uid) AS profile,
+       (SELECT food_kcal FROM daily_totals WHERE user_id = :uid AND date = :date) AS food_today,
+       (SELECT json_group_array(json_object('id', id, 'date', date, 'type', type,
+                                            'value', value, 'note', note))
+          FROM (SELECT id, date, type, value, note
+                  FROM logs
+                 WHERE user_id = :uid AND date = :date AND id < :before
+                 ORDER BY id DESC
+                 LIMIT :limit)) AS history
+"""
+
+
+def _dashboard_etag(uid, rev, date, before, limit):
+    # 用户每次写入 rev 都会变；同一个 rev 下同一页的内容是确定的
+    return f"{uid}-{rev or 0}-{date}-{before or ''}-{limit}"
+
+
 @diet_bp.route("/api/get_dashboard")
 def get_dashboard():
+    """
+    参数：user_id / date（默认今天）
+          before（上一页返回的 next_cursor，记录 id）/ limit（每页条数，默认 50）
+    支持 If-None-Match：用户没有新的写入时直接 304。
+    """
     uid = int(request.args.get("user_id", 1))
     date = request.args.get("date") or _today()
-
-    profile = _get_user_profile(uid)
-    bmr = _calc_bmr(profile)
+    try:
+        before = int(request.args.get("before") or 0) or None
+        limit = int(request.args.get("limit") or _HISTORY_PAGE)
+    except ValueError:
+        return jsonify({"error": "bad before/limit"}), 400
+    limit = max(1, min(limit, _HISTORY_PAGE_MAX))
 
     with db.get_diet_conn() as conn:
-        cur = conn.execute(
-            "SELECT COALESCE(SUM(value),0) AS total "
-            "FROM logs WHERE user_id=? AND date=? AND type='food'",
-            (uid, date),
-        )
-        food_today = cur.fetchone()["total"]
-
-        rows = conn.execute(
-            """
-            SELECT id,date,type,value,note
-              FROM logs
-             WHERE user_id=? AND date=?
-             ORDER BY id DESC
-            """,
-            (uid, date),
-        ).fetchall()
-
-    history = [{
-        "id": r["id"],
-        "date": r["date"],
-        "type": r["type"],
-        "value": r["value"],
-        "note": r["note"],
-    } for r in rows]
+        # 浏览器带着 ETag 来的：先只查 rev（主键点查），没变就不用再查别的
+        if request.if_none_match:
+            row = conn.execute("SELECT rev FROM users WHERE id=?", (uid,)).fetchone()
+            etag = _dashboard_etag(uid, row["rev"] if row else None, date, before, limit)
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(etag)
+
+        # 多取一条，用来判断后面还有没有
+        row = conn.execute(
+            _DASHBOARD_SQL,
+            {"uid": uid, "date": date, "before": before or 2**63 - 1, "limit": limit + 1},
+        ).fetchone()
+
+    profile = json.loads(row["profile"]) if row["profile"] else None
+    # json_group_array 不保证按子查询的顺序拼，这里再排一次
+    history = sorted(json.loads(row["history"]), key=lambda r: r["id"], reverse=True)
+    next_cursor = None
+    if len(history) > limit:
+        history = history[:limit]
+        next_cursor = history[-1]["id"]
 
     data = {
-        "food_today": float(food_today),
+        "food_today": float(row["food_today"] or 0),
         "current_weight": profile.get("current_weight") if profile else None,
-        "bmr": bmr,
+        "bmr": _calc_bmr(profile),
         "history": history,
+        "next_cursor": next_cursor,
     }
 
-    return jsonify({"profile": profile, "data": data})
+    resp = jsonify({"profile": profile, "data": data})
+    resp.set_etag(_dashboard_etag(uid, row["rev"], date, before, limit), weak=True)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def _not_modified(etag):
+    resp = Response(status=304)
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
 
 
 @diet_bp.route("/api/get_chart_data")
 def get_chart_data():
-    """近 30 天每日总热量，用于 K 线 + 日历."""
+    """
+    每日 / 每周 / 每月总热量，用于 K 线 + 日历。
+    参数：start / end（YYYY-MM-DD，默认近 30 天），granularity=day|week|month
+    区间上限：按天 366 天，按周 / 按月 5 年，超了返回 400
+    """
     uid = int(request.args.get("user_id", 1))
-    days = 30
-    today = datetime.date.today()
+    granularity = request.args.get("granularity") or "day"
+    if granularity not in _BUCKET_SQL:
+        return jsonify({"error": "granularity must be day/week/month"}), 400
 
-    dates, values = [], []
-    with db.get_diet_conn() as conn:
-        for i in range(days - 1, -1, -1):
-            d = today - datetime.timedelta(days=i)
-            ds = d.isoformat()
-            cur = conn.execute(
-                "SELECT COALESCE(SUM(value),0) AS total "
-                "FROM logs WHERE user_id=? AND date=? AND type='food'",
-                (uid, ds),
-            )
-            total = cur.fetchone()["total"] or 0
-            dates.append(ds)
-            values.append(float(total))
+    try:
+        end = datetime.date.fromisoformat(request.args.get("end") or _today())
+        start_arg = request.args.get("start")
+        start = (
+            datetime.date.fromisoformat(start_arg)
+            if start_arg
+            else end - datetime.timedelta(days=29)
+        )
+    except ValueError:
+        return jsonify({"error": "bad date"}), 400
+    if start > end:
+        return jsonify({"error": "start > end"}), 400
+    if (end - start).days >= _MAX_SPAN_DAYS[granularity]:
+        return jsonify({"error": f"range too long for {granularity}: max {_MAX_SPAN_DAYS[granularity]} days"}), 400
 
-    return jsonify({"dates": dates, "values": values})
+    with db.get_diet_conn() as conn:
+        totals = _food_totals(conn, uid, start, end, granularity)
+
+    return jsonify(
+        {
+            "dates": [k for k, _ in totals],
+            "values": [float(v) for _, v in totals],
+            "granularity": granularity,
+        }
+    )
 
 
 @diet_bp.route("/api/add", methods=["POST"])
@@ -319,6 +380,8 @@ def add_log():
                 "UPDATE users SET current_weight=? WHERE id=?",
                 (value, uid),
             )
+        rollup.refresh(conn, [(uid, date)])
+        _touch_user(conn, uid)
         conn.commit()
     return jsonify({"status": "success"})
 
@@ -328,34 +391,154 @@ def delete_log():
     data = request.get_json(force=True)
     log_id = data.get("id")
     with db.get_diet_conn() as conn:
+        row = conn.execute("SELECT user_id, date FROM logs WHERE id=?", (log_id,)).fetchone()
         conn.execute("DELETE FROM logs WHERE id=?", (log_id,))
+        if row:
+            rollup.refresh(conn, [(row["user_id"], row["date"])])
+            _touch_user(conn, row["user_id"])
         conn.commit()
     return jsonify({"status": "success"})
 
-# -------------------- AI 日报 --------------------
+# -------------------- 批量导入 / 导出 --------------------
 
-@diet_bp.route("/api/diet/daily_report", methods=["POST"])
-def daily_report():
-    data = request.get_json(force=True)
-    uid = int(data.get("user_id", 1))
+_INSERT_LOG_SQL = "INSERT INTO logs (user_id,date,type,category,value,note) VALUES (?,?,?,?,?,?)"
+_MAX_REPORTED_ERRORS = 50
+
+
+def _import_chunk(conn, uid, rows):
+    """一批行一个事务：插入 + 重算涉及的每日汇总 + 更新当前体重 + rev。"""
+    with conn:
+        conn.executemany(_INSERT_LOG_SQL, [(uid, *r) for r in rows])
+        rollup.refresh(conn, [(uid, r[0]) for r in rows])
+        if any(r[1] == "weight" for r in rows):
+            # 导入的是历史数据，当前体重取日期最新的那条，而不是文件里最后一行
+            conn.execute(
+                """
+                UPDATE users
+                   SET current_weight = (SELECT value FROM logs
+                                          WHERE user_id=? AND type='weight'
+                                          ORDER BY date DESC, id DESC LIMIT 1)
+                 WHERE id=?
+                """,
+                (uid, uid),
+            )
+        _touch_user(conn, uid)
 
+
+@diet_bp.route("/api/diet/import", methods=["POST"])
+def import_logs():
+    """
+    批量导入饮食记录。
+    上传：multipart 的 file 字段，或者直接把文件内容当请求体
+    参数：user_id；format=csv|jsonl（不给就按文件名 / Content-Type 猜）
+    每 config.DIET_IMPORT_CHUNK 行 executemany 一次、一个事务；不合法的行跳过并报告行号。
+    """
+    uid = int(request.args.get("user_id", 1))
+    with db.get_diet_conn() as conn:
+        if conn.execute("SELECT 1 FROM users WHERE id=?", (uid,)).fetchone() is None:
+            return jsonify({"error": "no such user"}), 404
+
+    upload = request.files.get("file")
+    if upload is not None:
+        stream, fmt = upload.stream, log_io.guess_format(upload.filename, upload.mimetype)
+    else:
+        stream, fmt = request.stream, log_io.guess_format(mimetype=request.mimetype)
+    fmt = request.args.get("format") or fmt
+    if fmt not in log_io.FORMATS:
+        return jsonify({"error": "format must be csv/jsonl"}), 400
+
+    chunk_size = max(1, config.DIET_IMPORT_CHUNK)
+    imported, skipped, errors = 0, 0, []
+    batch = []
+    conn = db.get_diet_conn()
+    try:
+        for line_no, raw in log_io.read_rows(stream, fmt):
+            try:
+                if isinstance(raw, log_io.RowError):
+                    raise raw
+                batch.append(log_io.clean_row(raw))
+            except log_io.RowError as e:
+                skipped += 1
+                if len(errors) < _MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_no, "error": str(e)})
+                continue
+            if len(batch) >= chunk_size:
+                _import_chunk(conn, uid, batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            _import_chunk(conn, uid, batch)
+            imported += len(batch)
+    except (UnicodeDecodeError, csv.Error) as e:
+        # 文件本身坏了：已经提交的批次保留，告诉调用方停在了哪
+        return jsonify({
+            "error": f"unreadable {fmt}: {e}",
+            "imported": imported,
+            "skipped": skipped,
+            "errors": errors,
+        }), 400
+
+    return jsonify({"status": "success", "imported": imported, "skipped": skipped, "errors": errors})
+
+
+@diet_bp.route("/api/diet/export")
+def export_logs():
+    """
+    导出饮食记录（按日期排序），边查边写，不把全部记录读进内存。
+    参数：user_id；format=csv|jsonl；start / end（YYYY-MM-DD，可选）
+    """
+    uid = int(request.args.get("user_id", 1))
+    fmt = request.args.get("format") or "csv"
+    if fmt not in log_io.FORMATS:
+        return jsonify({"error": "format must be csv/jsonl"}), 400
+    try:
+        start = datetime.date.fromisoformat(request.args.get("start") or "0001-01-01").isoformat()
+        end = datetime.date.fromisoformat(request.args.get("end") or "9999-12-31").isoformat()
+    except ValueError:
+        return jsonify({"error": "bad date"}), 400
+
+    def rows():
+        # 按 (date, id) 翻页，每批一条短查询：不会在整个下载期间一直占着读事务。
+        # idx_logs_user_date 的索引项自带 rowid(id)，顺序正好是 (date, id)：每页从上一页最后一条
+        # 的日期直接定位过去，再顺着索引往后读，不用临时排序。
+        # 下界写成 date >= max(start, 上一页日期)：写成行值比较 (date, id) > (?, ?) 的话，
+        # SQLite 只拿 BETWEEN 的下界定位，每页都从 start 扫起，导出就成了平方级
+        last_date, last_id = start, 0
+        while True:
+            with db.get_diet_conn() as conn:
+                batch = conn.execute(
+                    """
+                    SELECT id, date, type, category, value, note
+                      FROM logs
+                     WHERE user_id=? AND date >= ? AND date <= ? AND (date > ? OR id > ?)
+                     ORDER BY date, id
+                     LIMIT ?
+                    """,
+                    (uid, last_date, end, last_date, last_id, max(1, config.DIET_IMPORT_CHUNK)),
+                ).fetchall()
+            if not batch:
+                return
+            last_date, last_id = batch[-1]["date"], batch[-1]["id"]
+            yield from batch
+
+    return Response(
+        log_io.write_rows(rows(), fmt),
+        content_type=log_io.MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename=diet_logs_{uid}.{fmt}"},
+    )
+
+# -------------------- AI 日报 --------------------
+
+def _daily_report_prompt(uid: int) -> str:
     profile = _get_user_profile(uid)
     bmr = _calc_bmr(profile)
 
     today = datetime.date.today()
     with db.get_diet_conn() as conn:
-        lines = []
-        for i in range(6, -1, -1):
-            d = today - datetime.timedelta(days=i)
-            ds = d.isoformat()
-            total = conn.execute(
-                "SELECT COALESCE(SUM(value),0) AS total "
-                "FROM logs WHERE user_id=? AND date=? AND type='food'",
-                (uid, ds),
-            ).fetchone()["total"]
-            lines.append(f"{ds}: {total} kcal")
+        totals = _food_totals(conn, uid, today - datetime.timedelta(days=6), today)
+    lines = [f"{ds}: {total} kcal" for ds, total in totals]
 
-    prompt = f"""
+    return f"""
 你是一位健身营养教练。
 
 用户基础信息：{json.dumps(profile, ensure_ascii=False)}
@@ -371,5 +554,19 @@ def daily_report():
 
 只输出中文自然语言，不要列表编号。
 """
-    text = ai.chat_with_text(prompt)
+
+
+@diet_bp.route("/api/diet/daily_report", methods=["POST"])
+def daily_report():
+    data = request.get_json(force=True)
+    uid = int(data.get("user_id", 1))
+    text = ai.chat_with_text(_daily_report_prompt(uid))
     return jsonify({"report": text})
+
+
+@diet_bp.route("/api/diet/daily_report/stream", methods=["POST"])
+def daily_report_stream():
+    """daily_report 的 SSE 版本：报告边写边推。"""
+    data = request.get_json(force=True)
+    uid = int(data.get("user_id", 1))
+    return sse_response(sse_text(ai.stream_chat(_daily_report_prompt(uid))))
@@ -5,6 +5,8 @@ import shutil
 # 这些是网站运行的核心，绝对不能动
 KEEP_FILES = [
     "run.py",           # 新的启动入口
+    "wsgi.py",          # gunicorn 入口
+    "gunicorn.conf.py", # gunicorn 配置
     "config.py",        # 配置文件
     "ai_clean_db.py",   # 清洗数据库脚本 (留着以后更新数据用)
     "cleanup_project.py" # 本脚本
@@ -16,6 +18,7 @@ KEEP_DIRS = [
     "templates", # 页面
     "static",    # JS/CSS
     "data",      # 数据库和菜谱文件
+    "tools",     # 压测 / 调试小工具
     "_ARCHIVE"   # 归档目录
 ]
 
@@ -5,6 +5,24 @@ import os
 # 通义千问的 Key，推荐只用这个
 QWEN_API_KEY = os.getenv("QWEN_API_KEY", "")
 
+# ai_clean_db.py 批量清洗菜谱用的 Gemini Key
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
+
+# ========== 通义千问连接参数 ==========
+
+# 压测 / 本地调试时可以指到假的 DashScope 服务
+QWEN_API_URL = os.getenv(
+    "QWEN_API_URL",
+    "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation",
+)
+QWEN_CONNECT_TIMEOUT = float(os.getenv("QWEN_CONNECT_TIMEOUT", "5"))   # 秒
+QWEN_TIMEOUT = float(os.getenv("QWEN_TIMEOUT", "30"))                   # 秒，单次读超时
+QWEN_POOL_SIZE = int(os.getenv("QWEN_POOL_SIZE", "20"))                 # keep-alive 连接池大小
+QWEN_MAX_RETRIES = int(os.getenv("QWEN_MAX_RETRIES", "3"))              # 429/5xx 重试次数
+QWEN_BREAKER_THRESHOLD = int(os.getenv("QWEN_BREAKER_THRESHOLD", "5"))  # 连续失败几次熔断
+QWEN_BREAKER_COOLDOWN = float(os.getenv("QWEN_BREAKER_COOLDOWN", "30"))  # 熔断冷却秒数
+QWEN_ASYNC_WAIT = float(os.getenv("QWEN_ASYNC_WAIT", "120"))          # run_async 最多等几秒，超时取消协程
+
 # ========== 数据与文件路径 ==========
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -19,5 +37,37 @@ DB_COOK = os.path.join(DATA_DIR, "cook_data.db")
 # HowToCook 菜谱根目录
 COOK_ROOT = os.path.join(DATA_DIR, "HowToCook", "dishes")
 
+# 菜谱详情 HTML 缓存：内存 LRU 条数、启动时是否后台预热
+COOK_HTML_CACHE_ITEMS = int(os.getenv("COOK_HTML_CACHE_ITEMS", "512"))
+COOK_HTML_WARM = os.getenv("COOK_HTML_WARM", "1") == "1"
+
+# 聊天推荐里有多道新菜要生成时，同时最多并发几个 AI 请求
+COOK_GEN_CONCURRENCY = int(os.getenv("COOK_GEN_CONCURRENCY", "5"))
+# 多道新菜打包成一次请求，每包几道（1 = 不打包，一道一个请求）
+COOK_GEN_BATCH = int(os.getenv("COOK_GEN_BATCH", "4"))
+
 # 食物热量 JSON
 FOOD_JSON = os.path.join(DATA_DIR, "food_database.json")
+# 由 FOOD_JSON 构建的二进制食物库（mmap 只读共享，JSON 更新后自动重建）
+FOOD_STORE = os.path.join(DATA_DIR, "food_store.bin")
+
+# 饮食记录批量导入：每多少行一个事务（导出也按这个行数分批查库）
+DIET_IMPORT_CHUNK = int(os.getenv("DIET_IMPORT_CHUNK", "1000"))
+
+# SQLite 连接参数（每条连接建立时设置一次）
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 字节
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))                  # 页缓存 KB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))     # 等锁毫秒数
+
+# ========== 大模型回复缓存 ==========
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_DB = os.path.join(DATA_DIR, "llm_cache.db")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))   # 秒
+LLM_CACHE_MEM_ITEMS = int(os.getenv("LLM_CACHE_MEM_ITEMS", "512"))    # 内存 LRU 条数
+LLM_CACHE_DISK_ITEMS = int(os.getenv("LLM_CACHE_DISK_ITEMS", "20000"))  # SQLite 条数上限
+
+# ========== 大模型 JSON 输出 ==========
+
+# generate_json 解析失败时再发一次请求，只让模型把坏掉的那段 JSON 修好（0 = 直接放弃）
+LLM_JSON_REPAIR = os.getenv("LLM_JSON_REPAIR", "1") == "1"
@@ -1,36 +1,83 @@
 # 文件: core/ai.py
 # 说明: 使用阿里云通义千问（DashScope）作为小ka的大脑
+#   同步接口（chat_with_text / generate_json ...）给普通视图用；
+#   要同时发好几个请求时用异步接口（agenerate_json + gather_limited，再用 run_async 等结果）
 
-import requests
+import asyncio
 import json
 import base64
-import re
+import os
+import threading
+
+import httpx
+
 import config
+from core import json_extract
+from core.cache import llm_cache, make_key
+from core.schema import SchemaError, coerce
+from core.http import RETRY_STATUSES, CircuitBreaker, CircuitOpenError, backoff_delay, make_session
 
 # DashScope 文本生成接口
-QWEN_API_URL = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+QWEN_API_URL = config.QWEN_API_URL
+QWEN_MODEL = "qwen-plus"  # 额度允许的话可以换成 qwen-max / qwen-turbo
 
 # 优先用通义千问的 Key
 API_KEY = config.QWEN_API_KEY
 
+# 全进程共用一个带连接池和重试的 Session，外加熔断器
+_session = make_session(pool_size=config.QWEN_POOL_SIZE, max_retries=config.QWEN_MAX_RETRIES)
+_breaker = CircuitBreaker(
+    failure_threshold=config.QWEN_BREAKER_THRESHOLD,
+    cooldown=config.QWEN_BREAKER_COOLDOWN,
+)
+
 
-def _call_qwen(messages, temperature=0.7, max_tokens=1024):
+def _call_qwen(messages, temperature=0.7, max_tokens=1024, use_cache=True, store=True):
     """
     调用通义千问文本接口。
     messages: [{"role": "system"|"user"|"assistant", "content": "xxx"}, ...]
     成功时返回模型回复的字符串，失败时返回 None。
+    相同 (model, messages, temperature, max_tokens) 的请求直接走缓存。
+    store=False：只读缓存不写，回复要调用方检查过能用再 _cache_put（见 generate_json）
     """
-    if not API_KEY:
-        print("[Qwen] no API key, please set QWEN_API_KEY in environment")
-        return None
+    use_cache = use_cache and config.LLM_CACHE_ENABLED
+    if use_cache:
+        key = make_key(QWEN_MODEL, messages, temperature, max_tokens)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    result = _request_qwen(messages, temperature, max_tokens)
+    if use_cache and store and result:
+        llm_cache.put(key, result)
+    return result
+
+
+def _cache_put(messages, temperature, max_tokens, result):
+    """把调用方确认能用的回复记到这组参数名下。"""
+    if config.LLM_CACHE_ENABLED and result:
+        llm_cache.put(make_key(QWEN_MODEL, messages, temperature, max_tokens), result)
 
+
+def cache_stats() -> dict:
+    """缓存命中情况，方便排查 / 看省了多少调用。"""
+    return llm_cache.stats()
+
+
+def _headers(stream=False):
     headers = {
         "Authorization": f"Bearer {API_KEY}",
         "Content-Type": "application/json",
     }
+    if stream:
+        headers["X-DashScope-SSE"] = "enable"
+        headers["Accept"] = "text/event-stream"
+    return headers
 
+
+def _payload(messages, temperature, max_tokens, stream=False):
     payload = {
-        "model": "qwen-plus",  # 额度允许的话可以换成 qwen-max / qwen-turbo
+        "model": QWEN_MODEL,
         "input": {
             "messages": messages
         },
@@ -40,55 +87,281 @@ def _call_qwen(messages, temperature=0.7, max_tokens=1024):
             "temperature": temperature,
         }
     }
+    if stream:
+        # 每个事件只带新增的那一小段，而不是到目前为止的全文
+        payload["parameters"]["incremental_output"] = True
+    return payload
+
+
+def _record_status(status_code):
+    # 429 / 5xx（重试完还是失败）才算上游故障；其余 4xx 是请求本身的问题
+    if status_code == 429 or status_code >= 500:
+        _breaker.record_failure()
+    else:
+        _breaker.record_success()
+
+
+def _request_qwen(messages, temperature, max_tokens):
+    """真正发请求的部分，不经过缓存。"""
+    if not API_KEY:
+        print("[Qwen] no API key, please set QWEN_API_KEY in environment")
+        return None
+
+    headers = _headers()
+    payload = _payload(messages, temperature, max_tokens)
 
     try:
-        resp = requests.post(QWEN_API_URL, headers=headers, json=payload, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-
-        # 官方返回结构: output.choices[0].message.content
-        return (
-            data.get("output", {})
-                .get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "")
+        _breaker.before_call()
+    except CircuitOpenError:
+        print("[Qwen] circuit open, fail fast")
+        return None
+
+    try:
+        resp = _session.post(
+            QWEN_API_URL,
+            headers=headers,
+            json=payload,
+            timeout=(config.QWEN_CONNECT_TIMEOUT, config.QWEN_TIMEOUT),
         )
     except Exception as e:
+        _breaker.record_failure()
         print("[Qwen] request failed:", repr(e))
         return None
 
+    _record_status(resp.status_code)
 
-# --------- JSON 解析小工具 ---------
+    try:
+        resp.raise_for_status()
+        return _content(resp.json())
+    except Exception as e:
+        print("[Qwen] request failed:", repr(e))
+        return None
 
-def _try_parse_json(text: str):
-    """尽量从模型输出里抠出 JSON（容错处理）"""
-    if not text:
+
+def _content(data):
+    # 官方返回结构: output.choices[0].message.content
+    return (
+        data.get("output", {})
+            .get("choices", [{}])[0]
+            .get("message", {})
+            .get("content", "")
+    )
+
+
+def _stream_qwen(messages, temperature=0.7, max_tokens=1024, use_cache=True):
+    """
+    流式调用（DashScope SSE + incremental_output），逐段 yield 模型输出。
+    失败时什么都不 yield，由调用方兜底；完整结果照样写进缓存。
+    """
+    use_cache = use_cache and config.LLM_CACHE_ENABLED
+    if use_cache:
+        key = make_key(QWEN_MODEL, messages, temperature, max_tokens)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    if not API_KEY:
+        print("[Qwen] no API key, please set QWEN_API_KEY in environment")
+        return
+
+    try:
+        _breaker.before_call()
+    except CircuitOpenError:
+        print("[Qwen] circuit open, fail fast")
+        return
+
+    try:
+        resp = _session.post(
+            QWEN_API_URL,
+            headers=_headers(stream=True),
+            json=_payload(messages, temperature, max_tokens, stream=True),
+            timeout=(config.QWEN_CONNECT_TIMEOUT, config.QWEN_TIMEOUT),
+            stream=True,
+        )
+    except Exception as e:
+        _breaker.record_failure()
+        print("[Qwen] stream request failed:", repr(e))
+        return
+
+    _record_status(resp.status_code)
+    if resp.status_code != 200:
+        print("[Qwen] stream request failed: HTTP", resp.status_code)
+        resp.close()
+        return
+
+    parts = []
+    try:
+        # chunk_size=None：DashScope 是 chunked 编码，来一块处理一块，不攒 512 字节
+        for line in resp.iter_lines(chunk_size=None, decode_unicode=False):
+            # SSE 行形如 "id:1" / "event:result" / "data:{...}"，只关心 data
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = json.loads(line[5:].decode("utf-8"))
+            if data.get("code"):
+                print("[Qwen] stream error:", data.get("code"), data.get("message"))
+                break
+            choice = (data.get("output", {}).get("choices") or [{}])[0]
+            delta = choice.get("message", {}).get("content", "")
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        print("[Qwen] stream interrupted:", repr(e))
+        return
+    finally:
+        resp.close()
+
+    if use_cache and parts:
+        llm_cache.put(key, "".join(parts))
+
+
+# --------- 异步接口 ---------
+# 一个后台线程跑常驻事件循环，所有异步请求共用一个 httpx.AsyncClient（连接池）。
+# Flask 视图是同步的：把协程交给 run_async，在当前线程里等结果。
+# 缓存 / 熔断器和同步接口是同一套。
+
+_aloop = None
+_aclient = None
+_aloop_pid = None
+_aloop_lock = threading.Lock()
+
+
+def _async_loop():
+    global _aloop, _aclient, _aloop_pid
+    with _aloop_lock:
+        # 懒启动；gunicorn preload fork 出来的子进程里没有这个线程，要重新起
+        if _aloop is None or _aloop_pid != os.getpid():
+            _aloop = asyncio.new_event_loop()
+            _aclient = httpx.AsyncClient(
+                timeout=httpx.Timeout(config.QWEN_TIMEOUT, connect=config.QWEN_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=config.QWEN_POOL_SIZE,
+                    max_keepalive_connections=config.QWEN_POOL_SIZE,
+                ),
+                # 只重试建连失败；429 / 5xx 在 _arequest_qwen 里按 Retry-After 重试
+                transport=httpx.AsyncHTTPTransport(retries=config.QWEN_MAX_RETRIES),
+            )
+            _aloop_pid = os.getpid()
+            threading.Thread(target=_aloop.run_forever, name="qwen-async", daemon=True).start()
+        return _aloop
+
+
+def run_async(coro, timeout=None):
+    """
+    在后台事件循环里跑协程，阻塞等结果（给同步的 Flask 视图用）。
+    最多等 timeout 秒（默认 config.QWEN_ASYNC_WAIT），超时取消协程并抛 TimeoutError，
+    循环卡住时请求线程不会跟着永远挂着。
+    """
+    fut = asyncio.run_coroutine_threadsafe(coro, _async_loop())
+    try:
+        return fut.result(config.QWEN_ASYNC_WAIT if timeout is None else timeout)
+    except TimeoutError:
+        fut.cancel()
+        raise
+
+
+async def gather_limited(aws, limit):
+    """asyncio.gather，但同时最多 limit 个在跑；异常按结果返回，不会连累别的任务。"""
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def run(aw):
+        async with sem:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=True)
+
+
+async def _acall_qwen(messages, temperature=0.7, max_tokens=1024, use_cache=True, store=True):
+    """_call_qwen 的异步版本。"""
+    use_cache = use_cache and config.LLM_CACHE_ENABLED
+    if use_cache:
+        key = make_key(QWEN_MODEL, messages, temperature, max_tokens)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    result = await _arequest_qwen(messages, temperature, max_tokens)
+    if use_cache and store and result:
+        llm_cache.put(key, result)
+    return result
+
+
+async def _arequest_qwen(messages, temperature, max_tokens):
+    if not API_KEY:
+        print("[Qwen] no API key, please set QWEN_API_KEY in environment")
         return None
 
-    # 1. 如果有 ```json ... ``` 包裹，先取出来
-    block = re.search(r"```json(.*?)```", text, re.S | re.I)
-    if block:
-        text = block.group(1)
+    try:
+        _breaker.before_call()
+    except CircuitOpenError:
+        print("[Qwen] circuit open, fail fast")
+        return None
+
+    payload = _payload(messages, temperature, max_tokens)
+    for attempt in range(config.QWEN_MAX_RETRIES + 1):
+        try:
+            resp = await _aclient.post(QWEN_API_URL, headers=_headers(), json=payload)
+        except Exception as e:
+            _breaker.record_failure()
+            print("[Qwen] async request failed:", repr(e))
+            return None
+        if resp.status_code not in RETRY_STATUSES or attempt == config.QWEN_MAX_RETRIES:
+            break
+        await asyncio.sleep(backoff_delay(attempt, resp.headers.get("Retry-After")))
 
-    # 2. 再尝试截取第一个 { 或 [
-    m = re.search(r"([\{\[][\s\S]*[\}\]])", text)
-    if m:
-        text = m.group(1)
+    _record_status(resp.status_code)
 
     try:
-        return json.loads(text)
-    except Exception:
+        resp.raise_for_status()
+        return _content(resp.json())
+    except Exception as e:
+        print("[Qwen] async request failed:", repr(e))
         return None
 
 
-# ========= 对外给后端用的三个函数 =========
+# --------- JSON 解析小工具 ---------
 
-def chat_with_text(prompt: str) -> str:
+def _try_parse_json(text: str):
+    """尽量从模型输出里抠出 JSON（容错处理见 core.json_extract），失败返回 None"""
+    return json_extract.extract_json(text)
+
+
+# generate_json 的解析结果计数：
+#   ok 直接解析成功 / repaired 本地修补后成功 / retried 让模型修过才成功 / failed 还是不行
+_json_stats = {"ok": 0, "repaired": 0, "retried": 0, "failed": 0}
+# 带 schema 的调用：valid 一次通过 / reprompted 让模型重写后通过 / invalid 重写后还不符合
+_schema_stats = {"valid": 0, "reprompted": 0, "invalid": 0}
+_json_stats_lock = threading.Lock()
+
+
+def _count_json(outcome, stats=_json_stats):
+    with _json_stats_lock:
+        stats[outcome] += 1
+
+
+def json_stats() -> dict:
     """
-    普通聊天 / 解释说明。
-    用于：小卡大厨聊天、小卡营养师分析等。
+    JSON 解析成功率。first_pass_rate：不用额外调用模型就成功的比例；
+    success_rate：算上修复重试的最终成功率。没有回复（网络失败）的不计入。
     """
-    messages = [
+    with _json_stats_lock:
+        s = dict(_json_stats)
+        s["schema"] = dict(_schema_stats)
+    total = s["ok"] + s["repaired"] + s["retried"] + s["failed"]
+    s["total"] = total
+    s["first_pass_rate"] = round((s["ok"] + s["repaired"]) / total, 4) if total else None
+    s["success_rate"] = round((total - s["failed"]) / total, 4) if total else None
+    return s
+
+
+# ========= 对外给后端用的函数 =========
+
+CHAT_FALLBACK = "小ka 这边连不上通义千问服务器了，稍后再试试叭～"
+
+
+def _chat_messages(prompt: str):
+    return [
         {
             "role": "system",
             "content": "你是一个说话可爱、但是讲解很认真、会控制热量的小厨娘“小ka”，用中文回答，语气口语化简洁。"
@@ -96,19 +369,93 @@ def chat_with_text(prompt: str) -> str:
         {"role": "user", "content": prompt},
     ]
 
-    result = _call_qwen(messages, temperature=0.6, max_tokens=800)
+
+def chat_with_text(prompt: str) -> str:
+    """
+    普通聊天 / 解释说明。
+    用于：小卡大厨聊天、小卡营养师分析等。
+    """
+    result = _call_qwen(_chat_messages(prompt), temperature=0.6, max_tokens=800)
     if not result:
-        return "小ka 这边连不上通义千问服务器了，稍后再试试叭～"
+        return CHAT_FALLBACK
 
     return result
 
 
-def generate_json(prompt: str):
+def stream_chat(prompt: str):
+    """
+    chat_with_text 的流式版本：生成器，逐段 yield 文本。
+    一个字都没拿到时 yield 兜底文案，保证前端总能看到点东西。
+    """
+    got_any = False
+    for delta in _stream_qwen(_chat_messages(prompt), temperature=0.6, max_tokens=800):
+        got_any = True
+        yield delta
+    if not got_any:
+        yield CHAT_FALLBACK
+
+
+def generate_json(prompt: str, max_tokens=1200, schema=None):
     """
     让模型输出结构化 JSON（用于：解析食材、生成菜谱结构、热量分析等）。
     返回 Python dict / list，失败时返回 None。
+    schema: 可选，dataclass 或 List[dataclass]（声明方式见 core.schema）。
+            给了就返回校验 + 转换好的实例；不符合时带着错误让模型重写一次，还不行返回 None。
+    缓存：解析（和校验）通过了才写，记的是最后能用的那份回复；修复 / 重写的请求不走缓存，
+    免得一份坏回复在缓存里卡上 LLM_CACHE_TTL 那么久，之后的重试也全打在它身上。
     """
-    messages = [
+    messages = _json_messages(prompt)
+    result = _call_qwen(messages, temperature=0.2, max_tokens=max_tokens, store=False)
+    js, broken = _parse_json_result(result)
+    accepted = result
+    if broken is not None:
+        accepted = _call_qwen(_repair_messages(broken), temperature=0, max_tokens=max_tokens, use_cache=False)
+        js = _parse_repaired(accepted, result)
+    if js is None:
+        return None
+
+    if schema is not None:
+        js, error = _validate(schema, js)
+        if error is not None:
+            accepted = _call_qwen(
+                _reprompt_messages(messages, result, error),
+                temperature=0.2, max_tokens=max_tokens, use_cache=False,
+            )
+            js = _validate_reprompt(schema, accepted, error)
+            if js is None:
+                return None
+    _cache_put(messages, 0.2, max_tokens, accepted)
+    return js
+
+
+async def agenerate_json(prompt: str, max_tokens=1200, schema=None):
+    """generate_json 的异步版本，多个请求可以用 gather_limited 并发。"""
+    messages = _json_messages(prompt)
+    result = await _acall_qwen(messages, temperature=0.2, max_tokens=max_tokens, store=False)
+    js, broken = _parse_json_result(result)
+    accepted = result
+    if broken is not None:
+        accepted = await _acall_qwen(_repair_messages(broken), temperature=0, max_tokens=max_tokens, use_cache=False)
+        js = _parse_repaired(accepted, result)
+    if js is None:
+        return None
+
+    if schema is not None:
+        js, error = _validate(schema, js)
+        if error is not None:
+            accepted = await _acall_qwen(
+                _reprompt_messages(messages, result, error),
+                temperature=0.2, max_tokens=max_tokens, use_cache=False,
+            )
+            js = _validate_reprompt(schema, accepted, error)
+            if js is None:
+                return None
+    _cache_put(messages, 0.2, max_tokens, accepted)
+    return js
+
+
+def _json_messages(prompt: str):
+    return [
         {
             "role": "system",
             "content": (
@@ -121,13 +468,87 @@ def generate_json(prompt: str):
         {"role": "user", "content": prompt},
     ]
 
-    result = _call_qwen(messages, temperature=0.2, max_tokens=1200)
-    js = _try_parse_json(result)
-    if js is None:
+
+def _parse_json_result(result):
+    """
+    返回 (解析结果, 要交给模型修的 Extraction)。
+    解析成功、没有回复、或者回复里压根没有 JSON 的样子时，后者为 None。
+    """
+    if not result:
+        return None, None
+    ex = json_extract.extract(result)
+    if ex.value is not None:
+        _count_json("repaired" if ex.repaired else "ok")
+        return ex.value, None
+    if ex.fragment is None or not config.LLM_JSON_REPAIR:
+        _count_json("failed")
         print("[Qwen] JSON parse failed, raw text:", result)
+        return None, None
+    return None, ex
+
+
+def _repair_messages(ex):
+    """只把坏掉的那段 JSON 发回去让模型修语法，比整个重新生成便宜。"""
+    return [
+        {
+            "role": "system",
+            "content": "你是 JSON 语法修复工具，只输出修好的合法 JSON，不要任何解释。",
+        },
+        {
+            "role": "user",
+            "content": (
+                f"下面这段 JSON 解析失败（{ex.error}）。"
+                "请只修正语法（括号、引号、逗号、转义），不要增删或改写内容；"
+                "如果末尾被截断了，去掉不完整的最后一项再补全括号：\n"
+                f"{ex.fragment}"
+            ),
+        },
+    ]
+
+
+def _parse_repaired(fixed, raw):
+    js = json_extract.extract_json(fixed) if fixed else None
+    if js is None:
+        _count_json("failed")
+        print("[Qwen] JSON parse failed after repair retry, raw text:", raw)
+    else:
+        _count_json("retried")
     return js
 
 
+def _validate(schema, js):
+    """返回 (实例, None) 或 (None, SchemaError)。"""
+    try:
+        typed = coerce(schema, js)
+    except SchemaError as e:
+        return None, e
+    _count_json("valid", _schema_stats)
+    return typed, None
+
+
+def _reprompt_messages(messages, result, error):
+    """原对话 + 模型上次的回答 + 哪里不对，让它按原格式重写一遍。"""
+    return messages + [
+        {"role": "assistant", "content": result},
+        {
+            "role": "user",
+            "content": f"上面的 JSON 不符合要求：{error}。请按原来要求的格式完整地重新输出 JSON，不要解释。",
+        },
+    ]
+
+
+def _validate_reprompt(schema, text, first_error):
+    js = json_extract.extract_json(text) if text else None
+    try:
+        typed = coerce(schema, js)
+    except SchemaError as e:
+        _count_json("invalid", _schema_stats)
+        print(f"[Qwen] JSON schema violation ({first_error}), still invalid after re-prompt: {e}")
+        return None
+    _count_json("reprompted", _schema_stats)
+    return typed
+
+
 def analyze_image(img_bytes: bytes, prompt: str):
     """
     预留的图像+文本接口。
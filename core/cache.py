@@ -0,0 +1,165 @@
+# 文件: core/cache.py
+# 说明: 大模型回复缓存
+#   - 前端：进程内 LRU（OrderedDict），命中只要一次字典查找
+#   - 后端：SQLite 文件（config.LLM_CACHE_DB），重启 / 多个 worker 之间共享
+#   - key = (model, messages, temperature, max_tokens) 的 sha256
+#   - 两层都有 TTL 和条数上限，命中/未命中计数可通过 stats() 查看
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+def make_key(model, messages, temperature, max_tokens) -> str:
+    raw = json.dumps(
+        [model, messages, temperature, max_tokens],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, db_path, ttl=86400, mem_items=512, disk_items=20000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.mem_items = mem_items
+        self.disk_items = disk_items
+
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()  # key -> (expires_at, value)
+        self._conn = None
+        self._pid = None
+        self._puts = 0
+        self._stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+
+    # ---------- SQLite 后端 ----------
+
+    def _disk(self):
+        # gunicorn preload：fork 后子进程不能用父进程的连接（也不去关它），重新连一条
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    expires_at REAL,
+                    accessed_at REAL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    # ---------- 对外接口 ----------
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                expires_at, value = hit
+                if expires_at > now:
+                    self._mem.move_to_end(key)
+                    self._stats["mem_hits"] += 1
+                    return value
+                del self._mem[key]
+
+            try:
+                conn = self._disk()
+                row = conn.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key=?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    conn.execute(
+                        "UPDATE llm_cache SET accessed_at=? WHERE key=?", (now, key)
+                    )
+                    conn.commit()
+                    self._remember(key, row[1], row[0])
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+            except sqlite3.Error as e:
+                print("[LLMCache] disk read failed:", repr(e))
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        if value is None:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None and hit[0] > now and hit[1] == value:
+                return  # 刚从缓存里读出来的同一份回复，不用再写一次盘
+            self._remember(key, expires_at, value)
+            self._stats["puts"] += 1
+            try:
+                conn = self._disk()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) "
+                    "VALUES (?,?,?,?)",
+                    (key, value, expires_at, now),
+                )
+                self._puts += 1
+                # 每写 100 次顺手清理一次过期 / 超量的记录
+                if self._puts % 100 == 0:
+                    self._evict_disk(now)
+                conn.commit()
+            except sqlite3.Error as e:
+                print("[LLMCache] disk write failed:", repr(e))
+
+    def _remember(self, key, expires_at, value):
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_items:
+            self._mem.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self, now):
+        conn = self._disk()
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.disk_items,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._disk().execute("DELETE FROM llm_cache")
+            self._disk().commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["mem_items"] = len(self._mem)
+        lookups = s["mem_hits"] + s["disk_hits"] + s["misses"]
+        s["hit_rate"] = round((s["mem_hits"] + s["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return s
+
+
+llm_cache = LLMCache(
+    config.LLM_CACHE_DB,
+    ttl=config.LLM_CACHE_TTL,
+    mem_items=config.LLM_CACHE_MEM_ITEMS,
+    disk_items=config.LLM_CACHE_DISK_ITEMS,
+)
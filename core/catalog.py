@@ -0,0 +1,169 @@
+# 文件: core/catalog.py
+# 说明: 菜谱目录（recipes 表的内存只读副本）
+#   - 整张 recipes 表一次读进来，每道菜一个 __slots__ 记录，食材 / 标签提前解析成元组
+#   - 读接口（search / detail / pantry / 推荐）全走内存，不再每个请求查库 + json.loads
+#   - 自己持有一条专用连接，每次访问先看 PRAGMA data_version（不读盘）：没变说明没人提交过，直接用快照
+#   - 变了再读 recipes_version（recipes 表上的触发器维护的版本号，见 core.db 迁移 8）：
+#     只有 recipes 真的被改过（generate_and_save、修复任务、ai_clean_db.py 等任何进程）才整体重新加载，
+#     再一次性替换快照，读的人不会看到半新半旧的数据。
+#     详情页往 recipes_html 写渲染缓存之类的提交只会让 data_version 变，不会触发重新加载
+
+import json
+import os
+import threading
+
+from core import db
+
+
+def _parse_list(raw):
+    try:
+        value = json.loads(raw or "[]")
+    except (TypeError, ValueError):
+        return ()
+    if not isinstance(value, list):
+        return ()
+    return tuple(str(x) for x in value)
+
+
+class Recipe:
+    """一道菜。ingredients / tags 是解析好的元组，*_json 保留库里的原始字符串给接口原样返回。"""
+
+    __slots__ = (
+        "id", "name", "category", "path", "raw_ingredients", "difficulty", "calories", "source",
+        "ingredients", "ingredient_set", "tags", "ingredients_json", "tags_json",
+    )
+
+    def __init__(self, row):
+        self.id = row["id"]
+        self.name = row["name"]
+        self.category = row["category"]
+        self.path = row["path"]
+        self.raw_ingredients = row["raw_ingredients"]
+        self.difficulty = row["difficulty"]
+        self.calories = row["calories_est"]
+        self.source = row["source"]
+        self.ingredients_json = row["structured_ingredients"]
+        self.tags_json = row["tags"]
+        self.ingredients = _parse_list(self.ingredients_json)
+        self.ingredient_set = frozenset(self.ingredients)
+        self.tags = _parse_list(self.tags_json)
+
+    def as_dict(self) -> dict:
+        """和原来 dict(row) 一样的字段，给 /api/cook/search 之类直接 jsonify。"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "category": self.category,
+            "path": self.path,
+            "raw_ingredients": self.raw_ingredients,
+            "structured_ingredients": self.ingredients_json,
+            "tags": self.tags_json,
+            "difficulty": self.difficulty,
+            "calories_est": self.calories,
+            "source": self.source,
+        }
+
+
+class _Snapshot:
+    __slots__ = ("generation", "recipes", "by_id", "by_name")
+
+    def __init__(self, generation, recipes):
+        self.generation = generation
+        self.recipes = recipes
+        self.by_id = {r.id: r for r in recipes}
+        self.by_name = {r.name: r for r in recipes}
+
+
+class RecipeCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._data_version = None
+        self._recipes_version = None
+        self._snap = _Snapshot(0, ())
+
+    def _connection(self):
+        # gunicorn preload：fork 后子进程不能用父进程的连接，快照本身可以继续共享
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = db.open_cook_conn(check_same_thread=False)
+            self._pid = os.getpid()
+            # data_version 只在同一条连接上可比；recipes_version 是库里的值，快照对得上就不用重新加载
+            self._data_version = None
+        return self._conn
+
+    def _current(self) -> _Snapshot:
+        with self._lock:
+            conn = self._connection()
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return self._snap
+            # 先读版本号再读表：中间有人写入的话快照只会比版本号新，下次再加载一遍而已
+            version = conn.execute("SELECT version FROM recipes_version WHERE id = 1").fetchone()[0]
+            if version != self._recipes_version:
+                rows = conn.execute(
+                    "SELECT id, name, category, path, raw_ingredients, structured_ingredients, "
+                    "tags, difficulty, calories_est, source FROM recipes ORDER BY id"
+                ).fetchall()
+                self._snap = _Snapshot(self._snap.generation + 1, tuple(Recipe(r) for r in rows))
+                self._recipes_version = version
+            self._data_version = data_version
+            return self._snap
+
+    def close(self):
+        """关掉自己那条连接，快照留着；下次访问时重新连。gunicorn preload 的 master 在 fork 前调用。"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._data_version = None
+
+    def invalidate(self):
+        """下次访问强制重新加载（例如换了数据库文件）。"""
+        with self._lock:
+            self._data_version = self._recipes_version = None
+
+    # ---------- 查询 ----------
+
+    @property
+    def generation(self) -> int:
+        """每重新加载一次加 1，依赖目录建索引的地方（合成台）用它判断要不要重建。"""
+        return self._current().generation
+
+    def all(self):
+        return self._current().recipes
+
+    def get(self, name):
+        return self._current().by_name.get(name)
+
+    def get_by_id(self, recipe_id):
+        return self._current().by_id.get(recipe_id)
+
+    def by_ids(self, ids):
+        """按给定顺序取出记录，不存在的 id 跳过。"""
+        by_id = self._current().by_id
+        return [by_id[i] for i in ids if i in by_id]
+
+    def find(self, fragment):
+        """
+        按菜名模糊找一道菜，代替原来的 name LIKE '%x%' LIMIT 1：
+        同名的优先，否则取菜名包含 fragment 的第一道（按 id 顺序）。
+        """
+        snap = self._current()
+        hit = snap.by_name.get(fragment)
+        if hit is not None:
+            return hit
+        fragment = (fragment or "").lower()
+        if not fragment:
+            return None
+        for r in snap.recipes:
+            if r.name and fragment in r.name.lower():
+                return r
+        return None
+
+    def __len__(self):
+        return len(self._current().recipes)
+
+
+# 进程内单例
+catalog = RecipeCatalog()
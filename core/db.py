@@ -1,13 +1,354 @@
 # 文件: core/db.py
+import datetime
+import os
 import sqlite3
+import threading
+
 import config
+from core import rollup, search
 
-def get_diet_conn():
-    conn = sqlite3.connect(config.DB_DIET)
+# ==================== 连接复用 ====================
+# 每个线程对每个库只开一条连接，PRAGMA 只在建连时设置一次。
+# gunicorn 的 worker 线程 / 后台任务线程都是固定数量，连接数也就有上限。
+# 用法不变：`with db.get_diet_conn() as conn:` 只负责 commit / rollback，不会关连接。
+
+_local = threading.local()
+
+# 每条新连接执行一次的 PRAGMA（journal_mode=WAL 是持久化的，由迁移设置）
+_CONN_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}",
+    f"PRAGMA cache_size=-{config.SQLITE_CACHE_KB}",
+    f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _open(path, check_same_thread=True):
+    conn = sqlite3.connect(
+        path,
+        timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=check_same_thread,
+    )
     conn.row_factory = sqlite3.Row
+    for pragma in _CONN_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def get_cook_conn():
-    conn = sqlite3.connect(config.DB_COOK)
-    conn.row_factory = sqlite3.Row
+
+def _thread_conn(path):
+    # fork 出来的子进程（gunicorn preload）不能沿用父进程的连接
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.conns = {}
+
+    conn = _local.conns.get(path)
+    if conn is not None:
+        try:
+            conn.total_changes  # 被人手动 close() 过的话这里会抛异常
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+    conn = _local.conns[path] = _open(path)
     return conn
+
+
+def close_connections():
+    """关掉当前线程持有的所有连接（脚本收尾 / 测试用）。"""
+    for conn in getattr(_local, "conns", {}).values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.conns = {}
+
+
+def open_cook_conn(check_same_thread=True):
+    """
+    单独开一条 cook 库连接（不进线程复用池），调用方自己负责关闭。
+    给需要“自己那条连接”的场景用，比如 core.catalog 靠 PRAGMA data_version 感知别的连接的提交。
+    """
+    return _open(config.DB_COOK, check_same_thread=check_same_thread)
+
+
+def get_diet_conn():
+    return _thread_conn(config.DB_DIET)
+
+def get_cook_conn():
+    return _thread_conn(config.DB_COOK)
+
+
+# ==================== 数据库迁移 ====================
+# 每条迁移: (版本号, 说明, SQL)。版本号只增不改，已经发布的迁移不要再动，
+# 要改表结构就往后追加一条。以 PRAGMA 开头的迁移不能放在事务里执行。
+
+DIET_MIGRATIONS = [
+    (
+        1,
+        "base schema",
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            height REAL,
+            gender TEXT,
+            age INTEGER,
+            target_weight REAL,
+            current_weight REAL
+        );
+
+        -- 日志表：存食物记录与体重记录
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            date TEXT,
+            type TEXT,          -- 'food' / 'weight'
+            category TEXT,
+            value REAL,         -- 食物: kcal; 体重: kg
+            note TEXT
+        );
+
+        -- 健康报告表
+        CREATE TABLE IF NOT EXISTS health_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            date TEXT,
+            report_type TEXT,
+            analysis TEXT,
+            summary TEXT
+        );
+        """,
+    ),
+    (
+        2,
+        "indexes on logs / health_reports",
+        """
+        CREATE INDEX IF NOT EXISTS idx_logs_user_type_date ON logs(user_id, type, date);
+        CREATE INDEX IF NOT EXISTS idx_logs_user_date ON logs(user_id, date);
+        CREATE INDEX IF NOT EXISTS idx_health_reports_user_date ON health_reports(user_id, date);
+        """,
+    ),
+    (3, "WAL journal", "PRAGMA journal_mode=WAL;"),
+    (4, "daily calorie rollup", rollup.ROLLUP_SCHEMA),
+    (
+        5,
+        "users.rev",
+        """
+        -- 用户数据版本号：资料 / 记录每写一次 +1，仪表盘拿它做 ETag
+        ALTER TABLE users ADD COLUMN rev INTEGER NOT NULL DEFAULT 0;
+        """,
+    ),
+]
+
+COOK_MIGRATIONS = [
+    (
+        1,
+        "base schema",
+        """
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT, category TEXT, path TEXT, raw_ingredients TEXT,
+            structured_ingredients TEXT, tags TEXT, difficulty INTEGER, calories_est INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS search_history (id INTEGER PRIMARY KEY, keyword TEXT, search_time DATETIME);
+        CREATE TABLE IF NOT EXISTS favorites (id INTEGER PRIMARY KEY, recipe_name TEXT);
+        """,
+    ),
+    (
+        2,
+        "unique recipes.name",
+        """
+        -- 先去重：同名只留最新的一条（和 generate_and_save 先删后插的语义一致）
+        DELETE FROM recipes
+         WHERE name IS NOT NULL
+           AND id NOT IN (SELECT MAX(id) FROM recipes GROUP BY name);
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_recipes_name ON recipes(name);
+        """,
+    ),
+    (3, "full-text search", search.FTS_SCHEMA),
+    (4, "WAL journal", "PRAGMA journal_mode=WAL;"),
+    (
+        5,
+        "recipe file content hash / mtime",
+        """
+        -- ai_clean_db.py 增量同步用：文件没变就不用重新调 AI
+        ALTER TABLE recipes ADD COLUMN content_hash TEXT;
+        ALTER TABLE recipes ADD COLUMN mtime REAL;
+        CREATE INDEX IF NOT EXISTS idx_recipes_path ON recipes(path);
+        """,
+    ),
+    (
+        6,
+        "rendered recipe HTML cache",
+        """
+        -- 详情页渲染结果；单独一张表，免得 SELECT * FROM recipes 把 HTML 也带出来
+        CREATE TABLE IF NOT EXISTS recipes_html (
+            recipe_id INTEGER PRIMARY KEY,
+            source_key TEXT,    -- 源文件 mtime_ns:size
+            html TEXT,
+            rendered_at TEXT
+        );
+        CREATE TRIGGER IF NOT EXISTS recipes_html_ad AFTER DELETE ON recipes BEGIN
+            DELETE FROM recipes_html WHERE recipe_id = old.id;
+        END;
+        """,
+    ),
+    (
+        7,
+        "recipe body provenance",
+        """
+        -- 正文从哪来：howtocook（原始仓库）/ ai（新菜现编）/ ai_repair（原文件丢了由 AI 补写）
+        ALTER TABLE recipes ADD COLUMN source TEXT;
+        ALTER TABLE recipes ADD COLUMN generated_at TEXT;
+        UPDATE recipes
+           SET source = CASE WHEN REPLACE(path, '\\', '/') LIKE 'AI_Generated/%'
+                             THEN 'ai' ELSE 'howtocook' END;
+        """,
+    ),
+    (
+        8,
+        "recipes version counter",
+        """
+        -- recipes 表的版本号：菜谱目录（core.catalog）拿它判断要不要重新加载。
+        -- PRAGMA data_version 是整个库的，render 往 recipes_html 写缓存也会让它变，不能直接用
+        CREATE TABLE IF NOT EXISTS recipes_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO recipes_version (id, version) VALUES (1, 0);
+        CREATE TRIGGER IF NOT EXISTS recipes_version_ai AFTER INSERT ON recipes BEGIN
+            UPDATE recipes_version SET version = version + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS recipes_version_ad AFTER DELETE ON recipes BEGIN
+            UPDATE recipes_version SET version = version + 1 WHERE id = 1;
+        END;
+        -- 只有目录里用到的列变了才算（ai_clean_db.py 只改 content_hash / mtime 时不用重新加载）
+        CREATE TRIGGER IF NOT EXISTS recipes_version_au AFTER UPDATE OF
+            name, category, path, raw_ingredients, structured_ingredients, tags, difficulty, calories_est, source
+            ON recipes BEGIN
+            UPDATE recipes_version SET version = version + 1 WHERE id = 1;
+        END;
+        """,
+    ),
+]
+
+
+def migrate(conn, migrations):
+    """
+    按版本号顺序执行还没跑过的迁移，返回本次新执行的版本号列表。
+    多个进程可能同时迁移同一个库（gunicorn 不 preload 时每个 worker 都跑 create_app，
+    ai_clean_db.py 也可能和应用一起跑）：先 BEGIN IMMEDIATE 拿写锁，锁里再读一遍已执行的版本，
+    后到的进程等前一个迁移完，看到已经是最新就什么都不做。
+    """
+    latest = max(m[0] for m in migrations)
+    # 快速路径：PRAGMA user_version 记着上次迁移到的版本，已是最新就什么都不做
+    # （不建表、不开写事务，worker 启动 / 脚本导入时只有这一次读）
+    if _user_version(conn) >= latest:
+        return []
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )
+        """
+    )
+    conn.commit()
+
+    applied = []
+    try:
+        done = _lock_for_migration(conn, latest)
+        for version, name, sql in sorted(migrations, key=lambda m: m[0]):
+            if version in done:
+                continue
+            if sql.lstrip().upper().startswith("PRAGMA"):
+                # PRAGMA journal_mode 之类不能在事务里执行：先放锁执行（这类迁移必须可重复执行），
+                # 再重新拿锁、重新看一遍，期间别的进程可能已经把后面的也迁移完了
+                conn.commit()
+                conn.execute(sql.strip().rstrip(";"))
+                done = _lock_for_migration(conn, latest)
+                if version in done:
+                    continue
+            else:
+                # 不用 executescript：它会先 COMMIT，把写锁放掉
+                for stmt in _statements(sql):
+                    conn.execute(stmt)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?,?,?)",
+                (version, name, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+            applied.append(version)
+        conn.execute(f"PRAGMA user_version={int(latest)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+def _user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _lock_for_migration(conn, latest):
+    """BEGIN IMMEDIATE 拿写锁，返回锁里读到的已执行版本；别人已经迁移到最新时返回全部版本。"""
+    conn.execute("BEGIN IMMEDIATE")
+    done = {r[0] for r in conn.execute("SELECT version FROM schema_migrations")}
+    if _user_version(conn) >= latest:
+        done.update(range(latest + 1))
+    return done
+
+
+def _statements(sql):
+    """把迁移脚本拆成单条语句（触发器 BEGIN ... END 里的分号由 sqlite3.complete_statement 判断）。"""
+    stmts, start = [], 0
+    for i, ch in enumerate(sql):
+        if ch == ";" and sqlite3.complete_statement(sql[start:i + 1]):
+            stmts.append(sql[start:i + 1].strip())
+            start = i + 1
+    return stmts
+
+
+def applied_migrations(conn):
+    """已执行的迁移 [(version, name, applied_at), ...]，按版本号排序。"""
+    try:
+        rows = conn.execute(
+            "SELECT version, name, applied_at FROM schema_migrations ORDER BY version"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [tuple(r) for r in rows]
+
+
+def migrate_diet():
+    with get_diet_conn() as conn:
+        applied = migrate(conn, DIET_MIGRATIONS)
+    _report("diet", applied, DIET_MIGRATIONS)
+    return applied
+
+
+def migrate_cook():
+    with get_cook_conn() as conn:
+        applied = migrate(conn, COOK_MIGRATIONS)
+    _report("cook", applied, COOK_MIGRATIONS)
+    return applied
+
+
+def _report(db_name, applied, migrations):
+    version = max(m[0] for m in migrations)
+    if applied:
+        print(f"[db] {db_name}: migrated to v{version} (applied {applied})")
+    else:
+        print(f"[db] {db_name}: schema v{version}")
+
+
+if __name__ == "__main__":
+    # python -m core.db：执行迁移并打印每个库已应用的版本
+    migrate_diet()
+    migrate_cook()
+    for db_name, get_conn in (("diet", get_diet_conn), ("cook", get_cook_conn)):
+        with get_conn() as conn:
+            for version, name, applied_at in applied_migrations(conn):
+                print(f"  {db_name} v{version:<3} {applied_at}  {name}")
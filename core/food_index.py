@@ -0,0 +1,159 @@
+# 文件: core/food_index.py
+# 说明: 食物库搜索索引（给 /api/search_food 的输入联想用）
+#   - 数据和倒排都在 core.food_store 的 mmap 文件里，第一次搜索时才打开
+#   - 对食物名建 bigram 倒排（单字查询用 unigram 倒排）
+#   - 排序：完全相同 > 前缀 > 包含 > 模糊（和名字里最像的一段的编辑距离，同音优先 / 拼音首字母）
+#   - 取前 k 个用 heapq，不对全部命中排序
+
+import heapq
+import threading
+from functools import lru_cache
+
+from core.food_store import FoodStore, lazy_pinyin, open_store
+
+# 模糊匹配最多看多少个候选，防止常见字把整个库都拉进来
+FUZZY_CANDIDATES = 2000
+
+EXACT, PREFIX, SUBSTRING, FUZZY = range(4)
+
+
+def _bigrams(text: str):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _window_distance(q: str, name: str, limit: int) -> int:
+    """
+    q 和 name 里最像它的一段之间的编辑距离（近似子串匹配：name 里从哪开始、到哪结束都不算代价），
+    超过 limit 提前返回 limit + 1。
+    “鸡旦” 对 “鸡蛋(白壳)” 是 1；整个名字比的话长度差就把它排除了。
+    """
+    prev = [0] * (len(name) + 1)
+    for i, cq in enumerate(q, 1):
+        cur = [i]
+        for j, cn in enumerate(name, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (cq != cn)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return min(prev)
+
+
+@lru_cache(maxsize=8192)
+def _syllable(ch: str) -> str:
+    return lazy_pinyin(ch)[0]
+
+
+def _sounds_like(q: str, name: str) -> bool:
+    """name 里有一段和 q 读音一样（输入法选错同音字：“鸡旦” / “鸡蛋”）。没装 pypinyin 时恒为 False。"""
+    n = len(q)
+    if lazy_pinyin is None or len(name) < n:
+        return False
+    target = [_syllable(c) for c in q]
+    sounds = [_syllable(c) for c in name]
+    return any(sounds[i:i + n] == target for i in range(len(sounds) - n + 1))
+
+
+class FoodIndex:
+    """
+    store: 现成的 FoodStore（测试 / 小数据直接 FoodStore.from_items）；
+    不给的话第一次查询时按 json_path / bin_path 打开，必要时先构建二进制文件。
+    """
+
+    def __init__(self, store=None, json_path=None, bin_path=None):
+        self._store = store
+        self._json_path = json_path
+        self._bin_path = bin_path
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> FoodStore:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = open_store(self._json_path, self._bin_path)
+        return self._store
+
+    @property
+    def loaded(self) -> bool:
+        return self._store is not None
+
+    def __len__(self):
+        return len(self.store)
+
+    def item(self, idx):
+        store = self.store
+        return {"name": store.name(idx), "cal": store.cal(idx), "emoji": store.emoji(idx)}
+
+    # ---------- 查询 ----------
+
+    def _substring_candidates(self, q):
+        if len(q) == 1:
+            return self.store.postings(q)
+        postings = []
+        for bg in _bigrams(q):
+            p = self.store.postings(bg)
+            if not p:
+                return []
+            postings.append(p)
+        postings.sort(key=len)
+        cands = set(postings[0])
+        for p in postings[1:]:
+            cands.intersection_update(p)
+            if not cands:
+                break
+        return cands
+
+    def _fuzzy(self, q, seen, k):
+        """子串命中不够 k 个时，再用编辑距离 / 拼音首字母补一些。"""
+        out = []
+        limit = max(1, len(q) // 3)
+        store = self.store
+        # 候选：先是和 q 有共同两字组合的，不够再放宽到有共同单字的（“鸡旦” 的 bigram 一个都命中不了）
+        cands = set()
+        for grams in (_bigrams(q), set(q)):
+            for g in grams:
+                for idx in store.postings(g):
+                    if idx not in seen:
+                        cands.add(idx)
+                if len(cands) >= FUZZY_CANDIDATES:
+                    break
+            if len(cands) >= FUZZY_CANDIDATES:
+                break
+        for idx in cands:
+            name = store.name(idx)
+            d = _window_distance(q, name, limit)
+            if d <= limit:
+                # 距离相同时同音的排前面
+                out.append(((FUZZY, d, not _sounds_like(q, name), len(name), idx), idx))
+
+        ql = q.lower()
+        if lazy_pinyin is not None and ql.isascii() and ql.isalpha():
+            for ini, idx in store.initials_prefix(ql):
+                if idx not in seen:
+                    out.append(((FUZZY, 0, False, len(ini), idx), idx))
+        return heapq.nsmallest(k, out)
+
+    def search(self, q: str, k: int = 20):
+        q = (q or "").strip()
+        if not q:
+            return []
+
+        ranked = []
+        for idx in self._substring_candidates(q):
+            name = self.store.name(idx)
+            pos = name.find(q)
+            if pos < 0:
+                continue
+            if name == q:
+                tier = EXACT
+            elif pos == 0:
+                tier = PREFIX
+            else:
+                tier = SUBSTRING
+            ranked.append(((tier, pos, len(name), idx), idx))
+
+        top = heapq.nsmallest(k, ranked)
+        if len(top) < k:
+            seen = {idx for _, idx in ranked}
+            top.extend(self._fuzzy(q, seen, k - len(top)))
+        return [self.item(idx) for _, idx in top]
@@ -0,0 +1,319 @@
+# 文件: core/food_store.py
+# 说明: 食物库的紧凑二进制格式（给 core.food_index 用）
+#   food_database.json 只解析一次，写成 data/food_store.bin，之后各 worker 直接 mmap 只读打开：
+#   - 不用每个进程都 json.load 一遍，也没有几十万个小 dict
+#   - 文件页在操作系统的 page cache 里，多个 worker 共享同一份物理内存
+#   - 倒排也在文件里（按字节序排好的 key + 二分查找），进程里几乎不占堆内存
+#   源 JSON 的 mtime/size 记在文件头里，JSON 更新过就自动重建。
+#   离线构建：python -m core.food_store
+#
+# 布局（本机字节序，各段 8 字节对齐）：
+#   header     魔数 / 版本 / 字节序 / 条数 N / 菜名数 M / key 数 K / 源 JSON mtime_ns+size / 各段 (偏移, 长度)
+#   cals       float32[N]
+#   name_id    uint32[N]      第 i 条 -> 去重后的菜名表（同名只存一份）
+#   emoji_id   uint16[N]      第 i 条 -> emoji 表
+#   names      uint32[M+1] 偏移 + UTF-8 字节
+#   initials   拼音首字母（升序）+ 对应的条目号，前缀查询用二分；没装 pypinyin 时为空
+#   grams      单字 + 相邻两字的 key（UTF-8 字节序升序），uint32[K+1] 偏移 + 字节
+#   postings   uint32[K+1] 偏移 + 每个 key 命中的条目号（升序）
+#   emojis     emoji 表（JSON）
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+try:
+    # pypinyin（requirements.txt 里有）：“xhs” 搜 “西红柿”、同音错字排序；没装时这两样不可用，其余照常
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # pragma: no cover
+    lazy_pinyin = None
+
+MAGIC = b"FOODSTOR"
+VERSION = 1
+DEFAULT_EMOJI = "🍽"
+
+_SECTIONS = (
+    "cals", "name_id", "emoji_id",
+    "name_off", "name_blob",
+    "ini_off", "ini_blob", "ini_item",
+    "gram_off", "gram_blob",
+    "post_off", "post_blob",
+    "emojis",
+)
+_HEAD = struct.Struct(f"<8sHBxIIIqq{2 * len(_SECTIONS)}Q")
+
+
+def _initials(name: str) -> str:
+    if lazy_pinyin is None:
+        return ""
+    return "".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+
+
+def _grams(name: str):
+    return set(name) | {name[i:i + 2] for i in range(len(name) - 1)}
+
+
+def _cal(item) -> float:
+    try:
+        return float(item.get("cal") or item.get("kcal") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _string_table(strings):
+    offsets, blob = array("I", [0]), bytearray()
+    for s in strings:
+        blob += s
+        offsets.append(len(blob))
+    return offsets.tobytes(), bytes(blob)
+
+
+# ---------- 构建 ----------
+
+def build(items, src_mtime_ns=0, src_size=0) -> bytes:
+    """items: food_database.json 里的 [{"name", "cal"/"kcal", "emoji"}, ...]，返回整个文件的字节。"""
+    cals, name_ids, emoji_ids = array("f"), array("I"), array("H")
+    names, name_pos = [], {}
+    emojis, emoji_pos = [], {}
+    postings = {}
+
+    for item in items:
+        name = item.get("name") or ""
+        if not name:
+            continue
+        idx = len(cals)
+        cals.append(_cal(item))
+        nid = name_pos.get(name)
+        if nid is None:
+            nid = name_pos[name] = len(names)
+            names.append(name)
+        name_ids.append(nid)
+        emoji = item.get("emoji") or DEFAULT_EMOJI
+        eid = emoji_pos.get(emoji)
+        if eid is None:
+            eid = emoji_pos[emoji] = len(emojis)
+            emojis.append(emoji)
+        emoji_ids.append(eid)
+        for g in _grams(name):
+            postings.setdefault(g.encode("utf-8"), array("I")).append(idx)
+
+    ini = sorted(
+        (_initials(names[nid]).encode("ascii", "ignore"), idx)
+        for idx, nid in enumerate(name_ids)
+        if lazy_pinyin is not None
+    )
+    keys = sorted(postings)
+    post_off, post_blob = array("I", [0]), array("I")
+    for k in keys:
+        post_blob.extend(postings[k])
+        post_off.append(len(post_blob))
+
+    name_off, name_blob = _string_table(n.encode("utf-8") for n in names)
+    ini_off, ini_blob = _string_table(s for s, _ in ini)
+    gram_off, gram_blob = _string_table(keys)
+    sections = {
+        "cals": cals.tobytes(),
+        "name_id": name_ids.tobytes(),
+        "emoji_id": emoji_ids.tobytes(),
+        "name_off": name_off,
+        "name_blob": name_blob,
+        "ini_off": ini_off,
+        "ini_blob": ini_blob,
+        "ini_item": array("I", (idx for _, idx in ini)).tobytes(),
+        "gram_off": gram_off,
+        "gram_blob": gram_blob,
+        "post_off": post_off.tobytes(),
+        "post_blob": post_blob.tobytes(),
+        "emojis": json.dumps(emojis, ensure_ascii=False).encode("utf-8"),
+    }
+
+    body, table, pos = bytearray(), [], _HEAD.size
+    for name in _SECTIONS:
+        pad = -pos % 8
+        body += b"\0" * pad
+        pos += pad
+        data = sections[name]
+        table += [pos, len(data)]
+        body += data
+        pos += len(data)
+
+    head = _HEAD.pack(
+        MAGIC, VERSION, sys.byteorder == "little", len(cals), len(names), len(keys),
+        src_mtime_ns, src_size, *table,
+    )
+    return head + bytes(body)
+
+
+def build_file(json_path, bin_path):
+    """从 JSON 构建二进制文件（先写临时文件再替换，并发构建也不会读到半个文件）。"""
+    st = os.stat(json_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    raw = build(items, st.st_mtime_ns, st.st_size)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(bin_path) or ".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_path, bin_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(raw)
+
+
+# ---------- 读取 ----------
+
+class _StringTable:
+    __slots__ = ("_off", "_blob")
+
+    def __init__(self, offsets, blob):
+        self._off = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._off) - 1
+
+    def raw(self, j) -> bytes:
+        return bytes(self._blob[self._off[j]:self._off[j + 1]])
+
+    def get(self, j) -> str:
+        return self.raw(j).decode("utf-8")
+
+    def bisect_left(self, key: bytes) -> int:
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class FoodStore:
+    """只读食物库。buf 可以是 mmap（正常情况）也可以是 bytes（测试 / 没有文件时）。"""
+
+    def __init__(self, buf, closer=None):
+        head = _HEAD.unpack_from(buf, 0)
+        magic, version, little = head[0], head[1], head[2]
+        if magic != MAGIC or version != VERSION or bool(little) != (sys.byteorder == "little"):
+            raise ValueError("food store format mismatch")
+        self.count, n_names, _ = head[3:6]
+        self.src_mtime_ns, self.src_size = head[6:8]
+        self._closer = closer
+        self._mv = mv = memoryview(buf)
+
+        table = head[8:]
+        sec = {
+            name: mv[table[2 * i]:table[2 * i] + table[2 * i + 1]]
+            for i, name in enumerate(_SECTIONS)
+        }
+        self._cals = sec["cals"].cast("f")
+        self._name_id = sec["name_id"].cast("I")
+        self._emoji_id = sec["emoji_id"].cast("H")
+        self._names = _StringTable(sec["name_off"].cast("I"), sec["name_blob"])
+        self._ini = _StringTable(sec["ini_off"].cast("I"), sec["ini_blob"])
+        self._ini_item = sec["ini_item"].cast("I")
+        self._grams = _StringTable(sec["gram_off"].cast("I"), sec["gram_blob"])
+        self._post_off = sec["post_off"].cast("I")
+        self._post = sec["post_blob"].cast("I")
+        self._emojis = json.loads(bytes(sec["emojis"]).decode("utf-8"))
+
+    @classmethod
+    def from_items(cls, items):
+        return cls(build(items))
+
+    @classmethod
+    def open(cls, bin_path):
+        with open(bin_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, closer=mm.close)
+
+    def __len__(self):
+        return self.count
+
+    def name(self, idx) -> str:
+        return self._names.get(self._name_id[idx])
+
+    def cal(self, idx):
+        c = self._cals[idx]
+        return int(c) if c.is_integer() else round(c, 1)
+
+    def emoji(self, idx) -> str:
+        return self._emojis[self._emoji_id[idx]]
+
+    def postings(self, gram: str):
+        """包含这个单字 / 两字组合的条目号（升序），没有时返回空序列。"""
+        key = gram.encode("utf-8")
+        j = self._grams.bisect_left(key)
+        if j >= len(self._grams) or self._grams.raw(j) != key:
+            return ()
+        return self._post[self._post_off[j]:self._post_off[j + 1]]
+
+    def initials_prefix(self, prefix: str):
+        """拼音首字母以 prefix 开头的 [(首字母, 条目号), ...]。"""
+        key = prefix.encode("ascii", "ignore")
+        j = self._ini.bisect_left(key)
+        out = []
+        while j < len(self._ini):
+            ini = self._ini.raw(j)
+            if not ini.startswith(key):
+                break
+            out.append((ini.decode("ascii"), self._ini_item[j]))
+            j += 1
+        return out
+
+    @property
+    def has_initials(self) -> bool:
+        return len(self._ini) > 0
+
+    def close(self):
+        # 先释放所有 memoryview，mmap 才能关
+        for attr in ("_cals", "_name_id", "_emoji_id", "_ini_item", "_post_off", "_post"):
+            getattr(self, attr).release()
+        self._names = self._ini = self._grams = None
+        self._mv.release()
+        if self._closer is not None:
+            self._closer()
+
+
+def open_store(json_path, bin_path) -> FoodStore:
+    """
+    打开 bin_path；文件不存在 / 格式旧了 / 源 JSON 改过时先从 json_path 重建。
+    JSON 也没有的话返回一个空库。
+    """
+    try:
+        st = os.stat(json_path)
+    except OSError:
+        st = None
+
+    if os.path.exists(bin_path):
+        try:
+            store = FoodStore.open(bin_path)
+            fresh = st is None or (store.src_mtime_ns, store.src_size) == (st.st_mtime_ns, st.st_size)
+            # 构建时没装 pypinyin、现在装了：重建一次把首字母补上
+            if fresh and (lazy_pinyin is None or store.has_initials or not len(store)):
+                return store
+            store.close()
+        except (ValueError, struct.error, OSError):
+            pass
+
+    if st is None:
+        return FoodStore.from_items([])
+    build_file(json_path, bin_path)
+    return FoodStore.open(bin_path)
+
+
+if __name__ == "__main__":
+    import config
+
+    size = build_file(config.FOOD_JSON, config.FOOD_STORE)
+    store = FoodStore.open(config.FOOD_STORE)
+    print(f"built {config.FOOD_STORE}: {len(store)} items, {size / 1024:.0f} KB")
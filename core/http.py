@@ -0,0 +1,172 @@
+# 文件: core/http.py
+# 说明: 调大模型用的 HTTP 基础设施
+#   - 模块级 requests.Session + 定长连接池：复用 TCP/TLS 连接，不用每次重新握手
+#   - 有上限的指数退避重试：429 / 5xx 自动重试，遵守 Retry-After
+#   - 熔断器：连续失败若干次后，冷却期内直接失败，不再每个请求干等 30 秒
+#   - 令牌桶限速：批处理脚本并发调模型时控制 QPS，遇到 429 自动降速
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# 这些状态码值得重试：限流 / 上游临时故障
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，本次调用被直接拒绝。"""
+
+
+class _BoundedRetry(Retry):
+    """退避时间和 Retry-After 都封顶，避免上游让我们等上几分钟。"""
+
+    MAX_WAIT = 8.0
+
+    def get_backoff_time(self):
+        return min(super().get_backoff_time(), self.MAX_WAIT)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.MAX_WAIT)
+
+
+def make_session(pool_size=10, max_retries=3, backoff_factor=0.5) -> requests.Session:
+    retry = _BoundedRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,  # 读超时说明上游在慢慢生成，重试只会翻倍等待
+        status=max_retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def backoff_delay(attempt, retry_after=None, backoff_factor=0.5) -> float:
+    """
+    手写重试循环（异步客户端没有 urllib3 的 Retry）用的等待时间，规则和 _BoundedRetry 一致：
+    有 Retry-After 就听它的，否则指数退避；都封顶 MAX_WAIT。attempt 从 0 开始。
+    """
+    try:
+        if retry_after is not None:
+            return min(max(float(retry_after), 0.0), _BoundedRetry.MAX_WAIT)
+    except ValueError:
+        pass  # HTTP 日期格式的 Retry-After 就不解析了，按退避来
+    return min(backoff_factor * (2 ** attempt), _BoundedRetry.MAX_WAIT)
+
+
+class CircuitBreaker:
+    """
+    简单三态熔断器：
+    - closed:    正常放行，连续失败 failure_threshold 次后转 open
+    - open:      cooldown 秒内所有调用直接失败
+    - half_open: 冷却结束后只放一个试探请求，成功转 closed，失败重新 open
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        """调用前检查；不允许调用时抛 CircuitOpenError。"""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+        raise CircuitOpenError("upstream circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class TokenBucket:
+    """
+    线程安全的自适应令牌桶（AIMD）：
+    - acquire() 拿不到令牌就睡到有为止
+    - throttled(retry_after): 收到 429 时速率减半，并暂停到 Retry-After 结束
+    - succeeded(): 每次成功把速率往目标值加回一点
+    """
+
+    def __init__(self, rate=1.0, burst=1, min_rate=0.05):
+        self.target_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.throttle_count = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self, retry_after=None):
+        with self._lock:
+            self.throttle_count += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        with self._lock:
+            if self.rate < self.target_rate:
+                self.rate = min(self.target_rate, self.rate + self.target_rate * 0.05)
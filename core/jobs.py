@@ -0,0 +1,182 @@
+# 文件: core/jobs.py
+# 说明: 慢任务（主要是 AI 生成菜谱）的并发控制
+#   - SingleFlight: 同一个 key 同时只跑一份，其余调用方等着拿同一个结果
+#   - JobRegistry:  丢到后台线程池跑，立即返回 job_id，前端轮询结果
+
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        # 在事件循环里等的调用方：[(loop, future)]；结束后置为 None
+        self.waiters = []
+
+
+def _wake(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+class SingleFlight:
+    """
+    按 key 合并并发调用：第一个调用方真正执行，后来的阻塞等待并共享结果/异常。
+    同步的 do、协程的 ado、批量的 claim / release 共用一张表，三种调用方之间也互相合并。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        call, leader = self._join(key)
+        if not leader:
+            call.event.wait()
+            return self._outcome(call)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.release(key, call, error=e)
+            raise
+        self.release(key, call, result)
+        return result
+
+    async def ado(self, key, fn, *args, **kwargs):
+        """do 的协程版：fn 是 async 函数；等别人的结果时挂在事件循环上，不卡循环也不占线程。"""
+        call, leader = self._join(key)
+        if not leader:
+            # 等的是本事件循环上的 future，不占线程池：线程池还要留给领头的那个去写库
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            with self._lock:
+                pending = call.waiters is not None
+                if pending:
+                    call.waiters.append((loop, fut))
+            if pending:
+                await fut
+            return self._outcome(call)
+
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self.release(key, call, error=e)
+            raise
+        self.release(key, call, result)
+        return result
+
+    def claim(self, keys):
+        """
+        一次占住多个 key（批量任务用，不阻塞）：返回这次占到的 {key: call}，
+        别人正在跑的 key 不在里面。占到的每个 key 都要 release，等着的调用方拿 release 给的结果。
+        """
+        with self._lock:
+            claimed = {}
+            for key in keys:
+                if key not in self._calls:
+                    claimed[key] = self._calls[key] = _Call()
+            return claimed
+
+    def release(self, key, call, result=None, error=None):
+        """放掉 claim / do 占住的 key，唤醒等待方；同一个 call 重复 release 只有第一次生效。"""
+        with self._lock:
+            if self._calls.get(key) is not call:
+                return
+            del self._calls[key]
+            call.result = result
+            call.error = error
+            waiters, call.waiters = call.waiters, None
+        call.event.set()
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_wake, fut)
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    @staticmethod
+    def _outcome(call):
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class JobRegistry:
+    """
+    后台任务登记处。
+    同一个 key 正在跑时重复 submit 会拿到同一个 job_id；
+    跑完的任务保留 keep_seconds 秒供前端轮询，之后自动清理。
+    """
+
+    def __init__(self, max_workers=4, keep_seconds=600):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = {}
+        self._keep_seconds = keep_seconds
+
+    def submit(self, key, fn, *args, **kwargs) -> str:
+        with self._lock:
+            self._prune()
+            job_id = self._active.get(key)
+            if job_id is not None:
+                return job_id
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "key": key,
+                "status": "pending",
+                "result": None,
+                "error": None,
+                "created": time.time(),
+                "finished": None,
+            }
+            self._active[key] = job_id
+
+        self._pool.submit(self._run, job_id, key, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, key, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+            update = {"status": "done", "result": result}
+        except Exception as e:
+            print(f"[jobs] {key!r} failed:", repr(e))
+            update = {"status": "failed", "error": str(e)}
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(update)
+                job["finished"] = time.time()
+            if self._active.get(key) == job_id:
+                del self._active[key]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _prune(self):
+        deadline = time.time() - self._keep_seconds
+        for job_id in [
+            j for j, job in self._jobs.items()
+            if job["finished"] and job["finished"] < deadline
+        ]:
+            del self._jobs[job_id]
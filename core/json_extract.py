@@ -0,0 +1,217 @@
+# 文件: core/json_extract.py
+# 说明: 从大模型回复里抠出 JSON
+#   原来是一个贪婪正则 [\{\[][\s\S]*[\}\]] 从第一个括号吞到最后一个括号再 json.loads，
+#   回复后面跟一段带括号的闲聊、或者前面有个示例 {xxx}，整段就解析失败，白花一次模型调用。
+#   现在：
+#   - JsonScanner 一遍扫描，按括号配对切出每个完整的顶层 {...} / [...]（字符串里的括号不算），
+#     可以 feed 一块一块地喂（流式输出边收边扫），前缀文本不留在内存里
+#   - ```json 代码块里的内容优先，其次按片段从长到短尝试
+#   - 直接 json.loads 不行的片段做一次本地修补：结尾多余的逗号、单引号字符串、
+#     Python 的 True/False/None、// 注释
+#   语料和自检 / 基准：python -m tools.bench_json_extract
+
+import json
+import re
+from collections import namedtuple
+
+# 扫描时只关心这几个字符，其余的一次跳过
+_SIGNIFICANT = re.compile(r"[\[\]{}\"'\\]")
+_OPENERS = {"}": "{", "]": "["}
+
+# 本地修补用的词法：字符串原样保留（单引号的转成双引号），其余几种错误就地改掉
+_REPAIR_TOKEN = re.compile(
+    r'"(?:[^"\\]|\\.)*"'            # 双引号字符串：原样
+    r"|'(?:[^'\\]|\\.)*'"           # 单引号字符串：改成双引号
+    r"|//[^\n]*"                    # 行注释：删掉
+    r"|,(?=\s*[}\]])"               # 结尾多余的逗号：删掉
+    r"|\b(?:True|False|None)\b",    # Python 字面量
+    re.S,
+)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+_FENCE = "```"
+# 一段回复最多试多少个片段（病态输入下别无限往里钻）
+_MAX_ATTEMPTS = 64
+
+Extraction = namedtuple("Extraction", "value repaired fragment error")
+Extraction.__doc__ = """
+value     解析结果，失败为 None
+repaired  是否经过本地修补才解析成功
+fragment  失败时最像 JSON 的那段（交给模型去修），成功时是解析的那段
+error     失败时 json.loads 的报错
+"""
+
+
+class JsonScanner:
+    """
+    增量括号配对扫描器：feed(文本块) 返回这一块里闭合了的顶层 {...} / [...] 片段。
+    单引号也当字符串处理（模型常见错误），只在括号里面才算，正文里的撇号不受影响。
+    """
+
+    def __init__(self):
+        self._buf = []        # 当前未闭合片段（从开括号起）
+        self._stack = []      # 还没闭合的开括号
+        self._quote = None    # 在字符串里时是引号字符
+        self._escaped = False  # 上一块以反斜杠结尾，下一块第一个字符被转义
+
+    def feed(self, chunk: str):
+        found = []
+        start = 0 if self._stack else None  # 当前片段在本块里的起点
+        skip = 0 if self._escaped else -1
+        self._escaped = False
+
+        for m in _SIGNIFICANT.finditer(chunk):
+            i, ch = m.start(), m.group()
+            if i == skip:
+                continue
+            if self._quote:
+                if ch == "\\":
+                    if i + 1 < len(chunk):
+                        skip = i + 1
+                    else:
+                        self._escaped = True
+                elif ch == self._quote:
+                    self._quote = None
+                continue
+            if not self._stack:
+                if ch in "{[":
+                    self._stack.append(ch)
+                    start = i
+                continue
+            if ch in "\"'":
+                self._quote = ch
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack[-1] != _OPENERS[ch]:
+                    # 括号对不上：这段不是 JSON，丢掉重新找
+                    self._reset()
+                    start = None
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    self._buf.append(chunk[start:i + 1])
+                    found.append("".join(self._buf))
+                    self._buf = []
+                    start = None
+
+        if self._stack and start is not None:
+            self._buf.append(chunk[start:])
+        return found
+
+    def finish(self):
+        """
+        输入结束，处理还没闭合的片段：
+        - 开括号后面紧跟 JSON 的样子（[{ / {" / [1 ...）：多半是回复被截断了，不往里找，
+          免得把被截断的数组当成它的第一个元素交出去（交给模型修）
+        - 否则（比如 “[提示 {...}”）跳过这个开括号，在剩下的文本里再找一遍
+        """
+        rest = "".join(self._buf)
+        self._reset()
+        if not rest:
+            return []
+        head = rest[1:].lstrip()[:1]
+        if head and (head in "{[\"'" or (rest[0] == "[" and (head.isdigit() or head == "-"))):
+            return []
+        inner = JsonScanner()
+        return inner.feed(rest[1:]) + inner.finish()
+
+    def _reset(self):
+        self._buf = []
+        self._stack = []
+        self._quote = None
+        self._escaped = False
+
+
+def candidates(text: str):
+    """所有可能是 JSON 的片段：先是 ``` 代码块里的，再是全文里的（长的在前），去重。"""
+    out = []
+    for block in _fenced_blocks(text):
+        out.extend(sorted(_scan(block), key=len, reverse=True))
+    out.extend(sorted(_scan(text), key=len, reverse=True))
+    seen = set()
+    return [c for c in out if not (c in seen or seen.add(c))]
+
+
+def _scan(text):
+    scanner = JsonScanner()
+    return scanner.feed(text) + scanner.finish()
+
+
+def _fenced_blocks(text):
+    """```json ... ``` / ``` ... ``` 里的内容。用 find 逐个找，不用正则。"""
+    blocks = []
+    pos = 0
+    while True:
+        open_at = text.find(_FENCE, pos)
+        if open_at < 0:
+            break
+        body_at = text.find("\n", open_at)
+        if body_at < 0:
+            break
+        close_at = text.find(_FENCE, body_at)
+        if close_at < 0:
+            blocks.append(text[body_at + 1:])  # 没闭合的代码块（被截断）
+            break
+        blocks.append(text[body_at + 1:close_at])
+        pos = close_at + len(_FENCE)
+    return blocks
+
+
+def repair(fragment: str) -> str:
+    """本地修补常见的小错误，不改动字符串内容。"""
+    return _REPAIR_TOKEN.sub(_repair_token, fragment)
+
+
+def _repair_token(m):
+    tok = m.group()
+    head = tok[0]
+    if head == '"':
+        return tok
+    if head == "'":
+        inner = tok[1:-1].replace("\\'", "'")
+        return '"' + re.sub(r'(?<!\\)"', r'\\"', inner) + '"'
+    if head in ",/":
+        return ""
+    return _LITERALS[tok]
+
+
+def extract(text: str) -> Extraction:
+    """从模型回复里解析出 JSON（dict / list）。"""
+    if not text:
+        return Extraction(None, False, None, "empty")
+
+    first_error = None
+    worst = None
+    queue = candidates(text)
+    seen = set(queue)
+    tried = 0
+    while queue and tried < _MAX_ATTEMPTS:
+        frag = queue.pop(0)
+        tried += 1
+        try:
+            return Extraction(json.loads(frag), False, frag, None)
+        except ValueError as e:
+            if first_error is None:
+                first_error, worst = str(e), frag
+        try:
+            return Extraction(json.loads(repair(frag)), True, frag, None)
+        except ValueError:
+            pass
+        # 整段不是 JSON（比如 “[注意 {...}]”），到它里面再找
+        for inner in sorted(_scan(frag[1:-1]), key=len, reverse=True):
+            if inner not in seen:
+                seen.add(inner)
+                queue.append(inner)
+
+    if worst is None:
+        # 一个配对的括号都没有（多半是被截断了）：从第一个开括号起都交出去
+        at = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+        worst = text[at:] if at >= 0 else None
+        first_error = "no balanced JSON object/array found"
+    return Extraction(None, False, worst, first_error)
+
+
+def extract_json(text: str):
+    """extract() 的简化版：只要结果，失败返回 None。"""
+    return extract(text).value
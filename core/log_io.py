@@ -0,0 +1,106 @@
+# 文件: core/log_io.py
+# 说明: 饮食记录的批量导入 / 导出格式（CSV / JSONL），给 /api/diet/import、/api/diet/export 用
+#   - 导入：边读上传流边解析，逐行校验，整个文件不进内存；写库由调用方分批做
+#   - 导出：把查库的行迭代器写成文本块，交给 Flask 流式返回
+#   字段和 logs 表一致：date,type,category,value,note（CSV 第一行是表头，JSONL 每行一个对象）
+
+import csv
+import datetime
+import io
+import json
+
+FIELDS = ("date", "type", "category", "value", "note")
+FORMATS = ("csv", "jsonl")
+MIMETYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8"}
+
+# 合理取值范围：食物 kcal / 体重 kg
+VALUE_RANGE = {"food": (0, 20000), "weight": (1, 500)}
+NOTE_MAX = 200
+
+
+class RowError(ValueError):
+    """某一行不合法（跳过这一行，其他行照常导入）。"""
+
+
+def guess_format(filename=None, mimetype=None):
+    """按文件名 / Content-Type 猜格式，猜不出来当 CSV。"""
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or "ndjson" in (mimetype or "") or "jsonl" in (mimetype or ""):
+        return "jsonl"
+    return "csv"
+
+
+def clean_row(raw) -> tuple:
+    """校验一行，返回 (date, type, category, value, note)；不合法抛 RowError。"""
+    if not isinstance(raw, dict):
+        raise RowError("not an object")
+
+    date = str(raw.get("date") or "").strip().replace("/", "-")
+    try:
+        date = datetime.date.fromisoformat(date).isoformat()
+    except ValueError:
+        raise RowError(f"bad date: {raw.get('date')!r}") from None
+
+    tp = str(raw.get("type") or "food").strip().lower()
+    if tp not in VALUE_RANGE:
+        raise RowError(f"bad type: {raw.get('type')!r}")
+
+    try:
+        value = float(raw.get("value"))
+    except (TypeError, ValueError):
+        raise RowError(f"bad value: {raw.get('value')!r}") from None
+    lo, hi = VALUE_RANGE[tp]
+    if not lo <= value <= hi:
+        raise RowError(f"{tp} value out of range [{lo}, {hi}]: {value}")
+
+    category = str(raw.get("category") or "").strip()[:NOTE_MAX]
+    note = str(raw.get("note") or "").strip()[:NOTE_MAX]
+    return date, tp, category, value, note
+
+
+def read_rows(stream, fmt):
+    """
+    逐行解析二进制流，产出 (行号, 原始 dict)；JSON 解析失败的行产出 (行号, RowError)。
+    编码 / CSV 结构坏掉这类没法继续读的错误直接抛出（UnicodeDecodeError / csv.Error）。
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for raw in reader:
+                yield reader.line_num, raw
+        else:
+            for line_no, line in enumerate(text, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError as e:
+                    yield line_no, RowError(f"bad json: {e}")
+    finally:
+        # 流是调用方的（上传文件），只解绑不关闭
+        text.detach()
+
+
+def write_rows(rows, fmt, chunk=500):
+    """把行（sqlite3.Row / dict，含 FIELDS 各列）写成 CSV / JSONL，每 chunk 行产出一个字符串块。"""
+    buf = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        buf.write("\ufeff")  # Excel 打开中文不乱码
+        writer = csv.writer(buf)
+        writer.writerow(FIELDS)
+
+    for n, r in enumerate(rows, 1):
+        if writer is not None:
+            writer.writerow([r[f] for f in FIELDS])
+        else:
+            buf.write(json.dumps({f: r[f] for f in FIELDS}, ensure_ascii=False))
+            buf.write("\n")
+        if n % chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
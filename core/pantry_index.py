@@ -0,0 +1,112 @@
+# 文件: core/pantry_index.py
+# 说明: 合成台用的“食材 → 菜谱”倒排索引，从 core.catalog 的菜谱目录构建；
+#       目录重新加载过（有人写了 recipes 表）就在下次查询时重建，pantry 打分只看候选菜谱。
+
+import threading
+
+from core.catalog import catalog
+
+
+class PantryIndex:
+    """
+    食材倒排索引。
+    - _recipes:  recipe_id -> catalog.Recipe
+    - _by_ing:   食材名 -> {recipe_id}
+    - _by_char:  单字 -> {食材名}，用来把“用户食材 in 菜谱食材”的子串匹配缩小到候选集合
+    匹配语义与原来的全表扫描一致：用户食材 i 与菜谱食材 n 满足 i in n 或 n in i 即算命中。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._generation = None
+        self._recipes = {}
+        self._by_ing = {}
+        self._by_char = {}
+
+    # ---------- 构建 ----------
+
+    def build(self):
+        """按当前的菜谱目录全量构建。"""
+        with self._lock:
+            generation = catalog.generation
+            self._recipes = {}
+            self._by_ing = {}
+            self._by_char = {}
+            for r in catalog.all():
+                self._add(r)
+            self._generation = generation
+
+    def ensure_built(self):
+        """目录变过（或还没建过）就重建；几百道菜重建一次只要几毫秒。"""
+        if self._generation != catalog.generation:
+            with self._lock:
+                if self._generation != catalog.generation:
+                    self.build()
+
+    def _add(self, recipe):
+        if not recipe.ingredients:
+            return
+        self._recipes[recipe.id] = recipe
+        for n in recipe.ingredient_set:
+            ids = self._by_ing.get(n)
+            if ids is None:
+                ids = self._by_ing[n] = set()
+                for ch in set(n):
+                    self._by_char.setdefault(ch, set()).add(n)
+            ids.add(recipe.id)
+
+    # ---------- 查询 ----------
+
+    def _matched_ingredients(self, ings):
+        """返回与任一用户食材互为子串的所有菜谱食材名。"""
+        matched = set()
+        if "" in self._by_ing:
+            matched.add("")
+        for i in ings:
+            # n in i：枚举 i 的所有子串去精确查
+            for a in range(len(i)):
+                for b in range(a + 1, len(i) + 1):
+                    if i[a:b] in self._by_ing:
+                        matched.add(i[a:b])
+            # i in n：先用单字倒排求交集，再逐个确认
+            buckets = [self._by_char.get(ch) for ch in set(i)]
+            if not buckets or any(b is None for b in buckets):
+                continue
+            buckets.sort(key=len)
+            cands = set(buckets[0]).intersection(*buckets[1:])
+            matched.update(n for n in cands if i in n)
+        return matched
+
+    def score(self, ings, limit=20):
+        """按“我有什么食材”给候选菜谱打分，返回格式与原 pantry 接口一致。"""
+        self.ensure_built()
+        with self._lock:
+            matched = self._matched_ingredients(ings)
+            cand_ids = set()
+            for n in matched:
+                cand_ids.update(self._by_ing[n])
+
+            res = []
+            # 按 id 排序，保证同分时顺序和原来 SELECT * 的顺序一致
+            for rid in sorted(cand_ids):
+                r = self._recipes[rid]
+                needed = r.ingredients
+                hits = sum(1 for n in needed if n in matched)
+                missing = [n for n in needed if n not in matched]
+                if hits > 0 and len(missing) <= 3:
+                    res.append(
+                        {
+                            "name": r.name,
+                            "category": r.category,
+                            "score": int(hits / len(needed) * 100),
+                            "missing": missing,
+                            "tags": list(r.tags),
+                        }
+                    )
+
+        res.sort(key=lambda x: x["score"], reverse=True)
+        return res[:limit]
+
+
+# 进程内单例
+pantry_index = PantryIndex()
@@ -0,0 +1,116 @@
+# 文件: core/render.py
+# 说明: 菜谱详情页的 Markdown -> HTML 渲染缓存
+#   - key = (菜谱 id, 文件 mtime_ns + size)，只 stat 不读文件就能判断是否过期
+#   - 内存里一份 LRU，SQLite 的 recipes_html 表里再存一份（重启 / 多 worker 共享）
+#   - 启动时可以后台预热，也可以离线构建：python -m core.render
+
+import datetime
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import markdown
+
+import config
+from core import db
+from core.catalog import catalog
+from core.search import recipe_file
+
+
+class RenderedRecipe:
+    __slots__ = ("html", "source_key", "etag", "mtime")
+
+    def __init__(self, html, source_key, mtime):
+        self.html = html
+        self.source_key = source_key
+        self.mtime = mtime
+        self.etag = hashlib.sha1(source_key.encode("utf-8")).hexdigest()[:16]
+
+
+def _source_key(st) -> str:
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+class HtmlCache:
+    def __init__(self, max_items=512):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()  # recipe_id -> RenderedRecipe
+        self.stats = {"mem_hits": 0, "db_hits": 0, "renders": 0}
+
+    def get(self, recipe_id: int, rel_path: str):
+        """返回 RenderedRecipe；菜谱文件不存在时返回 None（由调用方兜底）。"""
+        try:
+            st = os.stat(recipe_file(rel_path))
+        except OSError:
+            return None
+        key = _source_key(st)
+
+        with self._lock:
+            hit = self._mem.get(recipe_id)
+            if hit is not None and hit.source_key == key:
+                self._mem.move_to_end(recipe_id)
+                self.stats["mem_hits"] += 1
+                return hit
+
+        with db.get_cook_conn() as conn:
+            row = conn.execute(
+                "SELECT html FROM recipes_html WHERE recipe_id=? AND source_key=?",
+                (recipe_id, key),
+            ).fetchone()
+            if row is not None:
+                rendered = RenderedRecipe(row["html"], key, st.st_mtime)
+                self.stats["db_hits"] += 1
+            else:
+                rendered = self._render(conn, recipe_id, rel_path, key, st.st_mtime)
+                if rendered is None:
+                    return None
+
+        with self._lock:
+            self._mem[recipe_id] = rendered
+            self._mem.move_to_end(recipe_id)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+        return rendered
+
+    def _render(self, conn, recipe_id, rel_path, key, mtime):
+        try:
+            with open(recipe_file(rel_path), "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            return None
+        html = markdown.markdown(content)
+        conn.execute(
+            "INSERT OR REPLACE INTO recipes_html (recipe_id, source_key, html, rendered_at) "
+            "VALUES (?,?,?,?)",
+            (recipe_id, key, html, datetime.datetime.now().isoformat(timespec="seconds")),
+        )
+        conn.commit()
+        self.stats["renders"] += 1
+        return RenderedRecipe(html, key, mtime)
+
+    def invalidate(self, recipe_id: int):
+        with self._lock:
+            self._mem.pop(recipe_id, None)
+
+    def warm(self, limit=None):
+        """把所有（或前 limit 道）菜谱渲染一遍，已经是最新的只会走一次 stat + 查库。"""
+        n = 0
+        for r in catalog.all()[:limit]:
+            if self.get(r.id, r.path) is not None:
+                n += 1
+        return n
+
+
+html_cache = HtmlCache(max_items=config.COOK_HTML_CACHE_ITEMS)
+
+
+def warm_in_background():
+    threading.Thread(target=html_cache.warm, name="html-warm", daemon=True).start()
+
+
+if __name__ == "__main__":
+    # 离线构建：把所有菜谱的 HTML 预先渲染进 recipes_html
+    db.migrate_cook()
+    print(f"rendered {html_cache.warm()} recipes, stats={html_cache.stats}")
@@ -0,0 +1,79 @@
+# 文件: core/rollup.py
+# 说明: 每日汇总表 daily_totals（logs 按 用户 + 日期 物化的汇总）
+#   仪表盘每次打开都要当天总热量，图表 / 日报要一段日期里每天的总热量，
+#   原来每次读都对 logs 现算 SUM。读远多于写，所以改成写的时候顺手维护：
+#   - 表结构和首次回填（ROLLUP_SCHEMA）由 core.db 的迁移执行
+#   - /api/add、/api/delete_log 在同一个事务里调 refresh() 重算受影响的那一天
+#   - 读的一侧就是主键上的单点 / 范围查找
+#   数据对不上时（手工改过库之类）整表重建：python -m core.rollup [--user ID]
+#
+# 每个 (user_id, date) 一行，当天至少有一条记录才有行：
+#   food_kcal    当天 type='food' 的热量合计
+#   entries      当天的记录条数（食物 + 体重）
+#   last_weight  当天最后一条体重记录，没称体重为 NULL
+
+# 按 where 条件从 logs 重新算出汇总行
+_FILL_SQL = """
+INSERT OR REPLACE INTO daily_totals (user_id, date, food_kcal, entries, last_weight)
+SELECT l.user_id, l.date,
+       COALESCE(SUM(CASE WHEN l.type = 'food' THEN l.value END), 0),
+       COUNT(*),
+       (SELECT w.value FROM logs w
+         WHERE w.user_id = l.user_id AND w.date = l.date AND w.type = 'weight'
+         ORDER BY w.id DESC LIMIT 1)
+  FROM logs l
+ WHERE l.user_id IS NOT NULL AND l.date IS NOT NULL AND {where}
+ GROUP BY l.user_id, l.date
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    food_kcal REAL NOT NULL DEFAULT 0,
+    entries INTEGER NOT NULL DEFAULT 0,
+    last_weight REAL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+""" + _FILL_SQL.format(where="1") + ";"
+
+
+def refresh(conn, days):
+    """
+    重算若干天的汇总行。days: [(user_id, date), ...]
+    在调用方的事务里执行（不 commit），和改 logs 的语句一起提交或回滚。
+    """
+    days = list({(uid, date) for uid, date in days})
+    if not days:
+        return
+    # 那天的记录删光了就不该再有行，所以先删再按 logs 重新插
+    conn.executemany("DELETE FROM daily_totals WHERE user_id=? AND date=?", days)
+    conn.executemany(_FILL_SQL.format(where="l.user_id = ? AND l.date = ?"), days)
+
+
+def rebuild(conn, user_id=None):
+    """整表（或某个用户）从 logs 重建，返回重建后的行数。"""
+    if user_id is None:
+        conn.execute("DELETE FROM daily_totals")
+        conn.execute(_FILL_SQL.format(where="1"))
+        return conn.execute("SELECT COUNT(*) FROM daily_totals").fetchone()[0]
+    conn.execute("DELETE FROM daily_totals WHERE user_id=?", (user_id,))
+    conn.execute(_FILL_SQL.format(where="l.user_id = ?"), (user_id,))
+    return conn.execute(
+        "SELECT COUNT(*) FROM daily_totals WHERE user_id=?", (user_id,)
+    ).fetchone()[0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from core import db
+
+    parser = argparse.ArgumentParser(description="从 logs 重建 daily_totals")
+    parser.add_argument("--user", type=int, help="只重建这个用户")
+    args = parser.parse_args()
+
+    db.migrate_diet()
+    with db.get_diet_conn() as conn:
+        n = rebuild(conn, args.user)
+    print(f"[rollup] daily_totals rebuilt: {n} rows")
@@ -0,0 +1,178 @@
+# 文件: core/schema.py
+# 说明: 大模型 JSON 输出的声明式校验（给 core.ai.generate_json 的 schema= 参数用）
+#   用 dataclass 声明期望的结构，coerce() 一遍完成校验 + 类型转换，返回 dataclass 实例：
+#   - 能救的就地救：“500 kcal” / "3" → 数字，单个值 → 列表，超出范围的数夹回范围内，
+#     列表里的空值 / 不合格的元素丢掉，非必填字段的值不能用时退回默认值
+#   - 救不了的（必填字段缺失、为空或类型完全不对）抛 SchemaError，
+#     由 generate_json 带着错误信息让模型重写一次
+#   字段约束写在 field 的 metadata 里：
+#       difficulty: int = field(default=3, metadata=rule(min=1, max=5))
+#   支持的类型：str / int / float / bool / Optional[...] / List[...] / 嵌套 dataclass / dict / Any
+
+import dataclasses
+import functools
+import re
+import typing
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_TRUE = ("true", "yes", "1", "是", "对")
+_FALSE = ("false", "no", "0", "否", "不")
+
+
+class SchemaError(ValueError):
+    """模型输出不符合 schema，path 是出错字段的位置（如 meta.difficulty / recipes[2].name）。"""
+
+    def __init__(self, path, message):
+        self.path = path
+        super().__init__(f"{path or '整个 JSON'}: {message}")
+
+
+def rule(min=None, max=None, min_len=None, max_len=None):
+    """
+    字段约束，放进 dataclasses.field(metadata=...)：
+    min / max          数字夹到这个范围
+    min_len            字符串 / 列表（去掉空值和不合格元素后）短于它算违反
+    max_len            字符串 / 列表超过就截断
+    """
+    return {"schema": {"min": min, "max": max, "min_len": min_len, "max_len": max_len}}
+
+
+def coerce(tp, value, path=""):
+    """按 tp（dataclass / List[dataclass] / 基本类型）校验并转换 value，不符合时抛 SchemaError。"""
+    return _coerce(tp, value, path, {})
+
+
+def _coerce(tp, value, path, rules):
+    if tp is typing.Any:
+        return value
+    if dataclasses.is_dataclass(tp):
+        return _object(tp, value, path)
+
+    origin = typing.get_origin(tp)
+    if origin is typing.Union:
+        args = [a for a in typing.get_args(tp) if a is not type(None)]
+        if value is None:
+            return None
+        return _coerce(args[0], value, path, rules)
+    if origin is list or tp is list:
+        args = typing.get_args(tp)
+        return _list(args[0] if args else typing.Any, value, path, rules)
+    if tp is dict or origin is dict:
+        if not isinstance(value, dict):
+            raise SchemaError(path, f"应为对象，实际是 {_kind(value)}")
+        return value
+    if tp is bool:
+        return _bool(value, path)
+    if tp in (int, float):
+        return _number(tp, value, path, rules)
+    if tp is str:
+        return _string(value, path, rules)
+    raise TypeError(f"schema 不支持的类型: {tp!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def _fields(cls):
+    hints = typing.get_type_hints(cls)
+    return tuple(
+        (
+            f.name,
+            hints[f.name],
+            f.metadata.get("schema") or {},
+            f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING,
+        )
+        for f in dataclasses.fields(cls)
+        if f.init
+    )
+
+
+def _object(cls, value, path):
+    if not isinstance(value, dict):
+        raise SchemaError(path, f"应为对象，实际是 {_kind(value)}")
+    kwargs = {}
+    for name, tp, rules, required in _fields(cls):
+        sub = f"{path}.{name}" if path else name
+        raw = value.get(name)
+        if raw is None:
+            if required:
+                raise SchemaError(sub, "缺少必填字段")
+            continue
+        try:
+            kwargs[name] = _coerce(tp, raw, sub, rules)
+        except SchemaError:
+            if required:
+                raise
+            # 非必填字段给了个用不了的值：当没给，用默认值
+    return cls(**kwargs)
+
+
+def _list(item_tp, value, path, rules):
+    if isinstance(value, (list, tuple)):
+        items = value
+    elif isinstance(value, (str, int, float, dict)):
+        items = [value]
+    else:
+        raise SchemaError(path, f"应为数组，实际是 {_kind(value)}")
+
+    out = []
+    for i, item in enumerate(items):
+        if item is None or item == "":
+            continue
+        try:
+            out.append(_coerce(item_tp, item, f"{path}[{i}]", {}))
+        except SchemaError:
+            continue  # 单个元素不合格就丢掉，不连累整份
+    if rules.get("min_len") and len(out) < rules["min_len"]:
+        raise SchemaError(path, f"至少要 {rules['min_len']} 个有效元素，实际 {len(out)} 个")
+    if rules.get("max_len") is not None:
+        out = out[:rules["max_len"]]
+    return out
+
+
+def _number(tp, value, path, rules):
+    if isinstance(value, bool):
+        raise SchemaError(path, "应为数字，实际是布尔值")
+    if isinstance(value, (int, float)):
+        n = value
+    elif isinstance(value, str) and (m := _NUMBER.search(value)):
+        n = float(m.group())
+    else:
+        raise SchemaError(path, f"应为数字，实际是 {_kind(value)}")
+    if rules.get("min") is not None:
+        n = max(n, rules["min"])
+    if rules.get("max") is not None:
+        n = min(n, rules["max"])
+    return int(round(n)) if tp is int else float(n)
+
+
+def _string(value, path, rules):
+    if isinstance(value, str):
+        s = value.strip()
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        s = str(value)
+    else:
+        raise SchemaError(path, f"应为字符串，实际是 {_kind(value)}")
+    if rules.get("min_len") and len(s) < rules["min_len"]:
+        raise SchemaError(path, "不能为空" if not s else f"至少 {rules['min_len']} 个字")
+    if rules.get("max_len") is not None:
+        s = s[:rules["max_len"]]
+    return s
+
+
+def _bool(value, path):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if isinstance(value, str):
+        s = value.strip().lower()
+        if s in _TRUE:
+            return True
+        if s in _FALSE:
+            return False
+    raise SchemaError(path, f"应为布尔值，实际是 {_kind(value)}")
+
+
+def _kind(value):
+    return {dict: "对象", list: "数组", str: "字符串", bool: "布尔值", type(None): "null"}.get(
+        type(value), type(value).__name__
+    )
@@ -0,0 +1,132 @@
+# 文件: core/search.py
+# 说明: 菜谱全文检索（SQLite FTS5）
+#   - recipes_fts 覆盖 菜名 / 标签 / 食材 / Markdown 正文
+#   - 表和触发器的 DDL（FTS_SCHEMA）由 core.db 的迁移执行
+#   - 菜名、标签、食材由 recipes 表上的触发器自动同步
+#   - 正文不在表里，由 index_body()/rebuild_index() 从 config.COOK_ROOT 读文件写入
+#   - 分词用 FTS5 自带的 trigram：中文不需要分词词典，任意 ≥3 字的子串都能走索引；
+#     1~2 个字的短查询（“鸡蛋”“豆腐”）trigram 匹配不了，退回到菜名 / 标签 / 食材上的 LIKE：
+#     这几列都很短，扫一遍很快；正文不参与（又长，一两个字在正文里命中也基本是噪音）
+
+import os
+
+import config
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+    name, tags, ingredients, body,
+    tokenize = 'trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_ai AFTER INSERT ON recipes BEGIN
+    INSERT INTO recipes_fts (rowid, name, tags, ingredients, body)
+    VALUES (new.id, new.name, new.tags, new.structured_ingredients, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_ad AFTER DELETE ON recipes BEGIN
+    DELETE FROM recipes_fts WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_au AFTER UPDATE ON recipes BEGIN
+    UPDATE recipes_fts
+       SET name = new.name,
+           tags = new.tags,
+           ingredients = new.structured_ingredients
+     WHERE rowid = old.id;
+END;
+"""
+
+# bm25 列权重：菜名 > 标签 > 食材 > 正文
+BM25_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+
+def recipe_file(rel_path: str) -> str:
+    """recipes.path 里有 Windows 风格的反斜杠，统一转成本机路径。"""
+    parts = (rel_path or "").replace("\\", "/").split("/")
+    return os.path.join(config.COOK_ROOT, *parts)
+
+
+def _read_body(rel_path: str) -> str:
+    full_path = recipe_file(rel_path)
+    if not rel_path or not os.path.exists(full_path):
+        return ""
+    try:
+        with open(full_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception:
+        return ""
+
+
+def ensure_index(conn):
+    """索引行数和 recipes 对不上时整体重建一次（表和触发器由 core.db 的迁移创建）。"""
+    n_fts = conn.execute("SELECT COUNT(*) FROM recipes_fts").fetchone()[0]
+    n_rec = conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+    if n_fts != n_rec:
+        rebuild_index(conn)
+
+
+def rebuild_index(conn):
+    """清空 recipes_fts，按 recipes 表 + 菜谱文件全量重建。"""
+    rows = conn.execute(
+        "SELECT id, name, tags, structured_ingredients, path FROM recipes"
+    ).fetchall()
+    conn.execute("DELETE FROM recipes_fts")
+    conn.executemany(
+        "INSERT INTO recipes_fts (rowid, name, tags, ingredients, body) VALUES (?,?,?,?,?)",
+        [
+            (r[0], r[1], r[2], r[3], _read_body(r[4]))
+            for r in rows
+        ],
+    )
+    conn.commit()
+
+
+def index_body(conn, recipe_id: int, markdown_text: str):
+    """写入/更新某道菜的正文（调用方负责 commit）。"""
+    conn.execute(
+        "UPDATE recipes_fts SET body=? WHERE rowid=?",
+        (markdown_text or "", recipe_id),
+    )
+
+
+def _fts_phrase(q: str) -> str:
+    # 整个查询当一个短语，避免用户输入里的 AND/OR/* 被当成 FTS 语法
+    return '"' + q.replace('"', '""') + '"'
+
+
+def search_ids(conn, q: str, limit: int = 20):
+    """返回按相关度排好序的 recipes.id 列表（记录本身从 core.catalog 取）。"""
+    q = (q or "").strip()
+    if not q:
+        return []
+
+    if len(q) >= 3:
+        rows = conn.execute(
+            f"""
+            SELECT rowid
+              FROM recipes_fts
+             WHERE recipes_fts MATCH ?
+             ORDER BY bm25(recipes_fts, {", ".join(map(str, BM25_WEIGHTS))})
+             LIMIT ?
+            """,
+            (_fts_phrase(q), limit),
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    # 短查询：trigram 不支持 < 3 字的 MATCH，只在短列上 LIKE，按命中的列排个序
+    like = f"%{q}%"
+    rows = conn.execute(
+        """
+        SELECT f.rowid
+          FROM recipes_fts f
+         WHERE f.name LIKE ?1 OR f.tags LIKE ?1 OR f.ingredients LIKE ?1
+         ORDER BY (f.name = ?2) DESC,
+                  (f.name LIKE ?1) DESC,
+                  (f.tags LIKE ?1) DESC,
+                  length(f.name),
+                  f.rowid
+         LIMIT ?3
+        """,
+        (like, q, limit),
+    ).fetchall()
+    return [r[0] for r in rows]
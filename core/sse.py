@@ -0,0 +1,38 @@
+# 文件: core/sse.py
+# 说明: Server-Sent Events 小工具，把生成器包装成 Flask 流式响应
+#   每条事件的 data 都是一行 JSON；正文增量用 {"delta": "..."}，结束时发 event: done
+
+import json
+
+from flask import Response, stream_with_context
+
+
+def sse_event(data, event=None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events) -> Response:
+    """
+    events: 生成器，产出已经格式化好的 SSE 字符串（用 sse_event 拼）。
+    结尾自动补一个 done 事件。
+    """
+
+    def gen():
+        yield from events
+        yield sse_event({}, event="done")
+
+    return Response(
+        stream_with_context(gen()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # 让 nginx 别攒着不发
+        },
+    )
+
+
+def sse_text(chunks):
+    """把纯文本增量生成器转成 delta 事件。"""
+    for chunk in chunks:
+        yield sse_event({"delta": chunk})
@@ -0,0 +1,74 @@
+# 文件: gunicorn.conf.py
+# 说明: gunicorn 生产配置
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# 我们的请求大头是调大模型：CPU 几乎不用，一等就是几秒到几十秒。
+# 所以默认用 gthread：进程数跟着核数走，每个进程开一堆线程去等 I/O。
+# 想试 gevent 的话：GUNICORN_WORKER_CLASS=gevent（需要 pip install gevent）。
+# 各 worker 类型的吞吐对比见 python -m tools.loadtest
+#
+# 平滑重载：
+#   kill -HUP <master pid>    重新读本文件并逐个替换 worker（旧 worker 处理完手上请求才退出）
+#   注意 preload_app 开着时 HUP 不会加载新代码（代码在 master 里已经导入好了），
+#   发版换代码用：kill -USR2 <master pid>，新 master 起来后再 kill -QUIT <旧 master pid>
+
+import multiprocessing
+import os
+
+# 注意别叫 config：gunicorn 会把本文件里的同名变量当成它自己的配置项
+import config as app_config
+
+# 和 core.http._BoundedRetry.MAX_WAIT 保持一致。这里不直接 import core.http：
+# master 提前导入 requests/ssl 的话，gevent worker 的猴子补丁就打不全了
+_RETRY_MAX_WAIT = 8
+
+_cores = multiprocessing.cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+if worker_class == "sync":
+    # 一个进程同时只能处理一个请求，只能靠多开进程
+    _default_workers, _default_threads = 2 * _cores + 1, 1
+else:
+    # CPU 活很少（渲染 Markdown / 拼 JSON），进程数 = 核数 + 1 就够了；
+    # 线程数和 requests 连接池一样大，每个线程都能拿到一条 keep-alive 连接
+    _default_workers, _default_threads = _cores + 1, app_config.QWEN_POOL_SIZE
+
+workers = int(os.getenv("GUNICORN_WORKERS", str(_default_workers)))
+threads = int(os.getenv("GUNICORN_THREADS", str(_default_threads)))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))  # 只对 gevent 生效
+
+# master 里先导入应用（迁移 / 建索引 / 预热 HTML 只做一次），worker 写时复制共享内存。
+# gevent 要在导入应用之前打猴子补丁，preload 会让它补不全，所以 gevent 下关掉。
+preload_app = os.getenv("GUNICORN_PRELOAD", "1" if worker_class != "gevent" else "0") == "1"
+
+# 一次 _call_qwen 最坏要等多久：建连 + 读超时 + 每次 429/5xx 重试的退避上限
+_llm_budget = (
+    app_config.QWEN_CONNECT_TIMEOUT
+    + app_config.QWEN_TIMEOUT
+    + app_config.QWEN_MAX_RETRIES * _RETRY_MAX_WAIT
+)
+# worker 多久没心跳就被 master 杀掉：sync worker 在等模型时发不了心跳，
+# 所以至少要比一次完整的模型调用长，再留点余量
+timeout = int(os.getenv("GUNICORN_TIMEOUT", str(int(_llm_budget) + 10)))
+# 重载 / 停机时，给正在等模型的请求留一次读超时的时间把话说完
+graceful_timeout = int(
+    os.getenv("GUNICORN_GRACEFUL_TIMEOUT", str(int(app_config.QWEN_CONNECT_TIMEOUT + app_config.QWEN_TIMEOUT)))
+)
+keepalive = 5
+
+# 跑久了的 worker 定期换掉，防止内存慢慢涨；加点抖动免得同时重启
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+
+pidfile = os.getenv("GUNICORN_PIDFILE") or None
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None  # 设成空串就不打访问日志
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def when_ready(server):
+    server.log.info(
+        "worker_class=%s workers=%s threads=%s timeout=%ss graceful_timeout=%ss preload=%s",
+        worker_class, workers, threads, timeout, graceful_timeout, preload_app,
+    )
@@ -2,39 +2,49 @@
 from flask import Flask, render_template
 import config
 
-from apps.diet import diet_bp
-from apps.cook import cook_bp
+from apps.diet import diet_bp, init_diet_db
+from apps.cook import cook_bp, init_cook_db
 
-app = Flask(__name__)
-app.register_blueprint(diet_bp)
-app.register_blueprint(cook_bp)
 
+def create_app(warm_html=None):
+    """
+    应用工厂：建 app、注册蓝图，然后跑一次启动阶段（迁移检查 / 默认数据）。
+    导入 apps.* 本身没有副作用；gunicorn preload 时这里只在 master 里执行一次。
+    warm_html: 是否后台预热菜谱详情 HTML，默认看 config.COOK_HTML_WARM
+    """
+    app = Flask(__name__)
+    app.register_blueprint(diet_bp)
+    app.register_blueprint(cook_bp)
+    _register_pages(app)
 
-@app.route("/")
-def home():
-    return render_template("hub.html", title="AI Personal Hub")
+    init_diet_db()
+    init_cook_db(warm_html=warm_html)
+    return app
 
 
-@app.route("/diet")
-def diet_page():
-    return render_template("diet.html", title="FitLife AI")
+def _register_pages(app):
+    @app.route("/")
+    def home():
+        return render_template("hub.html", title="AI Personal Hub")
 
+    @app.route("/diet")
+    def diet_page():
+        return render_template("diet.html", title="FitLife AI")
 
-@app.route("/cook")
-def cook_page():
-    return render_template("cook.html", title="AI 厨房")
+    @app.route("/cook")
+    def cook_page():
+        return render_template("cook.html", title="AI 厨房")
 
-
-@app.route("/brain")
-def brain_page():
-    # 这里把思源地址丢给模板
-    return render_template(
-        "brain.html",
-        title="小ka 知识仓库",
-        siyuan_url=config.SIYUAN_URL,
-    )
+    @app.route("/brain")
+    def brain_page():
+        # 这里把思源地址丢给模板
+        return render_template(
+            "brain.html",
+            title="小ka 知识仓库",
+            siyuan_url=config.SIYUAN_URL,
+        )
 
 
 if __name__ == "__main__":
     print("🚀 服务器启动中... (AI 模式: 开启)")
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    create_app().run(debug=True, host="0.0.0.0", port=5000)
@@ -41,21 +41,27 @@ const app = createApp({
             state.chatInput = "";
             state.isThinking = true;
 
+            // 先放一条空的 AI 消息，流式回复一段段往里填
+            appendChat("ai", "");
+            const reply = state.chatLog[state.chatLog.length - 1];
             try {
-                const res = await axios.post("/api/cook/chef_chat", { message: msg });
-                const data = res.data || {};
-                appendChat("ai", data.reply || "好啦，菜单已经更新在右边啦～");
-
-                // 更新推荐列表
-                state.suggestList = (data.recipes || []).map((r) => ({
-                    name: r.name,
-                    score: r.score || 0,
-                    missing: r.missing || [],
-                    exists: !!r.exists,
-                    category: r.category || "",
-                }));
+                await streamPost("/api/cook/chef_chat/stream", { message: msg }, (event, data) => {
+                    if (event === "recipes") {
+                        // 更新推荐列表
+                        state.suggestList = (data.recipes || []).map((r) => ({
+                            name: r.name,
+                            score: r.score || 0,
+                            missing: r.missing || [],
+                            exists: !!r.exists,
+                            category: r.category || "",
+                        }));
+                    } else if (data.delta) {
+                        reply.text += data.delta;
+                    }
+                });
+                if (!reply.text) reply.text = "好啦，菜单已经更新在右边啦～";
             } catch (e) {
-                appendChat("ai", "网络有点问题，我刚刚没听清，再说一遍？");
+                reply.text = "网络有点问题，我刚刚没听清，再说一遍？";
             } finally {
                 state.isThinking = false;
             }
@@ -68,13 +74,36 @@ const app = createApp({
                 return;
             }
             try {
-                const res = await axios.get(`/api/cook/search?q=${encodeURIComponent(q)}`);
-                state.searchList = res.data || [];
+                const res = await axios.get(
+                    `/api/cook/search?q=${encodeURIComponent(q)}&async=1`
+                );
+                const data = res.data || [];
+                if (Array.isArray(data)) {
+                    state.searchList = data;
+                    return;
+                }
+                // 库里没有：后台正在 AI 生成，轮询任务结果
+                state.searchList = [];
+                state.searchList = await pollJob(data.job_id, q);
             } catch (e) {
                 console.error(e);
             }
         };
 
+        const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+        const pollJob = async (jobId, q) => {
+            for (let i = 0; i < 40; i++) {
+                await sleep(1500);
+                // 用户已经换了搜索词，就别再覆盖结果了
+                if (state.searchQ.trim() !== q) return state.searchList;
+                const res = await axios.get(`/api/cook/job/${jobId}`);
+                const job = res.data || {};
+                if (job.status !== "pending") return job.results || [];
+            }
+            return [];
+        };
+
         const loadDish = async (name) => {
             try {
                 const res = await axios.get(`/api/cook/detail?name=${encodeURIComponent(name)}`);
@@ -118,17 +147,19 @@ const app = createApp({
             if (!q || !state.curDish) return;
             state.recipeChatLog.push({ role: "user", text: q });
             state.recipeChatInput = "";
+            state.recipeChatLog.push({ role: "ai", text: "" });
+            const answer = state.recipeChatLog[state.recipeChatLog.length - 1];
             try {
-                const res = await axios.post("/api/cook/ask_chef", {
-                    recipe: state.curDish.name,
-                    question: q,
-                });
-                state.recipeChatLog.push({
-                    role: "ai",
-                    text: res.data.answer || "这个问题有点难，再换一种问法？",
-                });
+                await streamPost(
+                    "/api/cook/ask_chef/stream",
+                    { recipe: state.curDish.name, question: q },
+                    (event, data) => {
+                        if (data.delta) answer.text += data.delta;
+                    }
+                );
+                if (!answer.text) answer.text = "这个问题有点难，再换一种问法？";
             } catch (e) {
-                state.recipeChatLog.push({ role: "ai", text: "网络错误，请稍后再试。" });
+                answer.text = "网络错误，请稍后再试。";
             }
         };
 
@@ -24,6 +24,7 @@ const app = createApp({
         current_weight: 60,
         bmr: 1800,
         history: [],
+        next_cursor: null,
       },
 
       // 记录输入
@@ -170,6 +171,20 @@ const app = createApp({
       }
     };
 
+    // 今日记录分页：接着上一页最后一条往后取
+    const loadMoreHistory = async () => {
+      if (!state.dashboard.next_cursor) return;
+      try {
+        const res = await axios.get(
+          `/api/get_dashboard?user_id=${state.currentUserId}&date=${state.currentDate}&before=${state.dashboard.next_cursor}`
+        );
+        state.dashboard.history = state.dashboard.history.concat(res.data.data.history || []);
+        state.dashboard.next_cursor = res.data.data.next_cursor;
+      } catch (e) {
+        console.error(e);
+      }
+    };
+
     const loadChart = async () => {
       try {
         const res = await axios.get(
@@ -399,11 +414,15 @@ const app = createApp({
     // ---------------- 小ka 报告 ----------------
 
     const genDailyReport = async () => {
+      state.dailyReportText = "";
       try {
-        const res = await axios.post("/api/diet/daily_report", {
-          user_id: state.currentUserId,
-        });
-        state.dailyReportText = res.data.report;
+        await streamPost(
+          "/api/diet/daily_report/stream",
+          { user_id: state.currentUserId },
+          (event, data) => {
+            if (data.delta) state.dailyReportText += data.delta;
+          }
+        );
       } catch (e) {
         console.error(e);
         alert("小ka 今天有点累，报告没整出来~");
@@ -434,6 +453,7 @@ const app = createApp({
       uploadPhoto,
       submitLog,
       deleteLog,
+      loadMoreHistory,
       openWeightModal,
       onDateChange,
       openUserModal,
@@ -0,0 +1,34 @@
+// 文件: static/js/sse.js
+// 说明: 前端读 SSE 流的小工具，cook.html / diet.html 共用（要在页面自己的脚本之前引入）
+//   后端对应 core/sse.py：每个事件是 "event: xxx\ndata: {json}\n\n"
+
+// 读取 SSE 流：POST 请求用不了 EventSource，只能自己按 "\n\n" 切事件
+async function streamPost(url, body, onEvent) {
+    const res = await fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+    });
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = "";
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        let idx;
+        while ((idx = buf.indexOf("\n\n")) >= 0) {
+            const raw = buf.slice(0, idx);
+            buf = buf.slice(idx + 2);
+            let event = "message";
+            let data = "";
+            raw.split("\n").forEach((line) => {
+                if (line.startsWith("event:")) event = line.slice(6).trim();
+                else if (line.startsWith("data:")) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
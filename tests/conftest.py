@@ -0,0 +1,73 @@
+# 文件: tests/conftest.py
+# 说明: 测试共用的夹具
+#   - 所有库 / 菜谱目录 / 大模型缓存都指到临时目录（在导入 core / apps 之前改 config），不碰 data/ 下的真实数据
+#   - fake_qwen：起一个 tools.fake_qwen 假服务，core.ai 指过去，用它的 stats 数上游请求
+#
+# 用法: python -m pytest -q
+
+import os
+import tempfile
+
+import pytest
+
+import config
+
+_TMP = tempfile.mkdtemp(prefix="xiaoka-test-")
+config.DB_DIET = os.path.join(_TMP, "diet_data.db")
+config.DB_COOK = os.path.join(_TMP, "cook_data.db")
+config.COOK_ROOT = os.path.join(_TMP, "HowToCook", "dishes")
+config.LLM_CACHE_DB = os.path.join(_TMP, "llm_cache.db")
+config.LLM_CACHE_ENABLED = False
+config.COOK_HTML_WARM = False
+
+
+@pytest.fixture(scope="session")
+def app():
+    from run import create_app
+
+    app = create_app(warm_html=False)
+    app.testing = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user_id(client):
+    """每个测试一个新用户，记录互不干扰。"""
+    return client.post("/api/create_user", json={"name": "测试"}).get_json()["id"]
+
+
+@pytest.fixture
+def fake_qwen(monkeypatch):
+    """
+    fake_qwen(**options) 起一个假 DashScope 服务并让 core.ai 指过去，返回它的请求计数 stats。
+    options 同 tools.fake_qwen.FakeQwenHandler.options（latency / rate_429 / rate_500 / retry_after / fail_first）。
+    每个测试一个全新的熔断器，互不影响。
+    """
+    from core import ai
+    from core.http import CircuitBreaker
+    from tools.fake_qwen import FakeQwenHandler, serve_in_thread
+
+    servers = []
+
+    def start(**options):
+        options = {"latency": 0.0, "rate_429": 0.0, "rate_500": 0.0, "retry_after": 0, "fail_first": 0, **options}
+        server, url = serve_in_thread(**options)
+        servers.append(server)
+        FakeQwenHandler.stats.update({"requests": 0, "429": 0, "500": 0})
+        monkeypatch.setattr(ai, "API_KEY", "fake")
+        monkeypatch.setattr(ai, "QWEN_API_URL", url)
+        monkeypatch.setattr(
+            ai, "_breaker",
+            CircuitBreaker(config.QWEN_BREAKER_THRESHOLD, config.QWEN_BREAKER_COOLDOWN),
+        )
+        return FakeQwenHandler.stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
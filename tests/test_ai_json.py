@@ -0,0 +1,101 @@
+# generate_json 和回复缓存：解析 / 校验通过的回复才进缓存，修复 / 重写的请求不走缓存
+
+from dataclasses import dataclass, field
+
+import pytest
+
+import config
+from core import ai, schema
+from core.cache import llm_cache
+
+
+@dataclass
+class Dish:
+    markdown_content: str = field(metadata=schema.rule(min_len=1))
+    difficulty: int = 3
+
+
+GOOD = '{"markdown_content": "# 番茄炒蛋", "difficulty": 2}'
+NO_BODY = '{"difficulty": 2}'
+BROKEN = '{"markdown_content": "# 番茄炒蛋" "difficulty": 2}'
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", True)
+    llm_cache.clear()
+    yield llm_cache
+    llm_cache.clear()
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    upstream(first=..., repair=..., reprompt=...) 按请求种类给固定回复，返回记录每次上游请求种类的列表。
+    """
+    calls = []
+
+    def install(first, repair=None, reprompt=None):
+        def kind(messages):
+            last = messages[-1]["content"]
+            if "解析失败" in last:
+                return "repair"
+            if "不符合要求" in last:
+                return "reprompt"
+            return "first"
+
+        def fake_request(messages, temperature, max_tokens):
+            calls.append(kind(messages))
+            return {"first": first, "repair": repair, "reprompt": reprompt}[calls[-1]]
+
+        async def fake_arequest(messages, temperature, max_tokens):
+            return fake_request(messages, temperature, max_tokens)
+
+        monkeypatch.setattr(ai, "_request_qwen", fake_request)
+        monkeypatch.setattr(ai, "_arequest_qwen", fake_arequest)
+        return calls
+
+    return install
+
+
+def test_schema_invalid_reply_is_not_cached(cache, upstream):
+    calls = upstream(first=NO_BODY, reprompt=NO_BODY)
+    puts = cache.stats()["puts"]
+
+    assert ai.generate_json("菜谱 A", schema=Dish) is None
+    assert ai.generate_json("菜谱 A", schema=Dish) is None
+    # 第二次照样问上游，而不是拿缓存里那份坏回复再失败一遍
+    assert calls == ["first", "reprompt", "first", "reprompt"]
+    assert cache.stats()["puts"] == puts
+
+
+def test_async_schema_invalid_reply_is_not_cached(cache, upstream):
+    calls = upstream(first=NO_BODY, reprompt=NO_BODY)
+    puts = cache.stats()["puts"]
+
+    for _ in range(2):
+        assert ai.run_async(ai.agenerate_json("菜谱 B", schema=Dish)) is None
+    assert calls == ["first", "reprompt", "first", "reprompt"]
+    assert cache.stats()["puts"] == puts
+
+
+def test_repaired_reply_is_cached(cache, upstream):
+    calls = upstream(first=BROKEN, repair=GOOD)
+
+    first = ai.generate_json("菜谱 C", schema=Dish)
+    again = ai.generate_json("菜谱 C", schema=Dish)
+    assert first == again == Dish("# 番茄炒蛋", 2)
+    # 记的是修好的那份：第二次直接命中，不再修
+    assert calls == ["first", "repair"]
+
+
+def test_reprompted_reply_is_cached(cache, upstream):
+    calls = upstream(first=NO_BODY, reprompt=GOOD)
+    puts = cache.stats()["puts"]
+
+    first = ai.run_async(ai.agenerate_json("菜谱 D", schema=Dish))
+    again = ai.generate_json("菜谱 D", schema=Dish)
+    assert first == again == Dish("# 番茄炒蛋", 2)
+    assert calls == ["first", "reprompt"]
+    # 命中缓存拿到的同一份回复不会再写一次
+    assert cache.stats()["puts"] == puts + 1
@@ -0,0 +1,32 @@
+# 菜谱目录只在 recipes 表变了的时候重新加载：详情页写渲染缓存（recipes_html）不算
+
+from apps import cook
+from core.catalog import catalog
+from core.render import html_cache
+
+
+def _add_recipe(name):
+    rec = {"name": name, "markdown": f"# {name}\n\n- 炒", "main_ings": ["鸡蛋"], "tags": ["家常菜"],
+           "difficulty": 2, "calories": 300}
+    return cook._store_generated([rec])[0]
+
+
+def test_detail_renders_do_not_reload_catalog(client):
+    names = [f"目录测试菜{i}" for i in range(5)]
+    for name in names:
+        _add_recipe(name)
+    generation = catalog.generation
+
+    for name in names:
+        html_cache.invalidate(catalog.get(name).id)
+        resp = client.get("/api/cook/detail", query_string={"name": name})
+        assert resp.status_code == 200
+        assert name in resp.get_json()["html"]
+    assert catalog.generation == generation
+
+
+def test_recipe_write_reloads_catalog(client):
+    generation = catalog.generation
+    _add_recipe("目录测试新菜")
+    assert catalog.get("目录测试新菜") is not None
+    assert catalog.generation == generation + 1
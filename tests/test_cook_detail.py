@@ -0,0 +1,97 @@
+# 菜谱详情：ETag / 304，渲染缓存按文件 mtime + 大小失效，元数据变了 ETag 也跟着变
+
+import os
+
+import pytest
+
+import config
+from apps import cook
+from core import db
+from core.catalog import catalog
+from core.render import html_cache
+
+
+@pytest.fixture
+def recipe(app):
+    name = "详情测试菜"
+    rec = {"name": name, "markdown": f"# {name}\n\n- 第一版", "main_ings": ["鸡蛋"], "tags": ["家常菜"],
+           "difficulty": 2, "calories": 300}
+    cook._store_generated([rec])
+    r = catalog.get(name)
+    html_cache.invalidate(r.id)
+    return r
+
+
+def _detail(client, name, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/api/cook/detail", query_string={"name": name}, headers=headers)
+
+
+def _rewrite(recipe, text):
+    path = os.path.join(config.COOK_ROOT, recipe.path)
+    st = os.stat(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    # 同一秒内改两次 mtime 可能不变，手动往后拨一点
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_etag_and_304(client, recipe):
+    renders = html_cache.stats["renders"]
+    first = _detail(client, recipe.name)
+    assert first.status_code == 200
+    assert "第一版" in first.get_json()["html"]
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert first.headers["Last-Modified"]
+
+    again = _detail(client, recipe.name, etag)
+    assert again.status_code == 304
+    assert again.data == b""
+    assert _detail(client, recipe.name, '"stale"').status_code == 200
+    # 只渲染了一次
+    assert html_cache.stats["renders"] == renders + 1
+
+
+def test_file_change_rerenders_and_changes_etag(client, recipe):
+    etag = _detail(client, recipe.name).headers["ETag"]
+    renders = html_cache.stats["renders"]
+
+    _rewrite(recipe, f"# {recipe.name}\n\n- 第二版，多了几个字")
+    resp = _detail(client, recipe.name, etag)
+    assert resp.status_code == 200
+    assert "第二版" in resp.get_json()["html"]
+    assert resp.headers["ETag"] != etag
+    assert html_cache.stats["renders"] == renders + 1
+
+
+def test_metadata_change_changes_etag(client, recipe):
+    etag = _detail(client, recipe.name).headers["ETag"]
+    with db.get_cook_conn() as conn:
+        conn.execute("UPDATE recipes SET calories_est=? WHERE id=?", (450, recipe.id))
+
+    resp = _detail(client, recipe.name, etag)
+    assert resp.status_code == 200
+    assert resp.get_json()["calories"] == 450
+    assert resp.headers["ETag"] != etag
+
+
+def test_rendered_html_is_shared_through_db(client, recipe):
+    _detail(client, recipe.name)
+    # 模拟另一个 worker / 重启：内存里没有，从 recipes_html 表里拿，不重新渲染
+    html_cache.invalidate(recipe.id)
+    stats = dict(html_cache.stats)
+    assert "第一版" in _detail(client, recipe.name).get_json()["html"]
+    assert html_cache.stats["db_hits"] == stats["db_hits"] + 1
+    assert html_cache.stats["renders"] == stats["renders"]
+
+    # 文件改了：表里那份 source_key 对不上，重新渲染
+    html_cache.invalidate(recipe.id)
+    _rewrite(recipe, f"# {recipe.name}\n\n- 第三版")
+    assert "第三版" in _detail(client, recipe.name).get_json()["html"]
+    assert html_cache.stats["renders"] == stats["renders"] + 1
+
+
+def test_bad_requests(client):
+    assert client.get("/api/cook/detail").status_code == 400
+    assert _detail(client, "没有这道菜").status_code == 404
@@ -0,0 +1,135 @@
+# 新菜生成的并发合并：同一道菜不管从同步 / 异步哪条路径同时进来，上游只调一次
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from apps import cook
+
+
+def test_concurrent_generate_many_calls_upstream_once(app, fake_qwen):
+    stats = fake_qwen(latency=0.3)
+    with ThreadPoolExecutor(3) as pool:
+        results = list(pool.map(lambda _: cook.generate_many(["并发同一道菜"]), range(3)))
+
+    assert stats["requests"] == 1
+    assert [r[0]["name"] for r in results] == ["并发同一道菜"] * 3
+
+
+def test_async_and_sync_generation_share_flight(app, fake_qwen):
+    stats = fake_qwen(latency=0.3)
+    results = {}
+    threads = [
+        threading.Thread(target=lambda: results.update(many=cook.generate_many(["同步异步同一道菜"]))),
+        threading.Thread(target=lambda: results.update(one=cook.generate_and_save("同步异步同一道菜"))),
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert stats["requests"] == 1
+    assert results["one"]["name"] == results["many"][0]["name"] == "同步异步同一道菜"
+
+
+def test_sync_generation_waits_for_batch_in_flight(app, fake_qwen):
+    stats = fake_qwen(latency=0.5)
+    started = threading.Event()
+    results = {}
+
+    def batch():
+        started.set()
+        results["many"] = cook.generate_many(["批量菜甲", "批量菜乙", "批量菜丙"])
+
+    t = threading.Thread(target=batch)
+    t.start()
+    started.wait()
+    # 等批量请求真正发出去（占住了所有菜名）再来单独生成其中一道
+    deadline = time.monotonic() + 2
+    while not cook._generation_flight.in_flight("批量菜乙") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    results["one"] = cook.generate_and_save("批量菜乙")
+    t.join()
+
+    assert stats["requests"] == 1
+    assert results["one"]["name"] == "批量菜乙"
+    assert [r["name"] for r in results["many"]] == ["批量菜甲", "批量菜乙", "批量菜丙"]
+    assert not any(cook._generation_flight.in_flight(n) for n in ("批量菜甲", "批量菜乙", "批量菜丙"))
+
+
+def _run_concurrently(fns, timeout=15):
+    """每个 fn 一个线程同时跑，返回各自的结果；超时没跑完直接判失败（卡死不拖住整个测试）。"""
+    results = [None] * len(fns)
+
+    def run(i, fn):
+        results[i] = fn()
+
+    threads = [threading.Thread(target=run, args=(i, fn), daemon=True) for i, fn in enumerate(fns)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout)
+    assert not any(t.is_alive() for t in threads), "generation deadlocked"
+    return results
+
+
+def _once_in_flight(name, fn):
+    """等 name 被别的调用方占住（最多 2 秒）再调 fn(name)。"""
+    deadline = time.monotonic() + 2
+    while not cook._generation_flight.in_flight(name) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return fn(name)
+
+
+def test_many_async_waiters_do_not_starve_the_leader(app, fake_qwen):
+    # 等待方比默认线程池还多：等待要是占线程，领头的写库就拿不到线程，整个循环卡死
+    stats = fake_qwen(latency=0.5)
+    dishes = [f"等待方菜{i}" for i in range(4)]
+    executor_size = min(32, (os.cpu_count() or 1) + 4)
+    waiters = executor_size // len(dishes) + 2
+
+    def leader():
+        return cook.generate_many(dishes)
+
+    def waiter():
+        return _once_in_flight(dishes[-1], lambda _: cook.generate_many(dishes))
+
+    results = _run_concurrently([leader] + [waiter] * waiters)
+
+    assert stats["requests"] == 1
+    for res in results:
+        assert [r["name"] for r in res] == dishes
+
+
+def test_generate_many_times_out_and_releases_keys(app, fake_qwen, monkeypatch):
+    fake_qwen(latency=1.0)
+    monkeypatch.setattr(config, "QWEN_ASYNC_WAIT", 0.2)
+
+    t0 = time.monotonic()
+    assert cook.generate_many(["超时菜甲", "超时菜乙"]) == [None, None]
+    assert time.monotonic() - t0 < 1.0
+    # 协程被取消，占住的菜名跟着放掉，后面的请求不会一直等它
+    deadline = time.monotonic() + 2
+    while cook._generation_flight.in_flight("超时菜甲") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not cook._generation_flight.in_flight("超时菜甲")
+    assert not cook._generation_flight.in_flight("超时菜乙")
+
+
+def test_overlapping_batches_with_sync_callers(app, fake_qwen):
+    stats = fake_qwen(latency=0.5)
+    first = [f"重叠批量菜{i}" for i in range(4)]
+    second = [f"重叠批量菜{i}" for i in range(2, 6)]
+
+    results = _run_concurrently(
+        [lambda: cook.generate_many(first), lambda: cook.generate_many(second)]
+        + [lambda n=n: _once_in_flight(n, cook.generate_and_save) for n in ("重叠批量菜2", "重叠批量菜3")] * 3
+    )
+
+    # 两个批量各占走一部分菜名（互不重叠），各一次请求；单独生成的都等批量那一份
+    assert stats["requests"] == 2
+    assert [r["name"] for r in results[0]] == first
+    assert [r["name"] for r in results[1]] == second
+    assert [r["name"] for r in results[2:]] == ["重叠批量菜2", "重叠批量菜3"] * 3
@@ -0,0 +1,108 @@
+# /api/cook/search?async=1：立即返回 job_id，/api/cook/job 轮询；同一道菜同时只生成一次
+
+import threading
+import time
+
+import pytest
+
+from apps import cook
+from core.jobs import JobRegistry
+
+
+@pytest.fixture
+def slow_generate(monkeypatch):
+    """替换掉真正调 AI 的那一步：等 release 被 set 才返回，记录每次调用的菜名。"""
+    calls = []
+    release = threading.Event()
+
+    def fake(name):
+        calls.append(name)
+        assert release.wait(10)
+        if name.startswith("失败"):
+            raise RuntimeError("AI 挂了")
+        return {"name": name, "category": "AI生成"}
+
+    monkeypatch.setattr(cook, "_generate_and_save", fake)
+    yield calls, release
+    release.set()
+
+
+def _poll(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        body = client.get(f"/api/cook/job/{job_id}").get_json()
+        if body["status"] != "pending" or time.monotonic() > deadline:
+            return body
+        time.sleep(0.01)
+
+
+def _search_async(client, q):
+    return client.get("/api/cook/search", query_string={"q": q, "async": "1"}).get_json()
+
+
+def test_async_search_returns_job_and_polls_to_done(client, slow_generate):
+    calls, release = slow_generate
+    first = _search_async(client, "异步测试菜甲")
+    assert first["status"] == "generating" and first["results"] == []
+
+    # 还在生成：同一道菜再搜拿到同一个 job，不会再生成一次
+    assert client.get(f"/api/cook/job/{first['job_id']}").get_json()["status"] == "pending"
+    assert _search_async(client, "异步测试菜甲")["job_id"] == first["job_id"]
+
+    release.set()
+    done = _poll(client, first["job_id"])
+    assert done["status"] == "done"
+    assert done["results"] == [{"name": "异步测试菜甲", "category": "AI生成"}]
+    assert done["error"] is None
+    assert calls == ["异步测试菜甲"]
+
+
+def test_sync_search_joins_running_job(client, slow_generate):
+    calls, release = slow_generate
+    job_id = _search_async(client, "异步测试菜乙")["job_id"]
+    deadline = time.monotonic() + 5
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # 同步搜索碰上后台任务正在生成同一道菜：等那一份，不另外调 AI
+    box = {}
+    t = threading.Thread(target=lambda: box.setdefault(
+        "resp", client.get("/api/cook/search", query_string={"q": "异步测试菜乙"}).get_json()))
+    t.start()
+    time.sleep(0.05)
+    release.set()
+    t.join(10)
+    assert box["resp"] == [{"name": "异步测试菜乙", "category": "AI生成"}]
+    assert _poll(client, job_id)["status"] == "done"
+    assert calls == ["异步测试菜乙"]
+
+
+def test_failed_job_reports_error(client, slow_generate):
+    calls, release = slow_generate
+    release.set()
+    job = _poll(client, _search_async(client, "失败测试菜")["job_id"])
+    assert job["status"] == "failed"
+    assert "AI 挂了" in job["error"]
+    assert job["results"] == []
+
+    # 失败的不占着 key：再搜一次是新任务
+    job2 = _search_async(client, "失败测试菜")["job_id"]
+    assert job2 != job["job_id"]
+    assert _poll(client, job2)["status"] == "failed"
+    assert calls == ["失败测试菜", "失败测试菜"]
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/api/cook/job/nope").status_code == 404
+
+
+def test_finished_jobs_are_pruned():
+    jobs = JobRegistry(max_workers=1, keep_seconds=0)
+    job_id = jobs.submit("k", lambda: 1)
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id)["status"] == "pending" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert jobs.get(job_id)["result"] == 1
+    time.sleep(0.01)
+    jobs.submit("other", lambda: 2)
+    assert jobs.get(job_id) is None
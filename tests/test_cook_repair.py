@@ -0,0 +1,134 @@
+# 原菜谱文件丢了：AI 补写的正文落盘 + 改 recipes.path + 进全文索引，之后不再调 AI；批量修复走后台任务
+
+import os
+import threading
+import time
+
+import pytest
+
+import config
+from apps import cook
+from core import ai, db, search
+from core.catalog import catalog
+
+
+def _add_missing(name):
+    with db.get_cook_conn() as conn:
+        conn.execute(
+            "INSERT INTO recipes (name, category, path, structured_ingredients, tags, calories_est) "
+            "VALUES (?, '荤菜', ?, '[\"鸡蛋\"]', '[]', 200)",
+            (name, f"meat_dish\\{name}.md"),
+        )
+        rid = conn.execute("SELECT id FROM recipes WHERE name=?", (name,)).fetchone()[0]
+        conn.commit()
+    return rid
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    """替换 ai.chat_with_text：返回 reply(name)，记录被要求补写的菜名。"""
+    calls = []
+
+    def install(reply=lambda name: f"# {name}\n\n- 补写的步骤：先焯水再慢炖"):
+        def fake(prompt):
+            name = prompt.split("《")[1].split("》")[0]
+            calls.append(name)
+            return reply(name)
+
+        monkeypatch.setattr(ai, "chat_with_text", fake)
+        return calls
+
+    return install
+
+
+def _detail(client, name):
+    return client.get("/api/cook/detail", query_string={"name": name}).get_json()
+
+
+def test_repaired_body_is_persisted(client, writer):
+    calls = writer()
+    rid = _add_missing("补写测试菜")
+
+    html = _detail(client, "补写测试菜")["html"]
+    assert "先焯水再慢炖" in html
+    assert calls == ["补写测试菜"]
+
+    recipe = catalog.get("补写测试菜")
+    assert recipe.path == os.path.join("AI_Generated", "补写测试菜.md")
+    assert recipe.source == "ai_repair"
+    with open(os.path.join(config.COOK_ROOT, recipe.path), encoding="utf-8") as f:
+        assert "先焯水再慢炖" in f.read()
+    # 正文进了全文索引
+    with db.get_cook_conn() as conn:
+        assert rid in search.search_ids(conn, "先焯水再慢炖")
+
+    # 之后直接读本地文件
+    assert "先焯水再慢炖" in _detail(client, "补写测试菜")["html"]
+    assert calls == ["补写测试菜"]
+
+
+def test_ai_unavailable_writes_nothing(client, writer):
+    calls = writer(lambda name: ai.CHAT_FALLBACK)
+    _add_missing("补写失败菜")
+
+    assert "暂时找不到原始菜谱" in _detail(client, "补写失败菜")["html"]
+    recipe = catalog.get("补写失败菜")
+    assert recipe.path == "meat_dish\\补写失败菜.md"
+    assert not os.path.exists(os.path.join(config.COOK_ROOT, "AI_Generated", "补写失败菜.md"))
+    # 下次还会再试
+    _detail(client, "补写失败菜")
+    assert calls == ["补写失败菜", "补写失败菜"]
+
+
+def test_concurrent_repairs_call_ai_once(app, writer, monkeypatch):
+    release = threading.Event()
+    calls = writer(lambda name: release.wait(10) and f"# {name}\n\n- 一起等")
+    _add_missing("并发补写菜")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cook.repair_recipe("并发补写菜"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join(10)
+    assert results == [os.path.join("AI_Generated", "并发补写菜.md")] * 4
+    assert calls == ["并发补写菜"]
+
+
+def _poll(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        body = client.get(f"/api/cook/repair/{job_id}").get_json()
+        if body["status"] != "pending" or time.monotonic() > deadline:
+            return body
+        time.sleep(0.01)
+
+
+def test_bulk_repair_job(client, writer):
+    calls = writer(lambda name: None if name == "批量补写菜丙" else f"# {name}\n\n- 批量")
+    for name in ("批量补写菜甲", "批量补写菜乙", "批量补写菜丙"):
+        _add_missing(name)
+
+    resp = client.post("/api/cook/repair", json={})
+    assert resp.status_code == 202
+    job = _poll(client, resp.get_json()["job_id"])
+    assert job["status"] == "done"
+    stats = job["stats"]
+    assert stats["missing"] >= 3
+    assert stats["repaired"] + stats["failed"] == stats["missing"]
+    assert {"批量补写菜甲", "批量补写菜乙", "批量补写菜丙"} <= set(calls)
+    assert catalog.get("批量补写菜甲").source == "ai_repair"
+    assert catalog.get("批量补写菜丙").source != "ai_repair"
+
+    # 补好的不会再出现在下一轮里
+    calls.clear()
+    job = _poll(client, client.post("/api/cook/repair", json={"limit": 1}).get_json()["job_id"])
+    assert job["stats"]["missing"] == 1
+    assert "批量补写菜甲" not in calls
+
+
+def test_repair_request_errors(client):
+    assert client.post("/api/cook/repair", json={"limit": "x"}).status_code == 400
+    assert client.get("/api/cook/repair/nope").status_code == 404
@@ -0,0 +1,107 @@
+# 连接复用：每个线程每个库一条连接，with 只管提交 / 回滚；fork 出来的子进程重新连
+
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import config
+from core import db
+
+
+def test_same_thread_reuses_connection(app):
+    with db.get_diet_conn() as a:
+        pass
+    with db.get_diet_conn() as b:
+        # with 结束不关连接
+        b.execute("SELECT 1")
+    assert a is b
+    assert db.get_cook_conn() is not a
+
+
+def test_pragmas_set_once_per_connection(app):
+    conn = db.get_diet_conn()
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == config.SQLITE_BUSY_TIMEOUT_MS
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.row_factory is sqlite3.Row
+
+
+def test_each_thread_gets_its_own_connection(app):
+    mine = db.get_diet_conn()
+    seen = []
+
+    def worker():
+        seen.append((db.get_diet_conn(), db.get_diet_conn()))
+        db.close_connections()
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(a is b for a, b in seen)
+    conns = [a for a, _ in seen] + [mine]
+    assert len({id(c) for c in conns}) == 4
+
+
+def test_with_block_rolls_back_on_error(app):
+    with pytest.raises(RuntimeError):
+        with db.get_diet_conn() as conn:
+            conn.execute("INSERT INTO users (name) VALUES ('回滚测试')")
+            raise RuntimeError
+    with db.get_diet_conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE name='回滚测试'").fetchone()[0] == 0
+
+
+def test_closed_connection_is_replaced(app):
+    conn = db.get_diet_conn()
+    conn.close()
+    fresh = db.get_diet_conn()
+    assert fresh is not conn
+    fresh.execute("SELECT 1")
+
+
+def test_close_connections(app):
+    conn = db.get_cook_conn()
+    db.close_connections()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    assert db.get_cook_conn() is not conn
+
+
+def test_pid_change_opens_new_connection_without_closing_parent(app, monkeypatch):
+    parent = db.get_diet_conn()
+    monkeypatch.setattr(db.os, "getpid", lambda: -1)
+    child = db.get_diet_conn()
+    assert child is not parent
+    # 父进程那条不能在子进程里关（会动到父进程的锁 / WAL 状态），留着不管
+    parent.execute("SELECT 1")
+    monkeypatch.undo()
+    db.close_connections()
+    parent.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 fork")
+def test_forked_child_does_not_reuse_parent_connection(app):
+    parent = db.get_diet_conn()
+    parent_id = id(parent)
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - 子进程
+        ok = False
+        try:
+            conn = db.get_diet_conn()
+            ok = id(conn) != parent_id and conn.execute("SELECT COUNT(*) FROM users").fetchone() is not None
+        finally:
+            os.write(w, b"1" if ok else b"0")
+            os._exit(0)
+    os.close(w)
+    try:
+        assert os.read(r, 1) == b"1"
+    finally:
+        os.close(r)
+        os.waitpid(pid, 0)
+    assert db.get_diet_conn() is parent
@@ -0,0 +1,48 @@
+# 版本化迁移：多个进程同时迁移同一个新库，每条迁移只执行一次、谁都不报错
+
+import multiprocessing
+import sqlite3
+
+from core import db
+
+
+def _migrate_worker(path, start, results):
+    conn = sqlite3.connect(path, timeout=30)
+    start.wait()
+    try:
+        results.put(("ok", db.migrate(conn, db.COOK_MIGRATIONS)))
+    except Exception as e:
+        results.put(("error", repr(e)))
+    finally:
+        conn.close()
+
+
+def test_concurrent_migrations_apply_each_version_once(tmp_path):
+    path = str(tmp_path / "cook.db")
+    ctx = multiprocessing.get_context("spawn")
+    start, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=_migrate_worker, args=(path, start, results)) for _ in range(6)]
+    for p in procs:
+        p.start()
+    start.set()
+    outcomes = [results.get(timeout=60) for _ in procs]
+    for p in procs:
+        p.join(timeout=60)
+
+    assert [kind for kind, _ in outcomes] == ["ok"] * 6, outcomes
+    applied = sorted(v for _, versions in outcomes for v in versions)
+    latest = max(m[0] for m in db.COOK_MIGRATIONS)
+    assert applied == list(range(1, latest + 1))
+
+    conn = sqlite3.connect(path)
+    assert [r[0] for r in db.applied_migrations(conn)] == list(range(1, latest + 1))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == latest
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_migrate_is_noop_when_current(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "diet.db"))
+    assert db.migrate(conn, db.DIET_MIGRATIONS) == [m[0] for m in db.DIET_MIGRATIONS]
+    assert db.migrate(conn, db.DIET_MIGRATIONS) == []
+    conn.close()
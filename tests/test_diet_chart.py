@@ -0,0 +1,34 @@
+# 热量图表：区间按粒度限长，超了 400，不会一次拼出几十万个桶
+
+import pytest
+
+
+@pytest.mark.parametrize("granularity", ["day", "week", "month"])
+def test_chart_rejects_huge_range(client, granularity):
+    resp = client.get(
+        "/api/get_chart_data",
+        query_string={"user_id": 1, "start": "0001-01-01", "end": "2024-12-31", "granularity": granularity},
+    )
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize("granularity, start, buckets", [
+    ("day", "2024-01-01", 366),
+    ("week", "2020-01-06", 261),
+    ("month", "2020-01-01", 60),
+])
+def test_chart_allows_max_range(client, granularity, start, buckets):
+    resp = client.get(
+        "/api/get_chart_data",
+        query_string={"user_id": 1, "start": start, "end": "2024-12-31", "granularity": granularity},
+    )
+    assert resp.status_code == 200
+    assert len(resp.get_json()["dates"]) == buckets
+
+
+def test_chart_rejects_day_range_over_a_year(client):
+    resp = client.get(
+        "/api/get_chart_data",
+        query_string={"user_id": 1, "start": "2023-12-31", "end": "2024-12-31", "granularity": "day"},
+    )
+    assert resp.status_code == 400
@@ -0,0 +1,104 @@
+# 仪表盘：资料 + 当天总热量 + 一页记录一条语句查完；按记录 id 翻页；rev 没变就 304
+
+import pytest
+
+from core import db
+
+DAY = "2024-04-01"
+
+
+@pytest.fixture
+def statements():
+    """记录这个线程的饮食库连接上执行过的语句（测试客户端在同一个线程里处理请求）。"""
+    conn = db.get_diet_conn()
+    seen = []
+    conn.set_trace_callback(seen.append)
+    yield seen
+    conn.set_trace_callback(None)
+
+
+def _add(client, uid, value, tp="food", date=DAY):
+    client.post("/api/add", json={"user_id": uid, "date": date, "type": tp, "value": value, "note": f"n{value}"})
+
+
+def _dashboard(client, uid, etag=None, **params):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/api/get_dashboard", query_string={"user_id": uid, "date": DAY, **params}, headers=headers)
+
+
+def test_single_query(client, user_id, statements):
+    _add(client, user_id, 300)
+    _add(client, user_id, 61.5, "weight")
+    client.post("/api/save_profile", json={"user_id": user_id, "height": 165, "gender": "female", "age": 30,
+                                           "target_weight": 55, "current_weight_input": 61.5})
+    statements.clear()
+
+    body = _dashboard(client, user_id).get_json()
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 1
+    assert body["profile"]["height"] == 165
+    assert body["data"]["food_today"] == 300
+    assert body["data"]["current_weight"] == 61.5
+    assert body["data"]["bmr"] == int(10 * 61.5 + 6.25 * 165 - 5 * 30 - 161)
+    assert [(r["type"], r["value"]) for r in body["data"]["history"]] == [("weight", 61.5), ("food", 300)]
+
+
+def test_cursor_paging(client, user_id):
+    for v in range(1, 8):
+        _add(client, user_id, v * 100)
+    _add(client, user_id, 999, date="2024-04-02")  # 别的日子不出现
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"before": cursor} if cursor else {})}
+        data = _dashboard(client, user_id, **params).get_json()["data"]
+        pages.append([r["value"] for r in data["history"]])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [[700, 600, 500], [400, 300, 200], [100]]
+    assert data["food_today"] == 2800
+
+
+def test_paging_limits_and_bad_params(client, user_id):
+    for v in range(3):
+        _add(client, user_id, v + 1)
+    data = _dashboard(client, user_id, limit=0).get_json()["data"]
+    assert len(data["history"]) == 1  # 至少一条
+    assert _dashboard(client, user_id, limit="x").status_code == 400
+    assert _dashboard(client, user_id, before="x").status_code == 400
+
+
+def test_etag_304_until_user_writes(client, user_id, statements):
+    _add(client, user_id, 300)
+    first = _dashboard(client, user_id)
+    etag = first.headers["ETag"]
+    assert etag.startswith("W/")
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    statements.clear()
+    again = _dashboard(client, user_id, etag)
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    # 304 只查了 rev
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+    # 另一页的 ETag 不一样
+    assert _dashboard(client, user_id, etag, limit=5).status_code == 200
+
+    for write in (
+        lambda: _add(client, user_id, 200),
+        lambda: client.post("/api/delete_log", json={"id": _dashboard(client, user_id).get_json()["data"]["history"][0]["id"]}),
+        lambda: client.post("/api/save_profile", json={"user_id": user_id, "height": 170}),
+    ):
+        etag = _dashboard(client, user_id).headers["ETag"]
+        write()
+        resp = _dashboard(client, user_id, etag)
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
+
+def test_unknown_user(client):
+    body = _dashboard(client, 10**9).get_json()
+    assert body["profile"] is None
+    assert body["data"]["history"] == [] and body["data"]["food_today"] == 0
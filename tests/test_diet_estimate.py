@@ -0,0 +1,48 @@
+# /api/ai_estimate_food：模型回复按 FoodEstimate 校验；估不出来时保持原接口，200 + 500 kcal 兜底
+
+import pytest
+
+from core import ai
+
+
+@pytest.fixture
+def reply(monkeypatch):
+    """reply(text) 让所有上游请求都回 text，返回请求次数的列表。"""
+    calls = []
+
+    def install(text):
+        def fake_request(messages, temperature, max_tokens):
+            calls.append(messages)
+            return text
+
+        monkeypatch.setattr(ai, "_request_qwen", fake_request)
+        return calls
+
+    return install
+
+
+def test_estimate_uses_validated_reply(client, reply):
+    reply('{"name": "番茄炒蛋盖饭", "est_cal": "650 kcal"}')
+    resp = client.post("/api/ai_estimate_food", json={"text": "一份番茄炒蛋盖饭"})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"name": "番茄炒蛋盖饭", "est_cal": 650}
+
+
+def test_estimate_falls_back_when_reply_is_unusable(client, reply):
+    calls = reply('{"name": "不知道"}')
+    resp = client.post("/api/ai_estimate_food", json={"text": "一碗看不出是什么的东西"})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"name": "一碗看不出是什么的东西", "est_cal": 500}
+    # 缺 est_cal：带着错误让模型重写了一次，还是不行才兜底
+    assert len(calls) == 2
+
+
+def test_estimate_falls_back_when_upstream_fails(client, reply):
+    reply(None)
+    resp = client.post("/api/ai_estimate_food", json={"text": "午饭"})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"name": "午饭", "est_cal": 500}
+
+
+def test_estimate_requires_text(client):
+    assert client.post("/api/ai_estimate_food", json={"text": " "}).status_code == 400
@@ -0,0 +1,104 @@
+# ai_clean_db 的并发清洗：多个 worker 共用一个自适应令牌桶，429 时全体降速，只有主线程写库
+
+import sqlite3
+import time
+
+import pytest
+
+import ai_clean_db
+from core import ai
+from core.http import TokenBucket
+from tools.bench_enrich import make_corpus
+
+
+def test_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+    t0 = time.monotonic()
+    for _ in range(2):
+        bucket.acquire()
+    assert time.monotonic() - t0 < 0.02
+    for _ in range(5):
+        bucket.acquire()
+    # 桶空了以后每 1/50 秒一个
+    assert time.monotonic() - t0 >= 0.09
+
+
+def test_bucket_throttle_halves_rate_and_pauses():
+    bucket = TokenBucket(rate=100, burst=1, min_rate=30)
+    bucket.throttled(retry_after=0.1)
+    assert bucket.rate == 50
+    assert bucket.throttle_count == 1
+    t0 = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - t0 >= 0.1
+
+    bucket.throttled()
+    assert bucket.rate == 30  # 不低于 min_rate
+    for _ in range(100):
+        bucket.succeeded()
+    assert bucket.rate == 100  # 成功多了慢慢回到目标速率，但不超过
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch, fake_qwen):
+    """临时菜谱目录 + 空库 + 假 Gemini；返回 (run(*argv) -> stats, 假服务统计)。"""
+    def start(n, **options):
+        server_stats = fake_qwen(**options)
+        monkeypatch.setattr(ai_clean_db, "GEMINI_URL", ai.QWEN_API_URL)
+        monkeypatch.setattr(ai_clean_db, "PROXIES", None)
+        monkeypatch.setattr(ai_clean_db, "API_KEY", "fake")
+        monkeypatch.setattr(ai_clean_db, "COOK_ROOT", str(tmp_path / "dishes"))
+        monkeypatch.setattr(ai_clean_db, "DB_PATH", str(tmp_path / "cook.db"))
+        make_corpus(ai_clean_db.COOK_ROOT, n)
+        return server_stats
+
+    return start
+
+
+def _rows():
+    conn = sqlite3.connect(ai_clean_db.DB_PATH)
+    try:
+        return conn.execute(
+            "SELECT name, structured_ingredients, content_hash FROM recipes ORDER BY name"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_workers_run_requests_concurrently(corpus):
+    server = corpus(8, latency=0.2)
+    stats = ai_clean_db.main(["--workers", "4", "--rate", "100", "--burst", "4"])
+    assert stats["done"] == stats["ai_ok"] == 8
+    assert server["requests"] == 8
+    # 串行要 8 × 0.2s
+    assert stats["seconds"] < 1.0
+    rows = _rows()
+    assert len(rows) == 8
+    assert all(r[1] == '["鸡蛋", "番茄"]' and r[2] for r in rows)
+
+
+def test_429_slows_everyone_down_and_retries(corpus):
+    server = corpus(6, fail_first=2, retry_after=0.05)
+    stats = ai_clean_db.main(["--workers", "3", "--rate", "100", "--burst", "3", "--commit-every", "2"])
+    assert server["429"] == 2
+    assert stats["throttled"] == 2
+    # 被限流的请求重试成功，不用正则兜底
+    assert stats["done"] == stats["ai_ok"] == 6
+    assert len(_rows()) == 6
+
+
+def test_packed_requests(corpus):
+    server = corpus(7)
+    stats = ai_clean_db.main(["--workers", "2", "--rate", "100", "--pack", "3"])
+    assert stats["done"] == stats["ai_ok"] == 7
+    assert server["requests"] == 3
+    assert len(_rows()) == 7
+
+
+def test_failed_ai_falls_back_to_regex(corpus, monkeypatch):
+    corpus(3)
+    monkeypatch.setattr(ai_clean_db, "call_gemini", lambda prompt, limiter: None)
+    stats = ai_clean_db.main(["--workers", "3", "--rate", "100"])
+    assert stats["done"] == 3 and stats["ai_ok"] == 0
+    # 正则从 “必备原料和工具” 里抠出了食材
+    assert all("鸡蛋" in r[1] for r in _rows())
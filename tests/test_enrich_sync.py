@@ -0,0 +1,207 @@
+# ai_clean_db 的增量同步：内容没变不重新调 AI，改了的重新清洗，删掉的文件从库里清理
+
+import os
+import sqlite3
+
+import pytest
+
+import ai_clean_db
+from core import ai
+from tools.bench_enrich import SAMPLE_MD, make_corpus
+
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch, fake_qwen):
+    """临时菜谱目录（5 道菜）+ 空库 + 假 Gemini；返回 run() -> (main 的统计, 这次的 AI 请求数)。"""
+    server = fake_qwen()
+    monkeypatch.setattr(ai_clean_db, "GEMINI_URL", ai.QWEN_API_URL)
+    monkeypatch.setattr(ai_clean_db, "PROXIES", None)
+    monkeypatch.setattr(ai_clean_db, "API_KEY", "fake")
+    monkeypatch.setattr(ai_clean_db, "COOK_ROOT", str(tmp_path / "dishes"))
+    monkeypatch.setattr(ai_clean_db, "DB_PATH", str(tmp_path / "cook.db"))
+    make_corpus(ai_clean_db.COOK_ROOT, 5)
+
+    def run(*argv):
+        before = server["requests"]
+        stats = ai_clean_db.main(["--workers", "2", "--rate", "100", *argv])
+        return stats, server["requests"] - before
+
+    return run
+
+
+def _path(name):
+    i = int(name[-4:])
+    return os.path.join(ai_clean_db.COOK_ROOT, f"cat{i % 5}", f"{name}.md")
+
+
+def _rows():
+    conn = sqlite3.connect(ai_clean_db.DB_PATH)
+    try:
+        return {r[0]: r[1:] for r in conn.execute("SELECT name, id, content_hash, mtime, path FROM recipes")}
+    finally:
+        conn.close()
+
+
+def _write(rel, text):
+    full = os.path.join(ai_clean_db.COOK_ROOT, rel)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _category(name):
+    conn = sqlite3.connect(ai_clean_db.DB_PATH)
+    try:
+        return conn.execute("SELECT category FROM recipes WHERE name=?", (name,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_second_run_skips_everything(sync):
+    stats, calls = sync()
+    assert (stats["done"], calls) == (5, 5)
+    first = _rows()
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+    assert _rows() == first
+
+
+def test_touched_file_only_updates_mtime(sync):
+    sync()
+    before = _rows()["测试菜0001"]
+    st = os.stat(_path("测试菜0001"))
+    os.utime(_path("测试菜0001"), (st.st_atime, st.st_mtime + 100))
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+    after = _rows()["测试菜0001"]
+    assert after[:2] == before[:2]          # 同一条记录、同一个 hash
+    assert after[2] == before[2] + 100      # 只补记了 mtime
+
+
+def test_changed_file_is_reenriched(sync):
+    sync()
+    before = _rows()["测试菜0002"]
+    with open(_path("测试菜0002"), "a", encoding="utf-8") as f:
+        f.write("\n- 出锅前撒葱花\n")
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (1, 1)
+    after = _rows()["测试菜0002"]
+    assert after[0] == before[0]            # 原地更新，id 不变
+    assert after[1] != before[1]
+
+
+def test_new_and_deleted_files(sync):
+    sync()
+    os.remove(_path("测试菜0003"))
+    with open(os.path.join(ai_clean_db.COOK_ROOT, "cat0", "新菜.md"), "w", encoding="utf-8") as f:
+        f.write(SAMPLE_MD.format(name="新菜"))
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (1, 1)
+    rows = _rows()
+    assert "测试菜0003" not in rows
+    assert "新菜" in rows
+
+
+def test_ai_generated_and_legacy_rows_are_left_alone(sync):
+    sync()
+    conn = sqlite3.connect(ai_clean_db.DB_PATH)
+    # AI 现编的菜（没有 content_hash）不归同步管
+    conn.execute("INSERT INTO recipes (name, path, structured_ingredients, source) "
+                 "VALUES ('AI菜', 'AI_Generated/AI菜.md', '[]', 'ai')")
+    # 老数据还没有 hash：第一次只补记 hash，不重新调 AI
+    conn.execute("UPDATE recipes SET content_hash=NULL, mtime=NULL WHERE name='测试菜0004'")
+    conn.commit()
+    conn.close()
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+    rows = _rows()
+    assert "AI菜" in rows
+    assert rows["测试菜0004"][1]
+
+
+def test_dry_run_and_empty_root(sync, monkeypatch, tmp_path):
+    stats, calls = sync("--dry-run")
+    assert (stats["done"], calls) == (0, 0)
+    assert _rows() == {}
+
+    sync()
+    # 目录没挂上时什么都不删
+    monkeypatch.setattr(ai_clean_db, "COOK_ROOT", str(tmp_path / "missing"))
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+    assert len(_rows()) == 5
+
+
+def test_moved_to_another_category_is_not_reenriched(sync):
+    sync()
+    before = _rows()["测试菜0001"]
+    os.makedirs(os.path.join(ai_clean_db.COOK_ROOT, "cat3"), exist_ok=True)
+    os.replace(_path("测试菜0001"), os.path.join(ai_clean_db.COOK_ROOT, "cat3", "测试菜0001.md"))
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+    after = _rows()["测试菜0001"]
+    assert after[:2] == before[:2]          # 同一条记录、内容 hash 不变
+    assert after[3] == os.path.join("cat3", "测试菜0001.md")
+    assert _category("测试菜0001") == "cat3"
+    assert len(_rows()) == 5
+
+    # 再跑一次什么都不用做
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+
+
+def test_renamed_file_keeps_its_record(sync):
+    sync()
+    rid = _rows()["测试菜0002"][0]
+    os.replace(_path("测试菜0002"), os.path.join(os.path.dirname(_path("测试菜0002")), "改了名的菜.md"))
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+    rows = _rows()
+    assert "测试菜0002" not in rows
+    assert rows["改了名的菜"][0] == rid
+
+
+def test_moved_and_edited_file_updates_in_place(sync):
+    sync()
+    rid = _rows()["测试菜0003"][0]
+    os.remove(_path("测试菜0003"))
+    _write(os.path.join("cat4", "测试菜0003.md"), SAMPLE_MD.format(name="测试菜0003") + "\n- 换了个做法\n")
+
+    stats, calls = sync()
+    assert (stats["done"], calls) == (1, 1)
+    rows = _rows()
+    assert rows["测试菜0003"][0] == rid
+    assert rows["测试菜0003"][3] == os.path.join("cat4", "测试菜0003.md")
+    assert len(rows) == 5
+
+
+def test_same_name_in_two_categories_gets_distinct_stable_names(sync):
+    _write(os.path.join("荤菜", "重名菜.md"), "# 重名菜\n\n- 红烧")
+    _write(os.path.join("素菜", "重名菜.md"), "# 重名菜\n\n- 清炒")
+    stats, calls = sync()
+    assert (stats["done"], calls) == (7, 7)
+    rows = _rows()
+    # 都是新的：路径排第一的（“素” < “荤”）叫原名
+    assert rows["重名菜"][3] == os.path.join("素菜", "重名菜.md")
+    assert rows["重名菜（荤菜）"][3] == os.path.join("荤菜", "重名菜.md")
+
+    # 之前是每次同步都互相覆盖、各调一次 AI
+    stats, calls = sync()
+    assert (stats["done"], calls) == (0, 0)
+    assert _rows() == rows
+
+    # 新来一个路径排在前面的同名菜：已经入库的两份名字不变
+    _write(os.path.join("凉菜", "重名菜.md"), "# 重名菜\n\n- 凉拌")
+    stats, calls = sync()
+    assert (stats["done"], calls) == (1, 1)
+    after = _rows()
+    assert after["重名菜"] == rows["重名菜"]
+    assert after["重名菜（荤菜）"] == rows["重名菜（荤菜）"]
+    assert after["重名菜（凉菜）"][3] == os.path.join("凉菜", "重名菜.md")
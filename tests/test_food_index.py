@@ -0,0 +1,80 @@
+# 食物搜索排序：完全相同 > 前缀 > 包含 > 模糊；打错字（同音字、多一个 / 少一个字）也能搜到
+
+import pytest
+
+from core import food_index
+from core.food_index import FoodIndex
+from core.food_store import FoodStore
+
+NAMES = [
+    "炒鸡蛋", "鸡蛋", "鸡蛋面", "鸡蛋豆腐", "土鸡蛋", "鸡油", "鸡精", "烤鸡", "文旦",
+    "番茄", "番茄酱", "牛番茄", "番鸭", "加钙米",
+    "西红柿", "西红柿炒蛋", "红烧肉", "米饭", "糙米饭",
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return FoodIndex(FoodStore.from_items([{"name": n, "cal": 100, "emoji": "🍽"} for n in NAMES]))
+
+
+def _names(index, q, k=20):
+    return [r["name"] for r in index.search(q, k)]
+
+
+def test_exact_then_prefix_then_substring(index):
+    assert _names(index, "鸡蛋")[:5] == ["鸡蛋", "鸡蛋面", "鸡蛋豆腐", "炒鸡蛋", "土鸡蛋"]
+    assert _names(index, "米饭")[:2] == ["米饭", "糙米饭"]
+
+
+def test_single_char_query(index):
+    got = _names(index, "米", k=3)
+    # 单字走 unigram 倒排，前缀命中排在包含前面，同级里短的在前
+    assert got == ["米饭", "糙米饭", "加钙米"]
+
+
+def test_substring_hits_come_before_fuzzy(index):
+    got = _names(index, "番茄")
+    assert got[:3] == ["番茄", "番茄酱", "牛番茄"]
+    assert "番鸭" not in got[:3]
+
+
+def test_item_fields(index):
+    assert index.search("红烧肉") == [{"name": "红烧肉", "cal": 100, "emoji": "🍽"}]
+
+
+@pytest.mark.parametrize("q, want", [
+    ("西红事", "西红柿"),      # 三个字错一个
+    ("西红柿蛋", "西红柿炒蛋"),  # 少一个字
+    ("红烧肉肉", "红烧肉"),      # 多一个字
+])
+def test_typos_match_part_of_name(index, q, want):
+    assert want in _names(index, q, k=3)
+
+
+def test_empty_and_unmatched(index):
+    assert index.search("  ") == []
+    assert index.search("榴莲") == []
+
+
+def test_window_distance():
+    assert food_index._window_distance("鸡旦", "土鸡蛋面", 1) == 1
+    assert food_index._window_distance("鸡蛋", "土鸡蛋面", 1) == 0
+    # 超过 limit 提前返回 limit + 1
+    assert food_index._window_distance("西红柿", "红烧肉", 1) == 2
+
+
+pinyin = pytest.mark.skipif(food_index.lazy_pinyin is None, reason="pypinyin 没装")
+
+
+@pinyin
+@pytest.mark.parametrize("q, want", [("鸡旦", "鸡蛋"), ("番加", "番茄")])
+def test_homophone_typos_rank_first(index, q, want):
+    # 和 “鸡油”“文旦” 一样差一个字，但读音一样的排前面
+    assert _names(index, q, k=1) == [want]
+
+
+@pinyin
+def test_pinyin_initials(index):
+    assert _names(index, "xhs", k=3)[:1] == ["西红柿"]
+    assert "西红柿炒蛋" in _names(index, "xhs", k=3)
@@ -0,0 +1,92 @@
+# 调模型的 HTTP 层（core.http）：429 重试、Retry-After、熔断器，对着 tools.fake_qwen 假服务跑
+
+import time
+
+import pytest
+
+from core import ai
+from core.http import CircuitBreaker, make_session
+from tools.fake_qwen import FakeQwenHandler
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """session(max_retries) 换一个不退避的 Session，测试不用干等。"""
+    def install(max_retries):
+        monkeypatch.setattr(ai, "_session", make_session(pool_size=2, max_retries=max_retries, backoff_factor=0))
+    return install
+
+
+def test_sync_retries_429_then_succeeds(fake_qwen, session):
+    stats = fake_qwen(fail_first=2)
+    session(max_retries=3)
+
+    assert ai._call_qwen(MESSAGES, use_cache=False) == "小ka 收到啦，这是假服务器的回复～"
+    assert stats["requests"] == 3
+    assert stats["429"] == 2
+    assert ai._breaker.state == "closed"
+
+
+def test_sync_gives_up_after_max_retries(fake_qwen, session):
+    stats = fake_qwen(rate_429=1)
+    session(max_retries=2)
+
+    assert ai._call_qwen(MESSAGES, use_cache=False) is None
+    assert stats["requests"] == 3  # 1 次 + 2 次重试
+
+
+def test_sync_honours_retry_after(fake_qwen, session):
+    stats = fake_qwen(fail_first=1, retry_after=1)
+    session(max_retries=1)
+
+    t0 = time.monotonic()
+    assert ai._call_qwen(MESSAGES, use_cache=False)
+    assert stats["requests"] == 2
+    assert time.monotonic() - t0 >= 0.9
+
+
+def test_async_retries_429_then_succeeds(fake_qwen):
+    stats = fake_qwen(fail_first=2)
+
+    assert ai.run_async(ai._acall_qwen(MESSAGES, use_cache=False)) == "小ka 收到啦，这是假服务器的回复～"
+    assert stats["requests"] == 3
+    assert ai._breaker.state == "closed"
+
+
+def test_breaker_opens_fails_fast_and_recovers(fake_qwen, session, monkeypatch):
+    stats = fake_qwen(rate_429=1)
+    session(max_retries=0)
+    monkeypatch.setattr(ai, "_breaker", CircuitBreaker(failure_threshold=2, cooldown=0.3))
+
+    assert ai._call_qwen(MESSAGES, use_cache=False) is None
+    assert ai._breaker.state == "closed"
+    assert ai._call_qwen(MESSAGES, use_cache=False) is None
+    assert ai._breaker.state == "open"
+
+    # 打开期间直接失败，不再打到上游
+    assert ai._call_qwen(MESSAGES, use_cache=False) is None
+    assert ai.run_async(ai._acall_qwen(MESSAGES, use_cache=False)) is None
+    assert stats["requests"] == 2
+
+    # 冷却结束：放一个试探请求，上游好了就回到 closed
+    time.sleep(0.35)
+    assert ai._breaker.state == "half_open"
+    FakeQwenHandler.options["rate_429"] = 0.0
+    assert ai._call_qwen(MESSAGES, use_cache=False)
+    assert stats["requests"] == 3
+    assert ai._breaker.state == "closed"
+
+
+def test_breaker_reopens_when_probe_fails(fake_qwen, session, monkeypatch):
+    stats = fake_qwen(rate_429=1)
+    session(max_retries=0)
+    monkeypatch.setattr(ai, "_breaker", CircuitBreaker(failure_threshold=1, cooldown=0.2))
+
+    assert ai._call_qwen(MESSAGES, use_cache=False) is None
+    assert ai._breaker.state == "open"
+    time.sleep(0.25)
+    assert ai._call_qwen(MESSAGES, use_cache=False) is None  # 试探请求也失败
+    assert ai._breaker.state == "open"
+    assert stats["requests"] == 2
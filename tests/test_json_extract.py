@@ -0,0 +1,131 @@
+# core.json_extract：整份语料逐条比对，加上几类常见坏输出和 generate_json 的修复重试
+
+import pytest
+
+import config
+from core import ai, json_extract
+from tools.bench_json_extract import load_corpus
+
+CORPUS = load_corpus()
+DISH = {"name": "番茄炒蛋", "calories": 320}
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=[c["name"] for c in CORPUS])
+def test_corpus(case):
+    assert json_extract.extract_json(case["text"]) == case["expect"]
+
+
+def test_trailing_commas():
+    ex = json_extract.extract('{"name": "番茄炒蛋", "tags": ["家常", "快手",], "calories": 320,}')
+    assert ex.value == {"name": "番茄炒蛋", "tags": ["家常", "快手"], "calories": 320}
+    assert ex.repaired
+
+
+def test_single_quotes_keep_inner_quotes():
+    ex = json_extract.extract("{'name': '番茄炒蛋', 'tip': '别放\"太多\"糖', 'ok': True}")
+    assert ex.value == {"name": "番茄炒蛋", "tip": '别放"太多"糖', "ok": True}
+    assert ex.repaired
+
+
+def test_prose_around_json():
+    text = "好哒～格式是 {name, calories}，结果：\n" '{"name": "番茄炒蛋", "calories": 320}' "\n热量按 {一人份} 估算 [仅供参考]"
+    ex = json_extract.extract(text)
+    assert ex.value == DISH
+    assert not ex.repaired
+
+
+def test_braces_inside_strings():
+    text = '前面 {"name": "皮蛋{豆腐", "tip": "]先放}葱["} 后面'
+    assert json_extract.extract_json(text) == {"name": "皮蛋{豆腐", "tip": "]先放}葱["}
+
+
+def test_fence_wins_over_longer_prose_json():
+    text = '示例：{"name": "示例", "calories": 0, "note": "长一点的示例"}\n```json\n{"name": "番茄炒蛋", "calories": 320}\n```'
+    assert json_extract.extract_json(text) == DISH
+
+
+def test_truncated_reply_hands_fragment_to_repair():
+    ex = json_extract.extract('好的：{"name": "红烧肉", "steps": ["焯水", "炒糖')
+    assert ex.value is None
+    assert ex.fragment == '{"name": "红烧肉", "steps": ["焯水", "炒糖'
+    assert ex.error
+
+
+def test_no_json_has_no_fragment():
+    ex = json_extract.extract(ai.CHAT_FALLBACK)
+    assert ex.value is None and ex.fragment is None
+
+
+def test_scanner_across_chunks():
+    text = '流式 {"name": "皮蛋\\"豆腐}", "calories": 150} 中间 [1, {"a": "]"}] 结尾'
+    for size in (1, 2, 3, 7):
+        scanner = json_extract.JsonScanner()
+        found = []
+        for i in range(0, len(text), size):
+            found += scanner.feed(text[i:i + size])
+        found += scanner.finish()
+        assert found == ['{"name": "皮蛋\\"豆腐}", "calories": 150}', '[1, {"a": "]"}]'], size
+
+
+# ---------- generate_json 的修复重试 ----------
+
+@pytest.fixture
+def replies(monkeypatch):
+    """replies(第一次回复, 修复回复) -> 每次上游请求的最后一条消息列表。"""
+    sent = []
+
+    def install(first, fixed=None):
+        def fake_request(messages, temperature, max_tokens):
+            sent.append(messages[-1]["content"])
+            return first if len(sent) == 1 else fixed
+
+        monkeypatch.setattr(ai, "_request_qwen", fake_request)
+        return sent
+
+    return install
+
+
+def _stats_delta(before):
+    after = ai.json_stats()
+    return {k: after[k] - before[k] for k in ("ok", "repaired", "retried", "failed")}
+
+
+def test_local_repair_needs_no_retry(replies):
+    sent = replies("{'name': '番茄炒蛋', 'calories': 320,}")
+    before = ai.json_stats()
+    assert ai.generate_json("番茄炒蛋") == DISH
+    assert len(sent) == 1
+    assert _stats_delta(before) == {"ok": 0, "repaired": 1, "retried": 0, "failed": 0}
+
+
+def test_broken_json_is_sent_back_for_repair(replies):
+    broken = '{"name": "番茄炒蛋" "calories": 320}'
+    sent = replies("结果如下：" + broken + "\n请享用", fixed='```json\n{"name": "番茄炒蛋", "calories": 320}\n```')
+    before = ai.json_stats()
+    assert ai.generate_json("番茄炒蛋") == DISH
+    # 只把坏掉的那段发回去，不带前后的闲聊
+    assert len(sent) == 2
+    assert sent[1].endswith("\n" + broken)
+    assert "请享用" not in sent[1]
+    assert _stats_delta(before) == {"ok": 0, "repaired": 0, "retried": 1, "failed": 0}
+
+
+def test_failed_repair_returns_none(replies):
+    sent = replies('{"name": "红烧肉", "steps": ["焯水', fixed="修不好")
+    before = ai.json_stats()
+    assert ai.generate_json("红烧肉") is None
+    assert len(sent) == 2
+    assert _stats_delta(before) == {"ok": 0, "repaired": 0, "retried": 0, "failed": 1}
+
+
+def test_no_repair_for_prose(replies):
+    sent = replies("抱歉，这个我算不出来")
+    assert ai.generate_json("??") is None
+    assert len(sent) == 1
+
+
+def test_no_repair_when_disabled(replies, monkeypatch):
+    monkeypatch.setattr(config, "LLM_JSON_REPAIR", False)
+    sent = replies('{"name": "番茄炒蛋" "calories": 320}', fixed='{"name": "番茄炒蛋", "calories": 320}')
+    assert ai.generate_json("番茄炒蛋") is None
+    assert len(sent) == 1
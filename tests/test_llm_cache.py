@@ -0,0 +1,56 @@
+# LLMCache 的 SQLite 连接：fork 出来的子进程（gunicorn preload）重新连，不沿用父进程那条
+
+import os
+
+import pytest
+
+from core import cache
+from core.cache import LLMCache
+
+
+@pytest.fixture
+def llm(tmp_path):
+    c = LLMCache(str(tmp_path / "llm_cache.db"), ttl=60)
+    yield c
+    c._conn.close()
+
+
+def test_pid_change_reopens_disk_connection(llm, monkeypatch):
+    llm.put("k", "v")
+    parent = llm._disk()
+    assert llm._disk() is parent
+
+    monkeypatch.setattr(cache.os, "getpid", lambda: -1)
+    child = llm._disk()
+    assert child is not parent
+    # 新连接看得到父进程写进去的内容；父进程那条没被关
+    llm._mem.clear()
+    assert llm.get("k") == "v"
+    parent.execute("SELECT 1")
+    parent.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 fork")
+def test_forked_child_uses_its_own_connection(llm):
+    llm.put("k", "v")
+    parent_id = id(llm._disk())
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - 子进程
+        ok = False
+        try:
+            llm._mem.clear()
+            ok = llm.get("k") == "v" and id(llm._conn) != parent_id
+            llm.put("from-child", "1")
+        finally:
+            os.write(w, b"1" if ok else b"0")
+            os._exit(0)
+    os.close(w)
+    try:
+        assert os.read(r, 1) == b"1"
+    finally:
+        os.close(r)
+        os.waitpid(pid, 0)
+    # 父进程的连接照常能用，也看得到子进程写的
+    assert id(llm._disk()) == parent_id
+    assert llm.get("from-child") == "1"
@@ -0,0 +1,26 @@
+# 页面模板：读 SSE 的 streamPost 只在 static/js/sse.js 里有一份，两个页面都要在自己的脚本前引入
+
+import os
+
+import pytest
+
+STATIC_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "js")
+
+
+@pytest.mark.parametrize("page, script", [("/cook", "cook.js"), ("/diet", "diet.js")])
+def test_pages_load_shared_sse_helper_first(client, page, script):
+    html = client.get(page).get_data(as_text=True)
+    shared = html.index('<script src="/static/js/sse.js"></script>')
+    assert shared < html.index(f'<script src="/static/js/{script}"></script>')
+
+
+def test_stream_post_defined_once(client):
+    owners = []
+    for name in sorted(os.listdir(STATIC_JS)):
+        with open(os.path.join(STATIC_JS, name), encoding="utf-8") as f:
+            if "function streamPost(" in f.read():
+                owners.append(name)
+    assert owners == ["sse.js"]
+    resp = client.get("/static/js/sse.js")
+    assert resp.status_code == 200
+    resp.close()
@@ -0,0 +1,84 @@
+# 合成台倒排索引：结果必须和原来“全表 json.loads + 两两子串比较”一模一样
+
+import json
+import random
+
+import pytest
+
+from apps import cook
+from core import db
+from core.pantry_index import pantry_index
+
+VOCAB = [
+    "鸡蛋", "鸡", "蛋", "鸡蛋清", "番茄", "西红柿", "土豆", "土豆丝", "豆腐", "嫩豆腐",
+    "葱", "大葱", "小葱", "姜", "蒜", "牛肉", "肉", "猪肉末", "米饭", "青椒", "红椒", "椒",
+]
+
+
+def legacy_pantry(ings, limit=None):
+    """原来 /api/cook/pantry 的实现，原样搬过来作对照。"""
+    with db.get_cook_conn() as conn:
+        recipes = conn.execute("SELECT * FROM recipes").fetchall()
+
+    res = []
+    for r in recipes:
+        try:
+            needed = json.loads(r["structured_ingredients"] or "[]")
+        except Exception:
+            continue
+        if not needed:
+            continue
+
+        hits = sum(1 for n in needed if any(i in n or n in i for i in ings))
+        missing = [n for n in needed if not any(i in n or n in i for i in ings)]
+
+        if hits > 0 and len(missing) <= 3:
+            res.append(
+                {
+                    "name": r["name"],
+                    "category": r["category"],
+                    "score": int(hits / len(needed) * 100),
+                    "missing": missing,
+                    "tags": json.loads(r["tags"] or "[]"),
+                }
+            )
+
+    res.sort(key=lambda x: x["score"], reverse=True)
+    return res[:limit]
+
+
+@pytest.fixture(scope="module")
+def recipes(app):
+    rng = random.Random(1)
+    recs = [
+        {"name": f"合成台测试菜{i}", "markdown": "# 测试", "main_ings": rng.sample(VOCAB, rng.randint(1, 6)),
+         "tags": ["家常菜"], "difficulty": 2, "calories": 300}
+        for i in range(60)
+    ]
+    # 空食材的菜永远不出现
+    recs.append({"name": "合成台测试空菜", "markdown": "# 测试", "main_ings": [], "tags": [],
+                 "difficulty": 1, "calories": 0})
+    cook._store_generated(recs)
+
+
+def test_matches_legacy_scan(recipes):
+    rng = random.Random(2)
+    queries = [{"鸡蛋"}, {"蛋"}, {"鸡蛋清"}, {"椒", "肉"}, {"番茄炒鸡蛋"}, {"不存在的食材"}]
+    queries += [set(rng.sample(VOCAB, rng.randint(1, 5))) for _ in range(40)]
+    for ings in queries:
+        assert pantry_index.score(ings, limit=None) == legacy_pantry(ings), ings
+
+
+def test_route_matches_legacy_top20(client, recipes):
+    resp = client.get("/api/cook/pantry", query_string={"ingredients": "鸡蛋，番茄, 葱 ,"})
+    assert resp.get_json() == legacy_pantry({"鸡蛋", "番茄", "葱"}, limit=20)
+    assert client.get("/api/cook/pantry", query_string={"ingredients": " , "}).get_json() == []
+
+
+def test_index_follows_recipe_writes(recipes):
+    ings = {"合成台专用食材"}
+    assert pantry_index.score(ings) == []
+    cook._store_generated([{"name": "合成台测试新菜", "markdown": "# 测试", "main_ings": ["合成台专用食材", "盐"],
+                            "tags": [], "difficulty": 1, "calories": 100}])
+    assert [r["name"] for r in pantry_index.score(ings)] == ["合成台测试新菜"]
+    assert pantry_index.score(ings) == legacy_pantry(ings)
@@ -0,0 +1,123 @@
+# daily_totals 每次写入都要和 logs 现算的结果一致：新增、删除、改日期、导入、删用户
+
+import random
+
+import pytest
+
+from core import db, rollup
+
+
+def _totals(uid):
+    with db.get_diet_conn() as conn:
+        return {
+            r["date"]: (r["food_kcal"], r["entries"], r["last_weight"])
+            for r in conn.execute(
+                "SELECT date, food_kcal, entries, last_weight FROM daily_totals WHERE user_id=?", (uid,)
+            )
+        }
+
+
+def _from_logs(uid):
+    """直接从 logs 算出来的期望值（不用 rollup 里的 SQL）。"""
+    with db.get_diet_conn() as conn:
+        rows = conn.execute(
+            "SELECT date, type, value FROM logs WHERE user_id=? ORDER BY id", (uid,)
+        ).fetchall()
+    out = {}
+    for date, tp, value in rows:
+        kcal, n, weight = out.get(date, (0, 0, None))
+        if tp == "food":
+            kcal += value
+        else:
+            weight = value
+        out[date] = (kcal, n + 1, weight)
+    return out
+
+
+def _add(client, uid, date, tp, value):
+    assert client.post("/api/add", json={"user_id": uid, "date": date, "type": tp, "value": value}).status_code == 200
+
+
+def _log_ids(uid, date=None):
+    with db.get_diet_conn() as conn:
+        sql = "SELECT id FROM logs WHERE user_id=?" + (" AND date=?" if date else "") + " ORDER BY id"
+        return [r[0] for r in conn.execute(sql, (uid, date) if date else (uid,))]
+
+
+def test_add_and_delete(client, user_id):
+    _add(client, user_id, "2024-05-01", "food", 300)
+    _add(client, user_id, "2024-05-01", "food", 450.5)
+    _add(client, user_id, "2024-05-01", "weight", 61.2)
+    _add(client, user_id, "2024-05-01", "weight", 60.9)
+    _add(client, user_id, "2024-05-02", "weight", 60.5)
+    assert _totals(user_id) == {
+        "2024-05-01": (750.5, 4, 60.9),
+        "2024-05-02": (0, 1, 60.5),
+    }
+
+    # 删掉当天最后一条体重：last_weight 退回前一条
+    client.post("/api/delete_log", json={"id": _log_ids(user_id, "2024-05-01")[-1]})
+    assert _totals(user_id)["2024-05-01"] == (750.5, 3, 61.2)
+
+    # 一天的记录删光了，那一行也没了
+    client.post("/api/delete_log", json={"id": _log_ids(user_id, "2024-05-02")[0]})
+    assert "2024-05-02" not in _totals(user_id)
+    # 删不存在的 id 什么都不动
+    client.post("/api/delete_log", json={"id": 10**9})
+    assert _totals(user_id) == _from_logs(user_id)
+
+
+def test_random_writes_stay_consistent(client, user_id):
+    rng = random.Random(7)
+    dates = [f"2024-06-{d:02d}" for d in range(1, 6)]
+    for _ in range(80):
+        ids = _log_ids(user_id)
+        if ids and rng.random() < 0.3:
+            client.post("/api/delete_log", json={"id": rng.choice(ids)})
+        else:
+            tp = rng.choice(["food", "food", "weight"])
+            _add(client, user_id, rng.choice(dates), tp, rng.randint(40, 900) if tp == "food" else 60)
+        assert _totals(user_id) == _from_logs(user_id)
+
+
+def test_refresh_after_moving_a_log(client, user_id):
+    _add(client, user_id, "2024-07-01", "food", 200)
+    _add(client, user_id, "2024-07-01", "food", 300)
+    log_id = _log_ids(user_id)[0]
+    # 改日期：旧的一天和新的一天都要重算
+    with db.get_diet_conn() as conn:
+        conn.execute("UPDATE logs SET date='2024-07-03' WHERE id=?", (log_id,))
+        rollup.refresh(conn, [(user_id, "2024-07-01"), (user_id, "2024-07-03")])
+        conn.commit()
+    assert _totals(user_id) == {"2024-07-01": (300, 1, None), "2024-07-03": (200, 1, None)}
+
+
+def test_refresh_rolls_back_with_the_write(client, user_id):
+    _add(client, user_id, "2024-08-01", "food", 100)
+    before = _totals(user_id)
+    with pytest.raises(RuntimeError):
+        with db.get_diet_conn() as conn:
+            conn.execute(
+                "INSERT INTO logs (user_id,date,type,category,value,note) VALUES (?,?,?,?,?,?)",
+                (user_id, "2024-08-01", "food", "", 999, ""),
+            )
+            rollup.refresh(conn, [(user_id, "2024-08-01")])
+            raise RuntimeError
+    assert _totals(user_id) == before == _from_logs(user_id)
+
+
+def test_rebuild_matches_incremental(client, user_id):
+    for i in range(10):
+        _add(client, user_id, f"2024-09-{i % 4 + 1:02d}", "food" if i % 3 else "weight", 100 + i)
+    incremental = _totals(user_id)
+    with db.get_diet_conn() as conn:
+        conn.execute("UPDATE daily_totals SET food_kcal=-1 WHERE user_id=?", (user_id,))
+        assert rollup.rebuild(conn, user_id) == 4
+        conn.commit()
+    assert _totals(user_id) == incremental == _from_logs(user_id)
+
+
+def test_delete_user_clears_totals(client, user_id):
+    _add(client, user_id, "2024-10-01", "food", 100)
+    client.post("/api/delete_user", json={"id": user_id})
+    assert _totals(user_id) == {}
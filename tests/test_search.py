@@ -0,0 +1,69 @@
+# 菜谱全文检索的排序：≥3 字走 trigram + bm25（菜名 > 标签 > 食材 > 正文），1~2 字只在菜名 / 标签 / 食材里找
+
+import pytest
+
+from apps import cook
+from core import db, search
+from core.catalog import catalog
+
+
+def _add(name, ings=("土豆",), tags=("家常菜",), body=""):
+    rec = {"name": name, "markdown": f"# {name}\n\n{body}", "main_ings": list(ings), "tags": list(tags),
+           "difficulty": 2, "calories": 300}
+    return cook._store_generated([rec])[0]
+
+
+@pytest.fixture(scope="module")
+def recipes(app):
+    # 用生僻的 “鲟”“鳐” 字，不和别的测试里的菜混在一起
+    for rec in [
+        dict(name="清蒸鲟鱼块"),
+        dict(name="鲟鱼"),
+        dict(name="红烧鲟鱼头"),
+        dict(name="凉拌鳐丝", tags=["鲟鱼宴"]),
+        dict(name="杂鱼锅", ings=["鲟鱼", "豆腐"]),
+        dict(name="白灼菜心", body="也可以配一点鲟鱼子酱"),
+        dict(name="鳐鱼汤", ings=["鳐鱼"]),
+        dict(name="香煎鳐鱼", ings=["鳐鱼"], body="鳐鱼鳐鱼鳐鱼鳐鱼，正文里提得再多也排在菜名后面"),
+        dict(name="葱爆鳐片", ings=["鳐鱼"], tags=["鳐鱼鳐鱼"]),
+    ]:
+        _add(**rec)
+
+
+def _search(q, limit=20):
+    with db.get_cook_conn() as conn:
+        ids = search.search_ids(conn, q, limit)
+    return [r.name for r in catalog.by_ids(ids)]
+
+
+def test_short_query_ranks_name_then_tags_then_ingredients(recipes):
+    # 菜名完全相同 > 菜名包含（短的在前）> 标签 > 食材
+    assert _search("鲟鱼") == ["鲟鱼", "清蒸鲟鱼块", "红烧鲟鱼头", "凉拌鳐丝", "杂鱼锅"]
+
+
+def test_short_query_ignores_body(recipes):
+    assert "白灼菜心" not in _search("鲟鱼")
+    assert _search("鲟") == ["鲟鱼", "清蒸鲟鱼块", "红烧鲟鱼头", "凉拌鳐丝", "杂鱼锅"]
+
+
+def test_trigram_query_weights_columns(recipes):
+    got = _search("鳐鱼汤")
+    assert got[0] == "鳐鱼汤"
+
+    got = _search("鲟鱼子酱")
+    # 长查询照样能搜到正文
+    assert got == ["白灼菜心"]
+
+
+def test_trigram_name_beats_body_mentions(recipes):
+    got = _search("鳐鱼鳐")
+    # 只有标签和正文里有 “鳐鱼鳐”，标签权重更高
+    assert got == ["葱爆鳐片", "香煎鳐鱼"]
+
+
+def test_limit_and_syntax_safe(recipes):
+    assert len(_search("鲟鱼", limit=2)) == 2
+    # 用户输入里的引号 / FTS 语法原样当文本
+    assert _search('鲟鱼" OR "') == []
+    assert _search("鲟 AND 鱼") == []
+    assert _search("   ") == []
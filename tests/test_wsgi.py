@@ -0,0 +1,22 @@
+# gunicorn preload：wsgi 导入完（也就是 fork 之前）master 手里不留 SQLite 连接
+
+import importlib
+import sys
+
+import config
+from core import db
+from core.catalog import catalog
+
+
+def test_wsgi_closes_connections_before_fork(monkeypatch):
+    monkeypatch.setattr(config, "COOK_HTML_WARM", True)
+    monkeypatch.delitem(sys.modules, "wsgi", raising=False)
+    importlib.import_module("wsgi")
+
+    assert getattr(db._local, "conns", {}) == {}
+    assert catalog._conn is None
+    # 关掉以后照常能用（worker 里第一次访问时重新连），快照不用重新加载
+    generation = catalog._snap.generation
+    catalog.all()
+    assert catalog._conn is not None
+    assert catalog.generation == generation
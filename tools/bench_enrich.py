@@ -0,0 +1,70 @@
+# 文件: tools/bench_enrich.py
+# 说明: ai_clean_db.py 并发清洗流水线的压测
+#   临时目录里造 N 个假菜谱 + 空库，起一个会随机 429 的假 Gemini 服务，
+#   分别用不同的 worker 数 / 打包数跑一遍，打印吞吐。
+#
+# 用法: python -m tools.bench_enrich --recipes 120 --latency 0.3 --rate-429 0.05
+
+import argparse
+import os
+import sqlite3
+import tempfile
+
+import ai_clean_db
+from tools.fake_qwen import FakeQwenHandler, serve_in_thread
+
+SAMPLE_MD = "# {name}\n\n## 必备原料和工具\n\n- 鸡蛋\n- 番茄：2个\n\n## 操作\n\n- 先炒蛋再炒番茄\n"
+
+
+def make_corpus(root, n):
+    for i in range(n):
+        cat_dir = os.path.join(root, f"cat{i % 5}")
+        os.makedirs(cat_dir, exist_ok=True)
+        with open(os.path.join(cat_dir, f"测试菜{i:04d}.md"), "w", encoding="utf-8") as f:
+            f.write(SAMPLE_MD.format(name=f"测试菜{i:04d}"))
+
+
+def run_once(n, workers, rate, pack):
+    tmp = tempfile.mkdtemp()
+    ai_clean_db.COOK_ROOT = os.path.join(tmp, "dishes")
+    ai_clean_db.DB_PATH = os.path.join(tmp, "cook.db")
+    make_corpus(ai_clean_db.COOK_ROOT, n)
+    stats = ai_clean_db.main(
+        ["--workers", str(workers), "--rate", str(rate), "--burst", str(workers), "--pack", str(pack)]
+    )
+    conn = sqlite3.connect(ai_clean_db.DB_PATH)
+    rows = conn.execute("SELECT COUNT(*) FROM recipes WHERE structured_ingredients IS NOT NULL").fetchone()[0]
+    conn.close()
+    return stats, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ai_clean_db 流水线压测")
+    parser.add_argument("--recipes", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.3, help="假服务每次请求耗时（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=50.0, help="令牌桶目标速率")
+    args = parser.parse_args()
+
+    server, url = serve_in_thread(latency=args.latency, rate_429=args.rate_429, retry_after=1)
+    ai_clean_db.GEMINI_URL = url
+    ai_clean_db.PROXIES = None
+
+    results = []
+    for workers, pack in ((1, 1), (4, 1), (8, 1), (8, 4)):
+        before = dict(FakeQwenHandler.stats)
+        stats, rows = run_once(args.recipes, workers, args.rate, pack)
+        calls = FakeQwenHandler.stats["requests"] - before["requests"]
+        results.append((workers, pack, stats, rows, calls))
+    server.shutdown()
+
+    print("\n\nworkers  pack  recipes/s  seconds  http_calls  429  rows")
+    for workers, pack, stats, rows, calls in results:
+        print(
+            f"{workers:>7}  {pack:>4}  {stats['done'] / stats['seconds']:>9.2f}  "
+            f"{stats['seconds']:>7.1f}  {calls:>10}  {stats['throttled']:>3}  {rows:>4}"
+        )
+
+
+if __name__ == "__main__":
+    main()
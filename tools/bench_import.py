@@ -0,0 +1,119 @@
+# 文件: tools/bench_import.py
+# 说明: 饮食记录批量导入 / 导出的吞吐（行/秒）
+#   临时目录里建一个空的 diet 库，只挂 diet 蓝图，用 Flask test client 走完整的请求路径：
+#   - 逐条 /api/add（迁移数据的老办法，每条一个请求一次提交）作为基线
+#   - /api/diet/import 上传 CSV / JSONL，不同的分批行数
+#   - /api/diet/export 流式导出
+#
+# 用法: python -m tools.bench_import --rows 50000 --add-rows 2000
+
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from flask import Flask
+
+import config
+
+
+def make_rows(n, seed=0):
+    rnd = random.Random(seed)
+    start = datetime.date(2020, 1, 1)
+    rows = []
+    for i in range(n):
+        date = (start + datetime.timedelta(days=i // 6)).isoformat()
+        if i % 6 == 5:
+            rows.append({"date": date, "type": "weight", "value": round(rnd.uniform(55, 80), 1), "note": ""})
+        else:
+            rows.append({"date": date, "type": "food", "value": rnd.randint(50, 900), "note": f"第 {i} 顿"})
+    return rows
+
+
+def to_csv(rows):
+    lines = ["date,type,value,note"]
+    lines += [f"{r['date']},{r['type']},{r['value']},{r['note']}" for r in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def to_jsonl(rows):
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+
+def make_app():
+    # 导入前先把库指到临时目录，别动真实数据
+    config.DB_DIET = os.path.join(tempfile.mkdtemp(), "diet_bench.db")
+    from apps.diet import diet_bp, init_diet_db
+
+    app = Flask(__name__)
+    app.register_blueprint(diet_bp)
+    init_diet_db()
+    return app.test_client()
+
+
+def new_user(client):
+    return client.post("/api/create_user", json={"name": "bench"}).get_json()["id"]
+
+
+def bench_add(client, rows):
+    uid = new_user(client)
+    t0 = time.perf_counter()
+    for r in rows:
+        client.post("/api/add", json=dict(r, user_id=uid))
+    return len(rows) / (time.perf_counter() - t0)
+
+
+def bench_import(client, payload, filename, n, chunk):
+    config.DIET_IMPORT_CHUNK = chunk
+    uid = new_user(client)
+    t0 = time.perf_counter()
+    res = client.post(
+        f"/api/diet/import?user_id={uid}",
+        data={"file": (io.BytesIO(payload), filename)},
+        content_type="multipart/form-data",
+    ).get_json()
+    elapsed = time.perf_counter() - t0
+    assert res["imported"] == n, res
+    return uid, n / elapsed
+
+
+def bench_export(client, uid, fmt, n):
+    t0 = time.perf_counter()
+    resp = client.get(f"/api/diet/export?user_id={uid}&format={fmt}")
+    size = sum(len(chunk) for chunk in resp.response)
+    elapsed = time.perf_counter() - t0
+    return n / elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饮食记录批量导入 / 导出吞吐")
+    parser.add_argument("--rows", type=int, default=50000, help="导入 / 导出的行数")
+    parser.add_argument("--add-rows", type=int, default=2000, help="逐条 /api/add 基线的行数")
+    parser.add_argument("--chunks", default="100,1000,5000", help="要比较的分批行数")
+    args = parser.parse_args()
+
+    client = make_app()
+    rows = make_rows(args.rows)
+    payloads = {"csv": to_csv(rows), "jsonl": to_jsonl(rows)}
+
+    print(f"{'方式':<22} {'行/秒':>10}")
+    add_rps = bench_add(client, rows[:args.add_rows])
+    print(f"{'/api/add 逐条':<22} {add_rps:>10.0f}")
+
+    last_uid = None
+    for fmt, payload in payloads.items():
+        for chunk in (int(c) for c in args.chunks.split(",")):
+            last_uid, rps = bench_import(client, payload, f"logs.{fmt}", args.rows, chunk)
+            print(f"{f'import {fmt} chunk={chunk}':<22} {rps:>10.0f}  ({rps / add_rps:.0f}x)")
+
+    for fmt in payloads:
+        rps, size = bench_export(client, last_uid, fmt, args.rows)
+        print(f"{f'export {fmt}':<22} {rps:>10.0f}  ({size / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
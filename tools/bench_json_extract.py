@@ -0,0 +1,113 @@
+# 文件: tools/bench_json_extract.py
+# 说明: core.json_extract 的语料自检 + 基准
+#   tools/json_corpus.jsonl：收集到的模型输出（代码块、前后废话、结尾逗号、单引号、被截断……），
+#   每行 {"name", "text", "expect"}，expect 为 null 表示这条本来就解析不出来。
+#   1. 逐条比对新解析器和原来的正则解析，打印各自的成功率，新解析器有一条不对就退出码 1
+#   2. 计时：整份语料，以及很长的回复（JSON 后面跟一大段带括号的闲聊）
+#
+# 用法: python -m tools.bench_json_extract [--long-kb 64] [--verbose]
+
+import argparse
+import json
+import os
+import re
+import time
+
+from core import json_extract
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "json_corpus.jsonl")
+
+
+def legacy_parse(text):
+    """原来 core.ai._try_parse_json 的做法，作对照。"""
+    if not text:
+        return None
+    block = re.search(r"```json(.*?)```", text, re.S | re.I)
+    if block:
+        text = block.group(1)
+    m = re.search(r"([\{\[][\s\S]*[\}\]])", text)
+    if m:
+        text = m.group(1)
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+
+def load_corpus(path=CORPUS):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(corpus, verbose=False):
+    """返回 (新解析器失败的用例名列表, 统计)。"""
+    failures = []
+    stats = {"new_ok": 0, "new_repaired": 0, "legacy_ok": 0, "parsable": 0}
+    for case in corpus:
+        expect = case["expect"]
+        ex = json_extract.extract(case["text"])
+        legacy = legacy_parse(case["text"])
+        if expect is not None:
+            stats["parsable"] += 1
+            stats["new_ok"] += ex.value == expect
+            stats["new_repaired"] += ex.value == expect and ex.repaired
+            stats["legacy_ok"] += legacy == expect
+        if ex.value != expect:
+            failures.append(case["name"])
+        if verbose or ex.value != expect:
+            mark = "✅" if ex.value == expect else "❌"
+            old = "✅" if legacy == expect else "❌"
+            print(f"{mark} new  {old} old  {case['name']:<28} repaired={ex.repaired} error={ex.error}")
+    return failures, stats
+
+
+def _time(fn, texts, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            fn(t)
+    return (time.perf_counter() - t0) / (repeat * len(texts)) * 1e6
+
+
+def bench(corpus, long_kb):
+    texts = [c["text"] for c in corpus]
+    print(f"\n整份语料（{len(texts)} 条）每条耗时：")
+    print(f"  new    {_time(json_extract.extract_json, texts, 200):8.1f} us")
+    print(f"  legacy {_time(legacy_parse, texts, 200):8.1f} us")
+
+    payload = {"name": "番茄炒蛋", "ingredients": ["番茄", "鸡蛋"], "steps": ["打蛋", "炒番茄", "合炒"]}
+    filler = "小贴士：番茄先去皮 {可选}，[火候] 要大。" * 8
+    prose = ""
+    while len(prose.encode("utf-8")) < long_kb * 1024:
+        prose += filler
+    long_text = "好的，下面是菜谱：\n" + json.dumps(payload, ensure_ascii=False) + "\n\n" + prose
+    new_ok = json_extract.extract_json(long_text) == payload
+    old_ok = legacy_parse(long_text) == payload
+    print(f"\n{long_kb} KB 长回复（JSON 在前，后面全是带括号的闲聊）：")
+    print(f"  new    {_time(json_extract.extract_json, [long_text], 20) / 1000:8.2f} ms  {'解析成功' if new_ok else '解析失败'}")
+    print(f"  legacy {_time(legacy_parse, [long_text], 20) / 1000:8.2f} ms  {'解析成功' if old_ok else '解析失败'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 抽取语料自检 + 基准")
+    parser.add_argument("--long-kb", type=int, default=64, help="长回复基准的大小（KB）")
+    parser.add_argument("--verbose", action="store_true", help="每条用例都打印")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    failures, s = check(corpus, args.verbose)
+    n = s["parsable"]
+    print(
+        f"\n可解析的 {n} 条：新解析器 {s['new_ok']}/{n}（其中本地修补 {s['new_repaired']}），"
+        f"原正则 {s['legacy_ok']}/{n}；不可解析的 {len(corpus) - n} 条应返回 None"
+    )
+    bench(corpus, args.long_kb)
+
+    if failures:
+        print(f"\n❌ {len(failures)} 条用例不符合预期：{', '.join(failures)}")
+        raise SystemExit(1)
+    print("\n✅ 语料全部符合预期")
+
+
+if __name__ == "__main__":
+    main()
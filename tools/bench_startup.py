@@ -0,0 +1,133 @@
+# 文件: tools/bench_startup.py
+# 说明: 启动耗时基准
+#   1. python -X importtime -c "import run"：只导入，列出累计耗时最多的模块
+#      （导入不应该有副作用：不连库、不建表、不读食物库）
+#   2. 另起一个进程计时 create_app()：迁移检查 / 默认用户 / 建全文索引
+#   每一步都在新进程里跑，测到的是冷启动，不受本进程已导入模块的影响。
+#
+# 用法: python -m tools.bench_startup --top 15
+#       python -m tools.bench_startup --max-import-ms 800 --max-startup-ms 1500   # 超预算退出码非 0
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入 run 之后检查：有没有连过库（core.db 的线程连接池 / 菜谱目录连接）、有没有读过食物库
+_IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import run
+elapsed = time.perf_counter() - t0
+from core import db
+from core.catalog import catalog
+from apps import diet
+print(json.dumps({
+    "seconds": elapsed,
+    "db_conns": len(getattr(db._local, "conns", {})),
+    "catalog_conn": catalog._conn is not None,
+    "food_loaded": diet.FOOD_INDEX.loaded,
+}))
+"""
+
+_STARTUP_PROBE = """
+import json, time
+from run import create_app
+t0 = time.perf_counter()
+create_app(warm_html=False)
+first = time.perf_counter() - t0
+t0 = time.perf_counter()
+create_app(warm_html=False)
+print(json.dumps({"first": first, "again": time.perf_counter() - t0}))
+"""
+
+
+def _python(code, *flags):
+    proc = subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"子进程失败，退出码 {proc.returncode}")
+    return proc
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 [(模块, 自身 us, 累计 us, 缩进层级), ...]。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    return rows
+
+
+def bench_import(top):
+    proc = _python(_IMPORT_PROBE, "-X", "importtime")
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(proc.stderr)
+    total_us = sum(self_us for _, self_us, _, _ in rows)
+
+    print(f"import run: {probe['seconds'] * 1000:.0f} ms（importtime 合计 {total_us / 1000:.0f} ms，{len(rows)} 个模块）")
+    print(f"{'累计(ms)':>9} {'自身(ms)':>9}  模块")
+    for name, self_us, cum_us, _ in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"{cum_us / 1000:>9.1f} {self_us / 1000:>9.1f}  {name}")
+
+    side_effects = []
+    if probe["db_conns"]:
+        side_effects.append(f"开了 {probe['db_conns']} 条数据库连接")
+    if probe["catalog_conn"]:
+        side_effects.append("加载了菜谱目录")
+    if probe["food_loaded"]:
+        side_effects.append("读了食物库")
+    if side_effects:
+        print("⚠️  导入有副作用：" + "，".join(side_effects))
+    else:
+        print("✅ 导入无副作用（没连库、没读食物库）")
+    return probe["seconds"] * 1000, bool(side_effects)
+
+
+def bench_startup():
+    proc = _python(_STARTUP_PROBE)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(
+        f"create_app(): 首次 {result['first'] * 1000:.0f} ms，"
+        f"再来一次 {result['again'] * 1000:.0f} ms（迁移已是最新，只剩版本号检查）"
+    )
+    return result["first"] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用冷启动耗时")
+    parser.add_argument("--top", type=int, default=15, help="列出累计耗时最多的前 N 个模块")
+    parser.add_argument("--max-import-ms", type=float, help="import run 的预算，超了退出码 1")
+    parser.add_argument("--max-startup-ms", type=float, help="create_app() 的预算，超了退出码 1")
+    args = parser.parse_args()
+
+    import_ms, dirty = bench_import(args.top)
+    print()
+    startup_ms = bench_startup()
+
+    failed = dirty
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"❌ import run {import_ms:.0f} ms > 预算 {args.max_import_ms:.0f} ms")
+        failed = True
+    if args.max_startup_ms is not None and startup_ms > args.max_startup_ms:
+        print(f"❌ create_app() {startup_ms:.0f} ms > 预算 {args.max_startup_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
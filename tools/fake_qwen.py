@@ -0,0 +1,189 @@
+# 文件: tools/fake_qwen.py
+# 说明: 本地假 DashScope 服务，压测 / 调试用，不花钱也不用联网
+#
+# 用法:
+#   python -m tools.fake_qwen --port 8765 --latency 0.5 --rate-429 0.1
+#   QWEN_API_KEY=fake QWEN_API_URL=http://127.0.0.1:8765/ python run.py
+#
+# 请求里带 “JSON” 字样时返回一个字段很全的 JSON（菜谱 / 推荐 / 食材都能解析），
+# 带 “JSON 数组” 时按 prompt 里的《菜名》批量回菜谱数组，否则返回一段普通中文。请求头带 X-DashScope-SSE: enable 时按 SSE 分段推送。
+# 请求体是 Gemini 格式（有 contents 字段）时按 Gemini 的格式回，给 ai_clean_db.py 压测用。
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_JSON = {
+    "markdown_content": "# 假菜谱\n\n## 必备原料和工具\n\n- 鸡蛋\n- 番茄\n\n## 操作\n\n- 炒就完事了",
+    "meta": {"main_ingredients": ["鸡蛋", "番茄"], "tags": ["家常菜"], "difficulty": 2, "calories": 300},
+    "main_ingredients": ["鸡蛋", "番茄"],
+    "tags": ["家常菜"],
+    "difficulty": 2,
+    "calories": 300,
+    "reply": "今天可以做个番茄炒蛋～",
+    "recipes": [],
+    "name": "一顿饭",
+    "est_cal": 500,
+}
+FAKE_TEXT = "小ka 收到啦，这是假服务器的回复～"
+FAKE_STREAM_RECIPES = (
+    "今天冰箱里的鸡蛋和番茄正好凑一盘，少油快炒就很香～\n<<<RECIPES>>>\n"
+    '[{"name": "番茄炒蛋", "missing": [], "score": 90}]'
+)
+
+
+class FakeQwenHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    disable_nagle_algorithm = True
+    # fail_first: 前 N 个请求固定回 429（测试重试 / 熔断用，结果可复现）
+    options = {"latency": 0.0, "rate_429": 0.0, "rate_500": 0.0, "retry_after": 1, "fail_first": 0}
+    stats = {"requests": 0, "429": 0, "500": 0}
+    _lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code, body, headers=None):
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        req = json.loads(self.rfile.read(length) or b"{}")
+        opts = self.options
+        with self._lock:
+            self.stats["requests"] += 1
+            seq = self.stats["requests"]
+
+        roll = random.random()
+        if seq <= opts["fail_first"] or roll < opts["rate_429"]:
+            with self._lock:
+                self.stats["429"] += 1
+            return self._send(
+                429,
+                {"code": "Throttling", "message": "fake throttling"},
+                {"Retry-After": str(opts["retry_after"])},
+            )
+        if roll < opts["rate_429"] + opts["rate_500"]:
+            with self._lock:
+                self.stats["500"] += 1
+            return self._send(500, {"code": "InternalError", "message": "fake error"})
+
+        if "contents" in req:
+            return self._send_gemini(req, opts["latency"])
+
+        messages = (req.get("input") or {}).get("messages") or []
+        prompt = "".join(m.get("content") or "" for m in messages)
+        if "<<<RECIPES>>>" in prompt:
+            content = FAKE_STREAM_RECIPES
+        elif "JSON 数组" in prompt:
+            # 批量生成菜谱：prompt 里每个《菜名》回一个元素
+            content = json.dumps(
+                [
+                    {"name": name, "markdown_content": f"# {name}\n\n- 炒就完事了", "meta": FAKE_JSON["meta"]}
+                    for name in re.findall(r"《([^《》\n]+)》", prompt)
+                ],
+                ensure_ascii=False,
+            )
+        elif "JSON" in prompt:
+            content = json.dumps(FAKE_JSON, ensure_ascii=False)
+        else:
+            content = FAKE_TEXT
+
+        if self.headers.get("X-DashScope-SSE") == "enable":
+            return self._send_stream(content, opts["latency"])
+
+        time.sleep(opts["latency"])
+        self._send(
+            200,
+            {
+                "output": {"choices": [{"message": {"role": "assistant", "content": content}}]},
+                "usage": {"input_tokens": 10, "output_tokens": 10},
+            },
+        )
+
+
+    def _send_gemini(self, req, latency):
+        """Gemini generateContent：打包请求（带【菜名】）回数组，否则回单个对象。"""
+        time.sleep(latency)
+        prompt = "".join(
+            p.get("text") or "" for c in req["contents"] for p in c.get("parts") or []
+        )
+        meta = {k: FAKE_JSON[k] for k in ("main_ingredients", "tags", "difficulty", "calories")}
+        names = re.findall(r"【([^【】\n]+)】", prompt)
+        data = [{"name": n, **meta} for n in names] if names else meta
+        text = json.dumps(data, ensure_ascii=False)
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    def _send_stream(self, content, latency):
+        """按 DashScope incremental_output 的格式，每 4 个字一条事件，chunked 编码。"""
+        chunks = [content[i:i + 4] for i in range(0, len(content), 4)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            time.sleep(latency / len(chunks))
+            body = {
+                "output": {
+                    "choices": [
+                        {
+                            "message": {"role": "assistant", "content": chunk},
+                            "finish_reason": "stop" if i == len(chunks) - 1 else "null",
+                        }
+                    ]
+                }
+            }
+            event = f"id:{i + 1}\nevent:result\n:HTTP_STATUS/200\ndata:{json.dumps(body, ensure_ascii=False)}\n\n"
+            raw = event.encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(raw), raw))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve_in_thread(port=0, **options):
+    """后台线程起一个假服务，返回 (server, url)；server.shutdown() 关掉。"""
+    FakeQwenHandler.options = {**FakeQwenHandler.options, **options}
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeQwenHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 DashScope 服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="每个请求的模拟生成耗时（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 时的 Retry-After 秒数")
+    parser.add_argument("--fail-first", type=int, default=0, help="前 N 个请求固定返回 429")
+    args = parser.parse_args()
+
+    FakeQwenHandler.options = {
+        "latency": args.latency,
+        "rate_429": args.rate_429,
+        "rate_500": args.rate_500,
+        "retry_after": args.retry_after,
+        "fail_first": args.fail_first,
+    }
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeQwenHandler)
+    print(f"🤖 fake DashScope listening on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
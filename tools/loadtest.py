@@ -0,0 +1,152 @@
+# 文件: tools/loadtest.py
+# 说明: 不同 gunicorn worker 类型的吞吐对比
+#   起一个假 DashScope（每次调用固定延迟），再用 gunicorn.conf.py 分别以
+#   sync / gthread / gevent 启动应用，并发打 /api/cook/ask_chef（每个请求都会调一次模型），
+#   打印 req/s 和延迟分位数。
+#
+# 用法: python -m tools.loadtest --latency 0.5 --concurrency 32 --requests 256 --workers 2
+
+import argparse
+import importlib.util
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from tools.fake_qwen import FakeQwenHandler, serve_in_thread
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(worker_class, workers, threads, port, llm_url):
+    env = dict(
+        os.environ,
+        QWEN_API_URL=llm_url,
+        QWEN_API_KEY="fake",
+        LLM_CACHE_ENABLED="0",  # 每个请求都要真的打到模型上
+        COOK_HTML_WARM="0",
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_ACCESSLOG="",
+        GUNICORN_LOGLEVEL="warning",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn ({worker_class}) 启动失败，退出码 {proc.returncode}")
+        try:
+            # 就绪探测打首页：没有副作用。别用 /api/cook/search，搜不到会触发 AI 生成，往真实数据目录里写菜谱
+            if requests.get(url + "/", timeout=1).status_code == 200:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"gunicorn ({worker_class}) 60 秒内没起来")
+
+
+def stop_gunicorn(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def run_load(url, total, concurrency):
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            r = requests.post(
+                url + "/api/cook/ask_chef",
+                json={"recipe": "番茄炒蛋", "question": f"第 {i} 个问题：要放糖吗"},
+                timeout=120,
+            )
+            ok = r.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - t0
+
+    latencies = sorted(lat for ok, lat in results if ok)
+    errors = sum(1 for ok, _ in results if not ok)
+
+    def pct(p):
+        if not latencies:
+            return float("nan")
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "errors": errors,
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gunicorn worker 类型吞吐对比")
+    parser.add_argument("--latency", type=float, default=0.5, help="假模型每次调用耗时（秒）")
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2, help="每种类型都用同样的进程数，方便对比")
+    parser.add_argument("--threads", type=int, default=16, help="gthread 每个进程的线程数")
+    parser.add_argument("--classes", default="sync,gthread,gevent")
+    args = parser.parse_args()
+
+    server, llm_url = serve_in_thread(latency=args.latency)
+
+    rows = []
+    for worker_class in args.classes.split(","):
+        if worker_class == "gevent" and importlib.util.find_spec("gevent") is None:
+            print("⏭️  跳过 gevent：没装 gevent")
+            continue
+        threads = args.threads if worker_class == "gthread" else 1
+        proc, url = start_gunicorn(worker_class, args.workers, threads, _free_port(), llm_url)
+        try:
+            before = FakeQwenHandler.stats["requests"]
+            stats = run_load(url, args.requests, args.concurrency)
+            stats["llm_calls"] = FakeQwenHandler.stats["requests"] - before
+        finally:
+            stop_gunicorn(proc)
+        rows.append((worker_class, threads, stats))
+    server.shutdown()
+
+    print(f"\n假模型延迟 {args.latency}s，{args.requests} 个请求，并发 {args.concurrency}，{args.workers} 个进程")
+    print(f"{'worker':>8} {'threads':>7} {'req/s':>8} {'p50(s)':>7} {'p95(s)':>7} {'errors':>6} {'llm':>5}")
+    for worker_class, threads, s in rows:
+        print(
+            f"{worker_class:>8} {threads:>7} {s['rps']:>8.1f} {s['p50']:>7.2f} {s['p95']:>7.2f} "
+            f"{s['errors']:>6} {s['llm_calls']:>5}"
+        )
+    # 理论上限：每个并发槽位每 latency 秒完成一个请求
+    print(f"理论上限 ≈ {args.concurrency / args.latency:.1f} req/s（并发全部吃满时）")
+
+
+if __name__ == "__main__":
+    main()
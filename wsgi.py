@@ -0,0 +1,25 @@
+# 文件: wsgi.py
+# 说明: 生产环境入口，配合 gunicorn.conf.py 使用：
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# 本地开发还是 python run.py（带 debug / 自动重载）
+
+import config
+from core import db
+from core.catalog import catalog
+from core.render import html_cache
+from run import create_app
+
+# preload_app 时这里在 master 里执行，随后才 fork 出 worker，启动阶段只跑这一次。
+# fork 的瞬间如果有后台线程正拿着锁，子进程里那把锁就永远解不开了，
+# 所以不用后台预热线程，改成在这里同步预热一遍：
+# 渲染好的 HTML（和菜谱目录）留在 master 内存里，worker 通过写时复制直接共享。
+app = create_app(warm_html=False)
+if config.COOK_HTML_WARM:
+    html_cache.warm()
+
+# 迁移和预热在 master 里开过 SQLite 连接：SQLite 的连接不能跨 fork 用，worker 里有 pid 判断会重新连，
+# 但 master 手里那几条会一直开着（还被每个 worker 继承一份文件描述符），fork 之前关掉
+db.close_connections()
+catalog.close()
+
+application = app